@@ -12,6 +12,7 @@ from .serializers import (
     UtilisateurSerializer, InscriptionSerializer,
     LoginSerializer, ChangePasswordSerializer, UpdateProfileSerializer
 )
+from facturation.quotas import verifier_quota
 from .permissions import (
     EstAdminSysteme, EstProprietaireHopital, EstMedecin,
     EstPersonnel, EstPatient, PeutModifierUtilisateur
@@ -73,6 +74,8 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Surcharge pour enregistrer qui a créé l'utilisateur"""
+        hopital = serializer.validated_data.get('hopital')
+        verifier_quota(hopital.pk if hopital else None, 'utilisateurs')
         serializer.save(modifie_par=self.request.user)
     
     @action(detail=False, methods=['get'])
@@ -4,7 +4,8 @@ from .models import (
     Plan, AbonnementStatut, PaiementMethode, PaiementStatut,
     InvoiceStatut, Abonnement, Paiement, Invoice,
     AbonnementRenouvellement, EssaiGratuit, Coupon, CouponTenant,
-    TarifConsultation
+    TarifConsultation, ExecutionCycleAbonnement, RevenueRollup, SequenceFacture,
+    LigneFacturationConsultation, ExecutionFacturationConsultation, UsageTenant
 )
 
 @admin.register(Plan)
@@ -80,4 +81,44 @@ class InvoiceAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(ExecutionCycleAbonnement)
+class ExecutionCycleAbonnementAdmin(admin.ModelAdmin):
+    list_display = (
+        'date_reference', 'abonnements_expires', 'essais_expires',
+        'tenants_suspendus', 'notifications_creees', 'created_at'
+    )
+    list_filter = ('date_reference',)
+    readonly_fields = ('created_at',)
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'mois', 'methode', 'statut', 'nombre', 'montant', 'updated_at')
+    list_filter = ('mois', 'methode', 'statut')
+    readonly_fields = ('updated_at',)
+
+@admin.register(SequenceFacture)
+class SequenceFactureAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'annee', 'dernier_numero', 'updated_at')
+    list_filter = ('annee',)
+    readonly_fields = ('updated_at',)
+
+@admin.register(LigneFacturationConsultation)
+class LigneFacturationConsultationAdmin(admin.ModelAdmin):
+    list_display = ('consultation', 'tenant', 'patient', 'montant', 'est_urgence', 'est_nuit', 'est_weekend', 'statut')
+    list_filter = ('statut', 'est_urgence', 'est_nuit', 'est_weekend')
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(ExecutionFacturationConsultation)
+class ExecutionFacturationConsultationAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'consultations_traitees', 'lignes_creees',
+        'lignes_mises_a_jour', 'sans_tarif', 'filigrane'
+    )
+    readonly_fields = ('created_at',)
+
+@admin.register(UsageTenant)
+class UsageTenantAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'utilisateurs', 'patients', 'stockage_octets', 'updated_at')
+    readonly_fields = ('updated_at',)
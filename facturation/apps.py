@@ -5,3 +5,6 @@ class FacturationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'facturation'
     verbose_name = 'Gestion de Facturation'
+    
+    def ready(self):
+        import facturation.signals
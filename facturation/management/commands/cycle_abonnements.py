@@ -0,0 +1,41 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from facturation.services import executer_cycle_abonnements
+
+
+class Command(BaseCommand):
+    help = "Expire les abonnements et essais échus, suspend les tenants concernés et envoie les avis d'expiration"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Date de référence (YYYY-MM-DD), aujourd\'hui par défaut'
+        )
+        parser.add_argument(
+            '--simulation',
+            action='store_true',
+            help='Calculer les transitions sans les enregistrer'
+        )
+
+    def handle(self, *args, **options):
+        date_reference = None
+        if options['date']:
+            try:
+                date_reference = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide (YYYY-MM-DD)')
+
+        execution = executer_cycle_abonnements(
+            date_reference=date_reference,
+            simulation=options['simulation']
+        )
+
+        prefixe = '[simulation] ' if options['simulation'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixe}Cycle du {execution.date_reference}: "
+            f"{execution.abonnements_expires} abonnement(s) expiré(s), "
+            f"{execution.essais_expires} essai(s) expiré(s), "
+            f"{execution.tenants_suspendus} tenant(s) suspendu(s), "
+            f"{execution.notifications_creees} notification(s) "
+            f"en {execution.duree_secondes:.2f}s"
+        ))
@@ -0,0 +1,50 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from facturation.services import facturer_consultations
+
+
+class Command(BaseCommand):
+    help = "Crée les lignes de facturation des consultations passées (reprise incrémentale)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=int,
+            help='Limiter la facturation à un tenant'
+        )
+        parser.add_argument(
+            '--depuis',
+            help='Relire les consultations modifiées depuis cette date (YYYY-MM-DD) '
+                 'au lieu du dernier filigrane'
+        )
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=500,
+            help='Nombre de consultations traitées par transaction (500 par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        depuis = None
+        if options['depuis']:
+            try:
+                depuis = timezone.make_aware(datetime.strptime(options['depuis'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('Format de date invalide (YYYY-MM-DD)')
+        if options['taille_lot'] < 1:
+            raise CommandError('La taille de lot doit être positive')
+
+        execution = facturer_consultations(
+            tenant_id=options['tenant'],
+            depuis=depuis,
+            taille_lot=options['taille_lot']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{execution.consultations_traitees} consultation(s) traitée(s): "
+            f"{execution.lignes_creees} ligne(s) créée(s), "
+            f"{execution.lignes_mises_a_jour} mise(s) à jour, "
+            f"{execution.sans_tarif} sans tarif, "
+            f"en {execution.duree_secondes:.2f}s"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from facturation.services import generer_factures_manquantes
+
+
+class Command(BaseCommand):
+    help = "Génère par lots les factures des paiements payés qui n'en ont pas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=int,
+            help='Limiter la génération à un tenant'
+        )
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=500,
+            help='Nombre de paiements traités par transaction (500 par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        if options['taille_lot'] < 1:
+            raise CommandError('La taille de lot doit être positive')
+
+        factures = generer_factures_manquantes(
+            tenant_id=options['tenant'],
+            taille_lot=options['taille_lot']
+        )
+        self.stdout.write(self.style.SUCCESS(f"{factures} facture(s) générée(s)"))
@@ -0,0 +1,66 @@
+import os
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from facturation.models import Invoice
+from facturation.services import generer_pdfs_factures
+
+
+class Command(BaseCommand):
+    help = "Génère les PDF des factures (seules les factures modifiées sont re-rendues)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mois',
+            help="Limiter aux factures émises ce mois (YYYY-MM)"
+        )
+        parser.add_argument(
+            '--tenant',
+            type=int,
+            help='Limiter la génération à un tenant'
+        )
+        parser.add_argument(
+            '--processus',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Nombre de processus de rendu (nombre de CPU par défaut)'
+        )
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=1000,
+            help='Nombre de factures chargées à la fois (1000 par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        factures = Invoice.objects.select_related(
+            'tenant', 'statut', 'paiement__methode', 'paiement__abonnement__plan'
+        )
+        if options['tenant']:
+            factures = factures.filter(tenant_id=options['tenant'])
+        if options['mois']:
+            try:
+                mois = datetime.strptime(options['mois'], '%Y-%m')
+            except ValueError:
+                raise CommandError('Format de mois invalide (YYYY-MM)')
+            factures = factures.filter(
+                date_emission__year=mois.year,
+                date_emission__month=mois.month
+            )
+
+        rendues = inchangees = 0
+        dernier_id = 0
+        while True:
+            lot = list(
+                factures.filter(invoice_id__gt=dernier_id)
+                .order_by('invoice_id')[:options['taille_lot']]
+            )
+            if not lot:
+                break
+            dernier_id = lot[-1].invoice_id
+            nouvelles, identiques = generer_pdfs_factures(lot, processus=options['processus'])
+            rendues += nouvelles
+            inchangees += identiques
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{rendues} PDF rendu(s), {inchangees} facture(s) inchangée(s)"
+        ))
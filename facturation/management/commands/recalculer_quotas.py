@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.core.files.storage import default_storage
+from facturation.quotas import recalculer_usages
+from medical.models import ExamenMedical
+from trimed_backend import tenancy
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs d'utilisation (utilisateurs, patients, stockage) des tenants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=int,
+            help='Limiter le recalcul à un tenant'
+        )
+        parser.add_argument(
+            '--mesurer-fichiers',
+            action='store_true',
+            help='Mesurer dans le stockage les fichiers de résultat dont la taille est inconnue'
+        )
+
+    def handle(self, *args, **options):
+        if options['mesurer_fichiers']:
+            mesures = 0
+            for _ in tenancy.par_tenant([options['tenant']] if options['tenant'] else None):
+                examens = ExamenMedical.objects.filter(
+                    taille_fichier_resultat=0
+                ).exclude(fichier_resultat='').exclude(fichier_resultat__isnull=True)
+
+                a_mettre_a_jour = []
+                for examen in examens.only('pk', 'fichier_resultat').iterator():
+                    try:
+                        examen.taille_fichier_resultat = default_storage.size(examen.fichier_resultat.name)
+                    except OSError:
+                        continue
+                    a_mettre_a_jour.append(examen)
+                ExamenMedical.objects.bulk_update(
+                    a_mettre_a_jour, ['taille_fichier_resultat'], batch_size=1000
+                )
+                mesures += len(a_mettre_a_jour)
+            self.stdout.write(f"{mesures} fichier(s) mesuré(s)")
+
+        tenants = recalculer_usages(tenant_id=options['tenant'])
+        self.stdout.write(self.style.SUCCESS(f"Compteurs recalculés pour {tenants} tenant(s)"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from facturation.services import recalculer_revenus
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les agrégats mensuels de revenus (RevenueRollup) à partir des paiements"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=int,
+            help='Limiter la reconstruction à un tenant'
+        )
+
+    def handle(self, *args, **options):
+        lignes = recalculer_revenus(tenant_id=options['tenant'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{lignes} ligne(s) d'agrégat de revenus reconstruite(s)"
+        ))
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.27 on 2026-10-19 14:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturation', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionCycleAbonnement',
+            fields=[
+                ('execution_id', models.AutoField(primary_key=True, serialize=False)),
+                ('date_reference', models.DateField()),
+                ('abonnements_expires', models.IntegerField(default=0)),
+                ('essais_expires', models.IntegerField(default=0)),
+                ('tenants_suspendus', models.IntegerField(default=0)),
+                ('notifications_creees', models.IntegerField(default=0)),
+                ('duree_secondes', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': "Exécution du cycle d'abonnement",
+                'verbose_name_plural': "Exécutions du cycle d'abonnement",
+                'db_table': 'execution_cycle_abonnement',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
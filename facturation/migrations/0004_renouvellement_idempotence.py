@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturation', '0003_execution_cycle_abonnement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abonnementrenouvellement',
+            name='ancienne_date_fin',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='abonnementrenouvellement',
+            name='cle_idempotence',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='abonnementrenouvellement',
+            name='nouvelle_date_fin',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='abonnementrenouvellement',
+            constraint=models.UniqueConstraint(fields=('abonnement', 'cle_idempotence'), name='unique_renouvellement_cle_idempotence'),
+        ),
+    ]
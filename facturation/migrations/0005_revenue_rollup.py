@@ -0,0 +1,38 @@
+# Generated by Django 4.2.27 on 2026-10-19 14:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        ('facturation', '0004_renouvellement_idempotence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('rollup_id', models.AutoField(primary_key=True, serialize=False)),
+                ('mois', models.DateField()),
+                ('nombre', models.IntegerField(default=0)),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('methode', models.ForeignKey(db_column='methode_id', on_delete=django.db.models.deletion.CASCADE, to='facturation.paiementmethode')),
+                ('statut', models.ForeignKey(db_column='statut_id', on_delete=django.db.models.deletion.CASCADE, to='facturation.paiementstatut')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Revenus mensuels',
+                'verbose_name_plural': 'Revenus mensuels',
+                'db_table': 'revenue_rollup',
+                'indexes': [models.Index(fields=['mois'], name='revenue_rol_mois_6bfd06_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(fields=('tenant', 'mois', 'methode', 'statut'), name='unique_revenue_rollup'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-19 14:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        ('facturation', '0005_revenue_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceFacture',
+            fields=[
+                ('sequence_id', models.AutoField(primary_key=True, serialize=False)),
+                ('annee', models.IntegerField()),
+                ('dernier_numero', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Séquence de facturation',
+                'verbose_name_plural': 'Séquences de facturation',
+                'db_table': 'sequence_facture',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sequencefacture',
+            constraint=models.UniqueConstraint(fields=('tenant', 'annee'), name='unique_sequence_facture_tenant_annee'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.27 on 2026-10-19 14:59
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        ('medical', '0002_initial'),
+        ('patients', '0001_initial'),
+        ('facturation', '0006_sequence_facture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionFacturationConsultation',
+            fields=[
+                ('execution_id', models.AutoField(primary_key=True, serialize=False)),
+                ('filigrane', models.DateTimeField(blank=True, null=True)),
+                ('date_limite', models.DateTimeField(blank=True, null=True)),
+                ('consultations_traitees', models.IntegerField(default=0)),
+                ('lignes_creees', models.IntegerField(default=0)),
+                ('lignes_mises_a_jour', models.IntegerField(default=0)),
+                ('sans_tarif', models.IntegerField(default=0)),
+                ('duree_secondes', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Exécution de la facturation des consultations',
+                'verbose_name_plural': 'Exécutions de la facturation des consultations',
+                'db_table': 'execution_facturation_consultation',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LigneFacturationConsultation',
+            fields=[
+                ('ligne_id', models.AutoField(primary_key=True, serialize=False)),
+                ('est_urgence', models.BooleanField(default=False)),
+                ('est_nuit', models.BooleanField(default=False)),
+                ('est_weekend', models.BooleanField(default=False)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('statut', models.CharField(choices=[('a_facturer', 'À facturer'), ('facturee', 'Facturée'), ('annulee', 'Annulée')], default='a_facturer', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('consultation', models.OneToOneField(db_column='consultation_id', on_delete=django.db.models.deletion.CASCADE, related_name='ligne_facturation', to='medical.consultation')),
+                ('patient', models.ForeignKey(db_column='patient_id', on_delete=django.db.models.deletion.CASCADE, to='patients.patient')),
+                ('tarif', models.ForeignKey(blank=True, db_column='tarif_id', null=True, on_delete=django.db.models.deletion.SET_NULL, to='facturation.tarifconsultation')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Ligne de facturation de consultation',
+                'verbose_name_plural': 'Lignes de facturation de consultation',
+                'db_table': 'ligne_facturation_consultation',
+                'indexes': [models.Index(fields=['tenant', 'statut'], name='ligne_factu_tenant__97d92d_idx'), models.Index(fields=['patient', 'statut'], name='ligne_factu_patient_081a5a_idx')],
+            },
+        ),
+    ]
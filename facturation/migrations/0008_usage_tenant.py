@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        ('facturation', '0007_facturation_consultation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageTenant',
+            fields=[
+                ('tenant', models.OneToOneField(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='gestion_tenants.tenant')),
+                ('utilisateurs', models.IntegerField(default=0)),
+                ('patients', models.IntegerField(default=0)),
+                ('stockage_octets', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Utilisation du tenant',
+                'verbose_name_plural': 'Utilisation des tenants',
+                'db_table': 'usage_tenant',
+            },
+        ),
+    ]
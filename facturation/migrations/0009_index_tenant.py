@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturation', '0008_usage_tenant'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['tenant', '-date_paiement'], name='paiement_tenant__aa1ff5_idx'),
+        ),
+    ]
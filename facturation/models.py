@@ -2,6 +2,7 @@
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from trimed_backend.tenancy import TenantManager
 
 class Plan(models.Model):
     """Plan d'abonnement"""
@@ -195,6 +196,9 @@ class Paiement(models.Model):
         db_table = 'paiement'
         verbose_name = 'Paiement'
         verbose_name_plural = 'Paiements'
+        indexes = [
+            models.Index(fields=['tenant', '-date_paiement']),
+        ]
 
 class Invoice(models.Model):
     """TABLE Invoice"""
@@ -285,6 +289,11 @@ class AbonnementRenouvellement(models.Model):
     
     date_renouvellement = models.DateTimeField()
     periode_mois = models.IntegerField(default=1)
+    ancienne_date_fin = models.DateField(null=True, blank=True)
+    nouvelle_date_fin = models.DateField(null=True, blank=True)
+    
+    # Clé fournie par le client pour rejouer une requête sans double renouvellement
+    cle_idempotence = models.CharField(max_length=100, null=True, blank=True)
     
     created_at = models.DateTimeField(default=timezone.now)
     
@@ -295,6 +304,12 @@ class AbonnementRenouvellement(models.Model):
         db_table = 'abonnement_renouvellement'
         verbose_name = 'Renouvellement d\'abonnement'
         verbose_name_plural = 'Renouvellements d\'abonnement'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['abonnement', 'cle_idempotence'],
+                name='unique_renouvellement_cle_idempotence'
+            ),
+        ]
 
 class EssaiGratuit(models.Model):
     """TABLE EssaiGratuit"""
@@ -486,6 +501,8 @@ class TarifConsultation(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return f"Tarif {self.specialite} - {self.tenant}"
     
@@ -504,4 +521,221 @@ class TarifConsultation(models.Model):
         db_table = 'tarif_consultation'
         verbose_name = 'Tarif Consultation'
         verbose_name_plural = 'Tarifs Consultation'
-        unique_together = ['tenant', 'specialite', 'date_debut']
\ No newline at end of file
+        unique_together = ['tenant', 'specialite', 'date_debut']
+
+class ExecutionCycleAbonnement(models.Model):
+    """Résumé d'une exécution du traitement nocturne des abonnements"""
+    
+    execution_id = models.AutoField(primary_key=True)
+    date_reference = models.DateField()
+    
+    abonnements_expires = models.IntegerField(default=0)
+    essais_expires = models.IntegerField(default=0)
+    tenants_suspendus = models.IntegerField(default=0)
+    notifications_creees = models.IntegerField(default=0)
+    duree_secondes = models.FloatField(default=0)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Cycle abonnements {self.date_reference}"
+    
+    class Meta:
+        db_table = 'execution_cycle_abonnement'
+        verbose_name = 'Exécution du cycle d\'abonnement'
+        verbose_name_plural = 'Exécutions du cycle d\'abonnement'
+        ordering = ['-created_at']
+
+class SequenceFacture(models.Model):
+    """
+    Compteur des numéros de facture par tenant et par année.
+    La ligne est verrouillée pendant l'allocation : les numéros sont
+    continus et annulés avec la transaction qui les a réservés.
+    """
+    
+    sequence_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    annee = models.IntegerField()
+    dernier_numero = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Séquence {self.tenant} - {self.annee} ({self.dernier_numero})"
+    
+    class Meta:
+        db_table = 'sequence_facture'
+        verbose_name = 'Séquence de facturation'
+        verbose_name_plural = 'Séquences de facturation'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'annee'],
+                name='unique_sequence_facture_tenant_annee'
+            ),
+        ]
+
+class RevenueRollup(models.Model):
+    """
+    Agrégat mensuel des paiements par (tenant, mois, méthode, statut),
+    maintenu à chaque enregistrement/suppression de Paiement
+    """
+    
+    rollup_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    mois = models.DateField()  # premier jour du mois
+    methode = models.ForeignKey(
+        PaiementMethode,
+        on_delete=models.CASCADE,
+        db_column='methode_id'
+    )
+    statut = models.ForeignKey(
+        PaiementStatut,
+        on_delete=models.CASCADE,
+        db_column='statut_id'
+    )
+    
+    nombre = models.IntegerField(default=0)
+    montant = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Revenus {self.tenant} - {self.mois:%Y-%m}"
+    
+    class Meta:
+        db_table = 'revenue_rollup'
+        verbose_name = 'Revenus mensuels'
+        verbose_name_plural = 'Revenus mensuels'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'mois', 'methode', 'statut'],
+                name='unique_revenue_rollup'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['mois']),
+        ]
+
+
+class LigneFacturationConsultation(models.Model):
+    """Ligne facturable d'une consultation, tarifée selon TarifConsultation"""
+    
+    class Statut(models.TextChoices):
+        A_FACTURER = 'a_facturer', 'À facturer'
+        FACTUREE = 'facturee', 'Facturée'
+        ANNULEE = 'annulee', 'Annulée'
+    
+    ligne_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    consultation = models.OneToOneField(
+        'medical.Consultation',
+        on_delete=models.CASCADE,
+        db_column='consultation_id',
+        related_name='ligne_facturation'
+    )
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.CASCADE,
+        db_column='patient_id'
+    )
+    tarif = models.ForeignKey(
+        TarifConsultation,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column='tarif_id'
+    )
+    
+    est_urgence = models.BooleanField(default=False)
+    est_nuit = models.BooleanField(default=False)
+    est_weekend = models.BooleanField(default=False)
+    montant = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(0)]
+    )
+    statut = models.CharField(
+        max_length=20,
+        choices=Statut.choices,
+        default=Statut.A_FACTURER
+    )
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"Ligne {self.consultation_id} - {self.montant}"
+    
+    class Meta:
+        db_table = 'ligne_facturation_consultation'
+        verbose_name = 'Ligne de facturation de consultation'
+        verbose_name_plural = 'Lignes de facturation de consultation'
+        indexes = [
+            models.Index(fields=['tenant', 'statut']),
+            models.Index(fields=['patient', 'statut']),
+        ]
+
+class ExecutionFacturationConsultation(models.Model):
+    """Trace d'une exécution de la facturation des consultations"""
+    
+    execution_id = models.AutoField(primary_key=True)
+    # Points de reprise de l'exécution suivante : plus grand updated_at
+    # traité et instant jusqu'auquel les consultations ont été prises
+    # (vides pour une exécution partielle, limitée à un tenant)
+    filigrane = models.DateTimeField(null=True, blank=True)
+    date_limite = models.DateTimeField(null=True, blank=True)
+    consultations_traitees = models.IntegerField(default=0)
+    lignes_creees = models.IntegerField(default=0)
+    lignes_mises_a_jour = models.IntegerField(default=0)
+    sans_tarif = models.IntegerField(default=0)
+    duree_secondes = models.FloatField(default=0)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Facturation consultations {self.created_at:%Y-%m-%d %H:%M}"
+    
+    class Meta:
+        db_table = 'execution_facturation_consultation'
+        verbose_name = 'Exécution de la facturation des consultations'
+        verbose_name_plural = 'Exécutions de la facturation des consultations'
+        ordering = ['-created_at']
+
+
+class UsageTenant(models.Model):
+    """Compteurs d'utilisation d'un tenant, comparés aux limites de son plan"""
+    
+    tenant = models.OneToOneField(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='tenant_id',
+        related_name='usage'
+    )
+    utilisateurs = models.IntegerField(default=0)
+    patients = models.IntegerField(default=0)
+    stockage_octets = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Utilisation {self.tenant}"
+    
+    class Meta:
+        db_table = 'usage_tenant'
+        verbose_name = 'Utilisation du tenant'
+        verbose_name_plural = 'Utilisation des tenants'
@@ -0,0 +1,122 @@
+# pdf.py
+"""
+Rendu PDF des factures, en Python pur (aucune dépendance externe).
+
+Le module ne dépend pas de Django : `rendre_facture` reçoit un simple
+dictionnaire et peut donc tourner dans un processus de travail. Le rendu
+est déterministe, deux appels avec les mêmes données produisent les
+mêmes octets.
+"""
+import hashlib
+import json
+
+# À incrémenter à chaque modification de la mise en page, pour que
+# les factures déjà rendues soient régénérées
+VERSION_GABARIT = 1
+
+LARGEUR_PAGE = 595  # A4 en points
+HAUTEUR_PAGE = 842
+MARGE = 56
+
+
+def empreinte(donnees):
+    """Empreinte SHA-256 des données affichées sur la facture"""
+    contenu = json.dumps(
+        {'gabarit': VERSION_GABARIT, 'donnees': donnees},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+def _texte(valeur):
+    """Chaîne PDF littérale en WinAnsi, avec échappement des délimiteurs"""
+    octets = str(valeur).encode('cp1252', errors='replace')
+    return b'(' + octets.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _ligne(x, y, texte, police='F1', taille=10):
+    return b'BT /%s %d Tf %d %d Td %s Tj ET\n' % (police.encode(), taille, x, y, _texte(texte))
+
+
+def _contenu(donnees):
+    droite = LARGEUR_PAGE - MARGE
+    y = HAUTEUR_PAGE - MARGE
+    flux = [_ligne(MARGE, y, donnees['hopital']['nom'], 'F2', 14)]
+    for info in (donnees['hopital'].get('adresse'), donnees['hopital'].get('telephone'),
+                 donnees['hopital'].get('email')):
+        if info:
+            y -= 14
+            flux.append(_ligne(MARGE, y, info))
+
+    y -= 40
+    flux.append(_ligne(MARGE, y, f"FACTURE {donnees['numero_facture']}", 'F2', 16))
+    y -= 24
+    flux.append(_ligne(MARGE, y, f"Date d'émission : {donnees['date_emission']}"))
+    if donnees.get('date_echeance'):
+        y -= 14
+        flux.append(_ligne(MARGE, y, f"Date d'échéance : {donnees['date_echeance']}"))
+    y -= 14
+    flux.append(_ligne(MARGE, y, f"Statut : {donnees['statut']}"))
+
+    y -= 32
+    flux.append(_ligne(MARGE, y, 'Désignation', 'F2', 11))
+    flux.append(_ligne(droite - 120, y, 'Montant', 'F2', 11))
+    y -= 6
+    flux.append(b'%d %d m %d %d l S\n' % (MARGE, y, droite, y))
+    y -= 16
+    flux.append(_ligne(MARGE, y, donnees['designation']))
+    flux.append(_ligne(droite - 120, y, donnees['montant']))
+
+    y -= 32
+    for libelle, valeur, police in (
+        ('Total HT', donnees['montant'], 'F1'),
+        (f"TVA ({donnees['taux_tva']} %)", donnees['tva'], 'F1'),
+        ('Total TTC', donnees['montant_ttc'], 'F2'),
+    ):
+        flux.append(_ligne(droite - 240, y, libelle, police))
+        flux.append(_ligne(droite - 120, y, valeur, police))
+        y -= 16
+
+    y -= 24
+    paiement = donnees['paiement']
+    flux.append(_ligne(MARGE, y, f"Paiement : {paiement['methode']} le {paiement['date']}", 'F1', 9))
+    if paiement.get('reference'):
+        y -= 12
+        flux.append(_ligne(MARGE, y, f"Référence : {paiement['reference']}", 'F1', 9))
+
+    return b''.join(flux)
+
+
+def rendre_facture(donnees):
+    """Produire le document PDF (bytes) d'une facture"""
+    contenu = _contenu(donnees)
+    objets = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+        b'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>'
+        % (LARGEUR_PAGE, HAUTEUR_PAGE),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(contenu), contenu),
+    ]
+
+    document = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    positions = []
+    for numero, objet in enumerate(objets, start=1):
+        positions.append(len(document))
+        document += b'%d 0 obj\n%s\nendobj\n' % (numero, objet)
+
+    debut_xref = len(document)
+    document += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objets) + 1)
+    for position in positions:
+        document += b'%010d 00000 n \n' % position
+    document += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objets) + 1, debut_xref
+    )
+    return bytes(document)
+
+
+def rendre_factures(lot):
+    """Rendre une liste de (empreinte, donnees) ; utilisé par le pool de processus"""
+    return [(cle, rendre_facture(donnees)) for cle, donnees in lot]
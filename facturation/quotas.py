@@ -0,0 +1,148 @@
+# quotas.py
+"""
+Quotas des plans d'abonnement (utilisateurs, patients, stockage).
+
+L'utilisation de chaque tenant est tenue dans UsageTenant et mise à jour
+par les signaux à chaque création/suppression ; la vérification d'un quota
+ne lit donc qu'une ligne et les limites du plan, mises en cache.
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from trimed_backend import tenancy
+from .models import Abonnement, UsageTenant
+
+DUREE_CACHE_LIMITES = 5 * 60
+
+# Ressource -> (champ de UsageTenant, champ de Plan, multiplicateur de la limite)
+RESSOURCES = {
+    'utilisateurs': ('utilisateurs', 'max_utilisateurs', 1),
+    'patients': ('patients', 'max_patients', 1),
+    'stockage': ('stockage_octets', 'max_stockage', 1024 * 1024),  # Mo -> octets
+}
+
+
+class QuotaDepasse(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = 'Quota du plan dépassé.'
+    default_code = 'quota_depasse'
+
+    def __init__(self, ressource, limite):
+        self.ressource = ressource
+        self.limite = limite
+        super().__init__(
+            f"Quota du plan atteint pour {ressource} (limite: {limite}). "
+            f"Passez à un plan supérieur pour continuer."
+        )
+
+
+def _cle_limites(tenant_id):
+    return f'facturation:quotas:limites:{tenant_id}'
+
+
+def invalider_limites(tenant_ids):
+    cache.delete_many([_cle_limites(tenant_id) for tenant_id in tenant_ids])
+
+
+def limites(tenant_id):
+    """
+    Limites du plan du tenant en unités de UsageTenant
+    ({champ: limite}), ou {} si le tenant n'a pas d'abonnement
+    """
+    cle = _cle_limites(tenant_id)
+    valeurs = cache.get(cle)
+    if valeurs is None:
+        plan = Abonnement.objects.filter(tenant_id=tenant_id).values(
+            *[f'plan__{champ_plan}' for _, champ_plan, _ in RESSOURCES.values()]
+        ).first()
+        valeurs = {}
+        if plan:
+            valeurs = {
+                champ: plan[f'plan__{champ_plan}'] * multiplicateur
+                for champ, champ_plan, multiplicateur in RESSOURCES.values()
+                if plan[f'plan__{champ_plan}'] is not None
+            }
+        cache.set(cle, valeurs, DUREE_CACHE_LIMITES)
+    return valeurs
+
+
+def usage(tenant_id):
+    """Compteurs d'utilisation du tenant (recalculés s'ils n'existent pas encore)"""
+    compteurs = UsageTenant.objects.filter(tenant_id=tenant_id).first()
+    if compteurs is None:
+        recalculer_usages(tenant_id=tenant_id)
+        compteurs = UsageTenant.objects.get(tenant_id=tenant_id)
+    return compteurs
+
+
+def verifier_quota(tenant_id, ressource, quantite=1):
+    """
+    Lever QuotaDepasse si l'ajout de `quantite` (octets pour le stockage)
+    dépasse la limite du plan du tenant
+    """
+    if tenant_id is None or quantite <= 0:
+        return
+    champ, _, multiplicateur = RESSOURCES[ressource]
+    limite = limites(tenant_id).get(champ)
+    if limite is None:
+        return
+    if getattr(usage(tenant_id), champ) + quantite > limite:
+        raise QuotaDepasse(ressource, limite // multiplicateur)
+
+
+def ajuster_usage(tenant_id, **deltas):
+    """Appliquer des variations relatives (F()) aux compteurs d'un tenant"""
+    deltas = {champ: delta for champ, delta in deltas.items() if delta}
+    if tenant_id is None or not deltas:
+        return
+    mis_a_jour = UsageTenant.objects.filter(tenant_id=tenant_id).update(
+        **{champ: F(champ) + delta for champ, delta in deltas.items()}
+    )
+    if not mis_a_jour:
+        # Première utilisation : le recalcul inclut déjà la variation
+        recalculer_usages(tenant_id=tenant_id)
+
+
+def recalculer_usages(tenant_id=None):
+    """
+    Recalculer les compteurs de tous les tenants (ou d'un seul) : les
+    utilisateurs, dans la table partagée, en une requête groupée ; les
+    patients et le stockage dans les tables de chaque tenant, devenu
+    tenant courant le temps de son tour.
+    Retourne le nombre de tenants mis à jour.
+    """
+    from comptes.models import Utilisateur
+    from gestion_tenants.models import Tenant
+    from medical.models import ExamenMedical
+    from patients.models import Patient
+
+    tenants = Tenant.objects.order_by('pk')
+    utilisateurs = Utilisateur.objects.filter(hopital__isnull=False)
+    if tenant_id is not None:
+        tenants = tenants.filter(pk=tenant_id)
+        utilisateurs = utilisateurs.filter(hopital_id=tenant_id)
+
+    nb_utilisateurs = dict(
+        utilisateurs.values('hopital_id').annotate(total=Count('pk')).values_list('hopital_id', 'total')
+    )
+
+    compteurs = [
+        UsageTenant(
+            tenant_id=pk,
+            utilisateurs=nb_utilisateurs.get(pk, 0),
+            patients=Patient.objects.count(),
+            stockage_octets=ExamenMedical.objects.aggregate(
+                total=Sum('taille_fichier_resultat')
+            )['total'] or 0,
+        )
+        for pk in tenancy.par_tenant(list(tenants.values_list('pk', flat=True)))
+    ]
+    UsageTenant.objects.bulk_create(
+        compteurs,
+        update_conflicts=True,
+        unique_fields=['tenant'],
+        update_fields=['utilisateurs', 'patients', 'stockage_octets', 'updated_at'],
+        batch_size=1000
+    )
+    return len(compteurs)
@@ -1,5 +1,6 @@
 # serializers.py
 from rest_framework import serializers
+from django.db import transaction
 from django.utils import timezone
 from decimal import Decimal
 from .models import (
@@ -10,6 +11,7 @@ from .models import (
 )
 from gestion_tenants.serializers import TenantSerializer
 from medical.serializers import SpecialiteSerializer
+from .services import allouer_numero_facture, coupon_en_cache
 
 class PlanSerializer(serializers.ModelSerializer):
     class Meta:
@@ -112,12 +114,16 @@ class InvoiceSerializer(serializers.ModelSerializer):
             'date_echeance', 'montant', 'tva', 'montant_ttc', 'url_pdf',
             'est_en_retard', 'jours_retard', 'created_at', 'updated_at'
         ]
-        read_only_fields = ('invoice_id', 'created_at', 'updated_at')
+        # Le numéro est attribué par la séquence de facturation du tenant
+        read_only_fields = ('invoice_id', 'numero_facture', 'created_at', 'updated_at')
     
-    def validate_numero_facture(self, value):
-        if Invoice.objects.filter(numero_facture=value).exists():
-            raise serializers.ValidationError("Ce numéro de facture existe déjà")
-        return value
+    def create(self, validated_data):
+        with transaction.atomic():
+            validated_data['numero_facture'] = allouer_numero_facture(
+                validated_data['tenant'].pk,
+                timezone.localtime(validated_data['date_emission']).year
+            )
+            return super().create(validated_data)
     
     def validate(self, data):
         # Validation des dates
@@ -187,12 +193,12 @@ class ValidationCouponSerializer(serializers.Serializer):
     )
     
     def validate(self, data):
-        try:
-            coupon = Coupon.objects.get(code=data['code'])
-        except Coupon.DoesNotExist:
+        instantane = coupon_en_cache(data['code'])
+        if instantane is None:
             raise serializers.ValidationError({
                 'code': 'Coupon invalide'
             })
+        coupon = instantane['coupon']
         
         if not coupon.est_valide:
             raise serializers.ValidationError({
@@ -200,17 +206,16 @@ class ValidationCouponSerializer(serializers.Serializer):
             })
         
         # Vérifier si le coupon est valide pour le plan
-        if data.get('plan_id'):
-            plan = Plan.objects.get(pk=data['plan_id'])
-            if not coupon.plans_valides.filter(pk=plan.pk).exists():
-                raise serializers.ValidationError({
-                    'code': 'Ce coupon n\'est pas valide pour ce plan'
-                })
+        if data.get('plan_id') and data['plan_id'] not in instantane['plans']:
+            raise serializers.ValidationError({
+                'code': 'Ce coupon n\'est pas valide pour ce plan'
+            })
         
         # Appliquer la réduction
         montant_reduit = coupon.appliquer_reduction(data['montant'])
         
         data['coupon'] = coupon
+        data['coupon_donnees'] = instantane['donnees']
         data['montant_initial'] = data['montant']
         data['montant_final'] = montant_reduit
         data['reduction'] = data['montant'] - montant_reduit
@@ -228,4 +233,18 @@ class TarifConsultationSerializer(serializers.ModelSerializer):
             'duree_consultation', 'actif', 'date_debut', 'date_fin',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ('tarif_id', 'created_at', 'updated_at')
\ No newline at end of file
+        read_only_fields = ('tarif_id', 'created_at', 'updated_at')
+
+class DemandeTarifSerializer(serializers.Serializer):
+    """Une combinaison à tarifer"""
+    
+    specialite_id = serializers.IntegerField()
+    urgence = serializers.BooleanField(default=False)
+    nuit = serializers.BooleanField(default=False)
+    weekend = serializers.BooleanField(default=False)
+
+class CalculTarifsSerializer(serializers.Serializer):
+    """Serializer pour le calcul groupé des tarifs"""
+    
+    date_reference = serializers.DateField(required=False)
+    demandes = DemandeTarifSerializer(many=True, allow_empty=False, max_length=500)
@@ -0,0 +1,946 @@
+# services.py
+import bisect
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from gestion_tenants.services import fuseaux_horaires
+from trimed_backend import referentiel, tenancy
+from . import pdf
+from .models import (
+    Abonnement, AbonnementStatut, EssaiGratuit, ExecutionCycleAbonnement,
+    Paiement, Invoice, AbonnementRenouvellement, RevenueRollup, SequenceFacture,
+    Coupon, CouponTenant, TarifConsultation,
+    LigneFacturationConsultation, ExecutionFacturationConsultation
+)
+
+STATUT_ABONNEMENT_ACTIF = 'actif'
+STATUT_ABONNEMENT_EXPIRE = 'expiré'
+METHODE_RENOUVELLEMENT = 'Carte bancaire'
+STATUT_PAIEMENT_PAYE = 'payé'
+TVA_DEFAUT = Decimal('20.00')
+TYPE_NOTIFICATION_EXPIRATION = 'Expiration abonnement'
+JOURS_PREAVIS_EXPIRATION = 7
+
+
+def _creer_notifications_expiration(tenant_ids, titre, message, priorite):
+    """
+    Créer les avis d'expiration pour les propriétaires des tenants, dans
+    les tables de chaque tenant (devenu tenant courant le temps de son tour).
+    Retourne le nombre de notifications créées.
+    """
+    from gestion_tenants.models import Tenant
+    from notifications.models import Notification
+    from notifications.services import creer_notifications
+
+    proprietaires = dict(Tenant.objects.filter(
+        pk__in=tenant_ids,
+        proprietaire_utilisateur__isnull=False
+    ).values_list('tenant_id', 'proprietaire_utilisateur_id'))
+
+    creees = 0
+    for tenant_id in tenancy.par_tenant(sorted(proprietaires)):
+        creees += len(creer_notifications(
+            'abonnement_expiration',
+            TYPE_NOTIFICATION_EXPIRATION,
+            [Notification(
+                tenant_id=tenant_id,
+                utilisateur_id=proprietaires[tenant_id],
+                titre=titre,
+                message=message,
+                priorite=priorite,
+                cible_type='abonnement',
+            )]
+        ))
+    return creees
+
+
+def _dates_locales(maintenant, date_reference=None):
+    """
+    {date du jour: [tenant_id]} des tenants abonnés, selon le fuseau de
+    chaque établissement ; {date_reference: None} (tous les tenants) si
+    une date est imposée
+    """
+    if date_reference is not None:
+        return {date_reference: None}
+    tenant_ids = list(Abonnement.objects.values_list('tenant_id', flat=True))
+    par_date = {}
+    for tenant_id, fuseau in fuseaux_horaires(tenant_ids).items():
+        par_date.setdefault(maintenant.astimezone(fuseau).date(), []).append(tenant_id)
+    return par_date
+
+
+def _selon_date_locale(par_date, lookup, decalage=timedelta()):
+    """Q combinant `lookup` comparé à la date locale (décalée) de chaque groupe de tenants"""
+    condition = Q(pk__in=[])
+    for jour, tenant_ids in par_date.items():
+        critere = Q(**{lookup: jour + decalage})
+        if tenant_ids is not None:
+            critere &= Q(tenant_id__in=tenant_ids)
+        condition |= critere
+    return condition
+
+
+def executer_cycle_abonnements(date_reference=None, simulation=False):
+    """
+    Traitement nocturne du cycle de vie des abonnements.
+
+    Toutes les transitions sont faites par des UPDATE ensemblistes :
+    - abonnements échus -> statut 'expiré'
+    - essais gratuits échus -> inactifs
+    - tenants sans abonnement ni essai en cours -> suspendus
+    puis les avis d'expiration sont créés en masse et un résumé est
+    enregistré. Les échéances des abonnements sont comparées à la date du
+    jour dans le fuseau de chaque établissement. En mode simulation, tout
+    est annulé en fin de transaction.
+    """
+    from gestion_tenants.models import Tenant
+    from notifications.models import Notification
+
+    debut = time.monotonic()
+    maintenant = timezone.now()
+    aujourdhui = date_reference or timezone.localdate(maintenant)
+    par_date = _dates_locales(maintenant, date_reference)
+
+    with transaction.atomic():
+        statut_expire = referentiel.reference(
+            AbonnementStatut,
+            STATUT_ABONNEMENT_EXPIRE,
+            defaults={'description': 'Abonnement arrivé à échéance'}
+        )
+
+        # Abonnements échus
+        abonnements_echus = Abonnement.objects.filter(
+            _selon_date_locale(par_date, 'date_fin__lt')
+        ).exclude(statut=statut_expire)
+        tenants_abonnement_expire = list(
+            abonnements_echus.values_list('tenant_id', flat=True)
+        )
+        abonnements_expires = Abonnement.objects.filter(
+            tenant_id__in=tenants_abonnement_expire
+        ).update(statut=statut_expire, updated_at=maintenant)
+
+        # Essais gratuits échus
+        essais_echus = EssaiGratuit.objects.filter(actif=True, date_fin__lt=maintenant)
+        tenants_essai_expire = list(essais_echus.values_list('tenant_id', flat=True))
+        essais_expires = EssaiGratuit.objects.filter(
+            tenant_id__in=tenants_essai_expire
+        ).update(actif=False, updated_at=maintenant)
+
+        # Suspendre les tenants qui n'ont plus ni abonnement ni essai en cours
+        tenants_concernes = set(tenants_abonnement_expire) | set(tenants_essai_expire)
+        tenants_a_suspendre = list(
+            Tenant.objects.filter(
+                pk__in=tenants_concernes,
+                statut=Tenant.Statut.ACTIF
+            ).exclude(
+                pk__in=Abonnement.objects.filter(
+                    _selon_date_locale(par_date, 'date_fin__gte')
+                ).values('tenant_id')
+            ).exclude(
+                pk__in=EssaiGratuit.objects.filter(
+                    actif=True,
+                    date_fin__gte=maintenant
+                ).values('tenant_id')
+            ).values_list('tenant_id', flat=True)
+        )
+        tenants_suspendus = Tenant.objects.filter(
+            pk__in=tenants_a_suspendre
+        ).update(statut=Tenant.Statut.SUSPENDU)
+
+        # Avis d'expiration
+        notifications_creees = _creer_notifications_expiration(
+            tenants_concernes,
+            'Abonnement expiré',
+            'Votre abonnement ou essai gratuit est arrivé à échéance. '
+            'Renouvelez-le pour continuer à utiliser Trimed.',
+            Notification.Priorite.URGENT
+        )
+        preavis = timedelta(days=JOURS_PREAVIS_EXPIRATION)
+        for jour, tenant_ids in par_date.items():
+            date_preavis = jour + preavis
+            notifications_creees += _creer_notifications_expiration(
+                Abonnement.objects.filter(
+                    _selon_date_locale({jour: tenant_ids}, 'date_fin', preavis)
+                ).values_list('tenant_id', flat=True),
+                'Abonnement bientôt expiré',
+                f'Votre abonnement expire le {date_preavis.strftime("%d/%m/%Y")}.',
+                Notification.Priorite.ELEVEE
+            )
+
+        execution = ExecutionCycleAbonnement.objects.create(
+            date_reference=aujourdhui,
+            abonnements_expires=abonnements_expires,
+            essais_expires=essais_expires,
+            tenants_suspendus=tenants_suspendus,
+            notifications_creees=notifications_creees,
+            duree_secondes=time.monotonic() - debut,
+        )
+
+        if simulation:
+            transaction.set_rollback(True)
+
+    return execution
+
+
+def taux_tva(tenant_ids):
+    """Taux de TVA des tenants, en une requête : {tenant_id: taux}"""
+    from gestion_tenants.models import ParametreHopital
+
+    tenant_ids = set(tenant_ids)
+    taux = dict(
+        ParametreHopital.objects.filter(
+            tenant_id__in=tenant_ids,
+            tva_taux__isnull=False
+        ).values_list('tenant_id', 'tva_taux')
+    )
+    return {tenant_id: taux.get(tenant_id, TVA_DEFAUT) for tenant_id in tenant_ids}
+
+
+def calculer_tva(montant, taux):
+    """Montant de TVA arrondi au centime"""
+    return (montant * taux / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def format_numero_facture(tenant_id, annee, numero):
+    return f"FAC-{annee}-{tenant_id:04d}-{numero:06d}"
+
+
+def allouer_numeros_facture(tenant_id, annee, quantite=1):
+    """
+    Réserver `quantite` numéros de facture consécutifs pour un tenant et
+    une année. La ligne SequenceFacture reste verrouillée jusqu'à la fin de
+    la transaction appelante, si bien que deux workers ne peuvent obtenir
+    le même numéro et qu'un rollback libère les numéros sans laisser de trou.
+    Retourne la liste des numéros formatés.
+    """
+    if quantite < 1:
+        return []
+
+    with transaction.atomic():
+        sequence = SequenceFacture.objects.select_for_update().filter(
+            tenant_id=tenant_id, annee=annee
+        ).first()
+        if sequence is None:
+            try:
+                with transaction.atomic():
+                    sequence = SequenceFacture.objects.create(tenant_id=tenant_id, annee=annee)
+            except IntegrityError:
+                # Créée entre-temps par un autre worker
+                pass
+            sequence = SequenceFacture.objects.select_for_update().get(
+                tenant_id=tenant_id, annee=annee
+            )
+
+        premier = sequence.dernier_numero + 1
+        sequence.dernier_numero += quantite
+        sequence.save(update_fields=['dernier_numero', 'updated_at'])
+
+    return [
+        format_numero_facture(tenant_id, annee, numero)
+        for numero in range(premier, premier + quantite)
+    ]
+
+
+def allouer_numero_facture(tenant_id, annee):
+    """Réserver un numéro de facture (voir allouer_numeros_facture)"""
+    return allouer_numeros_facture(tenant_id, annee)[0]
+
+
+class RenouvellementError(Exception):
+    """Renouvellement impossible (paramètres invalides)"""
+
+
+def renouveler_abonnement(abonnement_id, periode_mois=1, cle_idempotence=None):
+    """
+    Renouveler un abonnement de manière atomique et idempotente.
+
+    L'abonnement est verrouillé (select_for_update) le temps de prolonger
+    sa date de fin et de créer ensemble le Paiement, l'AbonnementRenouvellement
+    et l'Invoice. Si une clé d'idempotence déjà utilisée pour cet abonnement
+    est fournie, le renouvellement enregistré est renvoyé sans rien modifier.
+    Retourne (renouvellement, cree).
+    """
+    try:
+        periode_mois = int(periode_mois)
+    except (TypeError, ValueError):
+        raise RenouvellementError('periode_mois doit être un entier')
+    if periode_mois < 1:
+        raise RenouvellementError('periode_mois doit être supérieur ou égal à 1')
+
+    with transaction.atomic():
+        abonnement = Abonnement.objects.select_for_update().select_related(
+            'plan', 'statut', 'tenant'
+        ).get(pk=abonnement_id)
+
+        if cle_idempotence:
+            existant = AbonnementRenouvellement.objects.select_related(
+                'paiement__invoice'
+            ).filter(abonnement=abonnement, cle_idempotence=cle_idempotence).first()
+            if existant:
+                return existant, False
+
+        date_renouvellement = timezone.now()
+        ancienne_date_fin = abonnement.date_fin
+        if ancienne_date_fin < date_renouvellement.date():
+            nouvelle_date_fin = date_renouvellement.date() + timedelta(days=30 * periode_mois)
+        else:
+            nouvelle_date_fin = ancienne_date_fin + timedelta(days=30 * periode_mois)
+
+        abonnement.date_fin = nouvelle_date_fin
+        champs = ['date_fin', 'updated_at']
+        if abonnement.statut.nom == STATUT_ABONNEMENT_EXPIRE:
+            # Un abonnement expiré par le cycle nocturne redevient actif,
+            # ainsi que le tenant suspendu à cette occasion
+            abonnement.statut = referentiel.statut_abonnement(STATUT_ABONNEMENT_ACTIF, creer=True)
+            champs.append('statut')
+            tenant = abonnement.tenant
+            if tenant.statut == tenant.Statut.SUSPENDU:
+                tenant.statut = tenant.Statut.ACTIF
+                tenant.save(update_fields=['statut'])
+        abonnement.save(update_fields=champs)
+
+        montant = abonnement.plan.prix_mensuel * periode_mois
+        paiement = Paiement.objects.create(
+            tenant_id=abonnement.tenant_id,
+            abonnement=abonnement,
+            methode=referentiel.methode_paiement(METHODE_RENOUVELLEMENT, creer=True),
+            statut=referentiel.statut_paiement(STATUT_PAIEMENT_PAYE, creer=True),
+            montant=montant,
+            date_paiement=date_renouvellement,
+            reference=f"RENOUV_{abonnement.tenant_id}_{date_renouvellement.strftime('%Y%m%d')}"
+        )
+
+        tva = calculer_tva(montant, taux_tva([abonnement.tenant_id])[abonnement.tenant_id])
+        paiement.invoice = Invoice.objects.create(
+            paiement=paiement,
+            tenant_id=abonnement.tenant_id,
+            statut=referentiel.statut_facture(STATUT_PAIEMENT_PAYE, creer=True),
+            numero_facture=allouer_numero_facture(
+                abonnement.tenant_id,
+                timezone.localtime(date_renouvellement).year
+            ),
+            date_emission=date_renouvellement,
+            montant=montant,
+            tva=tva,
+            montant_ttc=montant + tva
+        )
+
+        renouvellement = AbonnementRenouvellement.objects.create(
+            abonnement=abonnement,
+            paiement=paiement,
+            date_renouvellement=date_renouvellement,
+            periode_mois=periode_mois,
+            ancienne_date_fin=ancienne_date_fin,
+            nouvelle_date_fin=nouvelle_date_fin,
+            cle_idempotence=cle_idempotence or None
+        )
+
+    return renouvellement, True
+
+
+def generer_factures_manquantes(tenant_id=None, taille_lot=500):
+    """
+    Créer les factures des paiements payés qui n'en ont pas, par lots.
+    Les paiements en attente, échoués ou remboursés ne consomment pas de
+    numéro de facture.
+
+    Les paiements sont parcourus par date puis par id : les numéros suivent
+    l'ordre chronologique des paiements. Chaque lot est traité dans sa
+    propre transaction : les numéros sont réservés en une fois par
+    (tenant, année), les taux de TVA lus en une requête et les factures
+    insérées avec bulk_create.
+    Retourne le nombre de factures créées.
+    """
+    paiements = Paiement.objects.filter(invoice__isnull=True, statut__nom=STATUT_PAIEMENT_PAYE)
+    if tenant_id is not None:
+        paiements = paiements.filter(tenant_id=tenant_id)
+
+    statut = referentiel.statut_facture(STATUT_PAIEMENT_PAYE, creer=True)
+    total = 0
+    suite = Q()
+    while True:
+        lot = list(paiements.filter(suite).order_by('date_paiement', 'paiement_id')[:taille_lot])
+        if not lot:
+            break
+        dernier = lot[-1]
+        suite = Q(date_paiement__gt=dernier.date_paiement) | Q(
+            date_paiement=dernier.date_paiement, paiement_id__gt=dernier.paiement_id
+        )
+
+        with transaction.atomic():
+            # Ignorer les paiements facturés depuis la lecture du lot
+            deja_facturees = set(
+                Invoice.objects.filter(
+                    paiement_id__in=[p.paiement_id for p in lot]
+                ).values_list('paiement_id', flat=True)
+            )
+            lot = [p for p in lot if p.paiement_id not in deja_facturees]
+
+            groupes = {}
+            for paiement in lot:
+                annee = timezone.localtime(paiement.date_paiement).year
+                groupes.setdefault((paiement.tenant_id, annee), []).append(paiement)
+
+            taux = taux_tva(p.tenant_id for p in lot)
+            factures = []
+            for (tenant, annee), paiements_groupe in sorted(groupes.items()):
+                numeros = allouer_numeros_facture(tenant, annee, len(paiements_groupe))
+                for paiement, numero in zip(paiements_groupe, numeros):
+                    tva = calculer_tva(paiement.montant, taux[tenant])
+                    factures.append(Invoice(
+                        paiement=paiement,
+                        tenant_id=tenant,
+                        statut=statut,
+                        numero_facture=numero,
+                        date_emission=paiement.date_paiement,
+                        montant=paiement.montant,
+                        tva=tva,
+                        montant_ttc=paiement.montant + tva,
+                    ))
+
+            total += len(Invoice.objects.bulk_create(factures))
+
+    return total
+
+
+# PDF des factures
+
+TAILLE_LOT_PDF = 50
+
+
+def donnees_facture(facture):
+    """
+    Données affichées sur le PDF d'une facture. La facture doit être chargée
+    avec select_related('tenant', 'statut', 'paiement__methode',
+    'paiement__abonnement__plan').
+    """
+    paiement = facture.paiement
+    taux = (facture.tva * 100 / facture.montant).quantize(Decimal('0.01')) if facture.montant else Decimal('0.00')
+    return {
+        'numero_facture': facture.numero_facture,
+        'date_emission': timezone.localtime(facture.date_emission).strftime('%d/%m/%Y'),
+        'date_echeance': (
+            timezone.localtime(facture.date_echeance).strftime('%d/%m/%Y')
+            if facture.date_echeance else None
+        ),
+        'statut': facture.statut.nom,
+        'hopital': {
+            'nom': facture.tenant.nom,
+            'adresse': facture.tenant.adresse,
+            'telephone': facture.tenant.telephone,
+            'email': facture.tenant.email_professionnel,
+        },
+        'designation': f"Abonnement {paiement.abonnement.plan.nom}",
+        'montant': str(facture.montant),
+        'taux_tva': str(taux),
+        'tva': str(facture.tva),
+        'montant_ttc': str(facture.montant_ttc),
+        'paiement': {
+            'methode': paiement.methode.nom,
+            'date': timezone.localtime(paiement.date_paiement).strftime('%d/%m/%Y'),
+            'reference': paiement.reference,
+        },
+    }
+
+
+def chemin_pdf(cle):
+    """Chemin de stockage d'un PDF, adressé par l'empreinte de son contenu"""
+    return f"factures/{cle[:2]}/{cle}.pdf"
+
+
+def _enregistrer_pdf(cle, contenu):
+    chemin = chemin_pdf(cle)
+    enregistre = default_storage.save(chemin, ContentFile(contenu))
+    if enregistre != chemin:
+        # Même contenu déjà écrit par un autre worker entre-temps
+        default_storage.delete(enregistre)
+
+
+def generer_pdfs_factures(factures, processus=1):
+    """
+    Produire les PDF d'une liste de factures et renseigner url_pdf.
+
+    Le stockage est adressé par contenu : une facture dont les données n'ont
+    pas changé retrouve son fichier existant et n'est pas re-rendue. Les
+    rendus nécessaires sont répartis sur `processus` processus de travail.
+    Retourne (nombre rendu, nombre inchangé).
+    """
+    a_rendre = {}
+    a_mettre_a_jour = []
+    for facture in factures:
+        donnees = donnees_facture(facture)
+        cle = pdf.empreinte(donnees)
+        chemin = chemin_pdf(cle)
+        if not default_storage.exists(chemin):
+            a_rendre[cle] = donnees
+        if facture.url_pdf != chemin:
+            facture.url_pdf = chemin
+            facture.updated_at = timezone.now()
+            a_mettre_a_jour.append(facture)
+
+    lots = list(a_rendre.items())
+    lots = [lots[i:i + TAILLE_LOT_PDF] for i in range(0, len(lots), TAILLE_LOT_PDF)]
+    if processus > 1 and len(lots) > 1:
+        with ProcessPoolExecutor(max_workers=processus) as executeur:
+            resultats = executeur.map(pdf.rendre_factures, lots)
+            for rendus in resultats:
+                for cle, contenu in rendus:
+                    _enregistrer_pdf(cle, contenu)
+    else:
+        for lot in lots:
+            for cle, contenu in pdf.rendre_factures(lot):
+                _enregistrer_pdf(cle, contenu)
+
+    Invoice.objects.bulk_update(a_mettre_a_jour, ['url_pdf', 'updated_at'])
+    return len(a_rendre), len(factures) - len(a_rendre)
+
+
+def pdf_facture(facture):
+    """Chemin du PDF à jour d'une facture, rendu au besoin"""
+    generer_pdfs_factures([facture])
+    return facture.url_pdf
+
+
+# Revenus mensuels pré-agrégés
+
+def mois_revenu(date_paiement):
+    """Premier jour du mois (heure locale) d'une date de paiement"""
+    if timezone.is_aware(date_paiement):
+        date_paiement = timezone.localtime(date_paiement)
+    return date_paiement.date().replace(day=1)
+
+
+def etat_revenu(paiement):
+    """Clé d'agrégat et montant d'un paiement, tels que comptés dans RevenueRollup"""
+    cle = (
+        paiement.tenant_id,
+        mois_revenu(paiement.date_paiement),
+        paiement.methode_id,
+        paiement.statut_id,
+    )
+    return cle, paiement.montant
+
+
+def appliquer_revenu(cle, nombre, montant):
+    """
+    Ajouter (ou retirer, valeurs négatives) un paiement à l'agrégat d'une clé.
+    La mise à jour est un UPDATE relatif (F()), la ligne est créée au premier
+    paiement du mois ; une création concurrente se rabat sur l'UPDATE.
+    Un retrait sur une ligne absente (supprimée en cascade avec son tenant)
+    est ignoré.
+    """
+    tenant_id, mois, methode_id, statut_id = cle
+    criteres = {
+        'tenant_id': tenant_id,
+        'mois': mois,
+        'methode_id': methode_id,
+        'statut_id': statut_id,
+    }
+    valeurs = {
+        'nombre': F('nombre') + nombre,
+        'montant': F('montant') + montant,
+        'updated_at': timezone.now(),
+    }
+
+    with transaction.atomic():
+        if RevenueRollup.objects.filter(**criteres).update(**valeurs) or nombre < 0:
+            return
+        try:
+            with transaction.atomic():
+                RevenueRollup.objects.create(nombre=nombre, montant=montant, **criteres)
+        except IntegrityError:
+            RevenueRollup.objects.filter(**criteres).update(**valeurs)
+
+
+def recalculer_revenus(tenant_id=None):
+    """
+    Reconstruire les agrégats de revenus depuis la table paiement, en une
+    requête groupée. À utiliser pour l'initialisation et après des
+    modifications en masse (QuerySet.update) qui ne déclenchent pas les signaux.
+    Retourne le nombre de lignes d'agrégat créées.
+    """
+    paiements = Paiement.objects.all()
+    rollups = RevenueRollup.objects.all()
+    if tenant_id is not None:
+        paiements = paiements.filter(tenant_id=tenant_id)
+        rollups = rollups.filter(tenant_id=tenant_id)
+
+    groupes = paiements.annotate(
+        mois=TruncMonth('date_paiement')
+    ).values(
+        'tenant_id', 'mois', 'methode_id', 'statut_id'
+    ).annotate(
+        nombre=Count('paiement_id'),
+        total=Sum('montant')
+    ).order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        crees = RevenueRollup.objects.bulk_create(
+            [
+                RevenueRollup(
+                    tenant_id=groupe['tenant_id'],
+                    mois=mois_revenu(groupe['mois']),
+                    methode_id=groupe['methode_id'],
+                    statut_id=groupe['statut_id'],
+                    nombre=groupe['nombre'],
+                    montant=groupe['total'] or 0,
+                )
+                for groupe in groupes
+            ],
+            batch_size=1000
+        )
+    return len(crees)
+
+
+# Coupons
+
+DUREE_CACHE_COUPON = 60
+
+
+class CouponError(Exception):
+    """Coupon inutilisable (inconnu, expiré, épuisé ou déjà utilisé)"""
+
+
+def cle_cache_coupon(code):
+    return f'facturation:coupon:{code}'
+
+
+def invalider_coupon(code):
+    cache.delete(cle_cache_coupon(code))
+
+
+def coupon_en_cache(code):
+    """
+    Instantané d'un coupon pour la validation publique : l'instance (sans
+    relations), les ids des plans autorisés et sa représentation sérialisée.
+    Les codes inconnus sont aussi mis en cache (None). L'entrée est
+    invalidée à chaque modification et à chaque utilisation du coupon.
+    """
+    from .serializers import CouponSerializer
+
+    cle = cle_cache_coupon(code)
+    instantane = cache.get(cle, False)
+    if instantane is not False:
+        return instantane
+
+    coupon = Coupon.objects.prefetch_related('plans_valides').filter(code=code).first()
+    if coupon is None:
+        instantane = None
+    else:
+        instantane = {
+            'coupon': coupon,
+            'plans': {plan.pk for plan in coupon.plans_valides.all()},
+            'donnees': CouponSerializer(coupon).data,
+        }
+    cache.set(cle, instantane, DUREE_CACHE_COUPON)
+    return instantane
+
+
+def utiliser_coupon(code, tenant_id, montant, plan_id=None):
+    """
+    Consommer une utilisation d'un coupon pour un tenant.
+
+    Le compteur est incrémenté par un UPDATE conditionnel (utilisations
+    restantes, coupon actif et dans sa période) : sous forte concurrence,
+    le coupon ne peut pas dépasser utilisation_max. Le CouponTenant est
+    créé dans la même transaction ; si le tenant a déjà utilisé le coupon,
+    l'incrément est annulé. Retourne le CouponTenant.
+    """
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        coupon = Coupon.objects.filter(code=code).first()
+        if coupon is None:
+            raise CouponError('Coupon invalide')
+        if plan_id is not None and not coupon.plans_valides.filter(pk=plan_id).exists():
+            raise CouponError("Ce coupon n'est pas valide pour ce plan")
+
+        consomme = Coupon.objects.filter(
+            pk=coupon.pk,
+            actif=True,
+            date_debut__lte=maintenant,
+            date_fin__gte=maintenant
+        ).filter(
+            Q(utilisation_max__isnull=True) |
+            Q(utilisations_actuelles__lt=F('utilisation_max'))
+        ).update(
+            utilisations_actuelles=F('utilisations_actuelles') + 1,
+            updated_at=maintenant
+        )
+        if not consomme:
+            raise CouponError("Ce coupon n'est plus valide")
+
+        try:
+            with transaction.atomic():
+                utilisation = CouponTenant.objects.create(
+                    coupon=coupon,
+                    tenant_id=tenant_id,
+                    date_utilisation=maintenant,
+                    montant_avant=montant,
+                    montant_apres=coupon.appliquer_reduction(montant)
+                )
+        except IntegrityError:
+            raise CouponError('Ce coupon a déjà été utilisé par cet établissement')
+
+        transaction.on_commit(lambda: invalider_coupon(code))
+
+    return utilisation
+
+
+# Grille tarifaire des consultations
+
+# tenant_id -> (version, {specialite_id: ([date_debut...], [TarifConsultation...])})
+_grilles_tarifaires = {}
+_verrou_grilles = threading.Lock()
+
+
+def _cle_version_tarifs(tenant_id):
+    return f'facturation:tarifs:version:{tenant_id}'
+
+
+def version_tarifs(tenant_id):
+    """Numéro de version de la grille tarifaire d'un tenant"""
+    return referentiel.version_de(_cle_version_tarifs(tenant_id))
+
+
+def invalider_tarifs(tenant_id):
+    """Forcer le rechargement de la grille tarifaire d'un tenant dans tous les processus"""
+    referentiel.changer_version(_cle_version_tarifs(tenant_id))
+
+
+def grille_tarifaire(tenant_id):
+    """
+    Tarifs d'un tenant chargés une fois par processus, regroupés par
+    spécialité et triés par date de début. Les instances sont partagées
+    et ne doivent pas être modifiées.
+    """
+    version_courante = version_tarifs(tenant_id)
+    copie = _grilles_tarifaires.get(tenant_id)
+    if copie is None or copie[0] != version_courante:
+        grille = {}
+        tarifs = TarifConsultation.objects.filter(
+            tenant_id=tenant_id
+        ).select_related('specialite').order_by('specialite_id', 'date_debut')
+        for tarif in tarifs:
+            debuts, lignes = grille.setdefault(tarif.specialite_id, ([], []))
+            debuts.append(tarif.date_debut)
+            lignes.append(tarif)
+        copie = (version_courante, grille)
+        with _verrou_grilles:
+            _grilles_tarifaires[tenant_id] = copie
+    return copie[1]
+
+
+def _est_en_vigueur(tarif, date_reference):
+    return tarif.date_debut <= date_reference and (
+        tarif.date_fin is None or tarif.date_fin >= date_reference
+    )
+
+
+def tarifs_en_vigueur(tenant_id, date_reference=None):
+    """Tous les tarifs (actifs ou non) d'un tenant valides à une date"""
+    date_reference = date_reference or timezone.localdate()
+    return [
+        tarif
+        for _, lignes in grille_tarifaire(tenant_id).values()
+        for tarif in lignes
+        if _est_en_vigueur(tarif, date_reference)
+    ]
+
+
+def tarif_applicable(tenant_id, specialite_id, date_reference=None):
+    """
+    Tarif actif d'une spécialité à une date : le plus récent dont
+    l'intervalle de validité contient la date, ou None
+    """
+    date_reference = date_reference or timezone.localdate()
+    debuts, lignes = grille_tarifaire(tenant_id).get(specialite_id, ([], []))
+    position = bisect.bisect_right(debuts, date_reference)
+    for tarif in reversed(lignes[:position]):
+        if tarif.actif and _est_en_vigueur(tarif, date_reference):
+            return tarif
+    return None
+
+
+# Facturation des consultations
+
+HEURE_DEBUT_NUIT = 20
+HEURE_FIN_NUIT = 8
+JOURS_WEEKEND = (5, 6)  # samedi, dimanche
+MOT_CLE_URGENCE = 'urgence'
+# Recouvrement appliqué au filigrane pour rattraper les transactions
+# encore ouvertes lors de l'exécution précédente
+MARGE_FILIGRANE = timedelta(minutes=5)
+CHAMPS_TARIFES = ['patient_id', 'tarif_id', 'est_urgence', 'est_nuit', 'est_weekend', 'montant']
+
+
+def conditions_consultation(date_consultation, fuseau, type_rendez_vous=None):
+    """
+    Conditions tarifaires d'une consultation (urgence, nuit, weekend),
+    évaluées à l'heure locale de l'établissement
+    """
+    locale = date_consultation.astimezone(fuseau)
+    est_urgence = bool(type_rendez_vous and MOT_CLE_URGENCE in type_rendez_vous.nom.lower())
+    est_nuit = locale.hour >= HEURE_DEBUT_NUIT or locale.hour < HEURE_FIN_NUIT
+    est_weekend = locale.weekday() in JOURS_WEEKEND
+    return est_urgence, est_nuit, est_weekend
+
+
+def _facturer_lot(consultations, compteurs):
+    """Créer ou mettre à jour les lignes d'un lot ; retourne les consultations sans tarif"""
+    existantes = {
+        ligne.consultation_id: ligne
+        for ligne in LigneFacturationConsultation.objects.filter(
+            consultation_id__in=[c.consultation_id for c in consultations]
+        )
+    }
+    fuseaux = fuseaux_horaires(c.tenant_id for c in consultations)
+    maintenant = timezone.now()
+
+    nouvelles = []
+    modifiees = []
+    sans_tarif = []
+    for consultation in consultations:
+        fuseau = fuseaux[consultation.tenant_id]
+        type_rendez_vous = consultation.rendez_vous.type if consultation.rendez_vous else None
+        est_urgence, est_nuit, est_weekend = conditions_consultation(
+            consultation.date_consultation, fuseau, type_rendez_vous
+        )
+
+        tarif = None
+        specialite_id = consultation.medecin.specialite_principale_id
+        if specialite_id:
+            tarif = tarif_applicable(
+                consultation.tenant_id,
+                specialite_id,
+                consultation.date_consultation.astimezone(fuseau).date()
+            )
+        if tarif is None:
+            sans_tarif.append(consultation)
+            continue
+
+        valeurs = {
+            'patient_id': consultation.patient_id,
+            'tarif_id': tarif.tarif_id,
+            'est_urgence': est_urgence,
+            'est_nuit': est_nuit,
+            'est_weekend': est_weekend,
+            'montant': tarif.get_tarif(est_urgence, est_nuit, est_weekend),
+        }
+
+        ligne = existantes.get(consultation.consultation_id)
+        if ligne is None:
+            nouvelles.append(LigneFacturationConsultation(
+                tenant_id=consultation.tenant_id,
+                consultation_id=consultation.consultation_id,
+                **valeurs
+            ))
+        elif ligne.statut == LigneFacturationConsultation.Statut.A_FACTURER and any(
+            getattr(ligne, champ) != valeur for champ, valeur in valeurs.items()
+        ):
+            # Seules les lignes pas encore facturées suivent la consultation
+            for champ, valeur in valeurs.items():
+                setattr(ligne, champ, valeur)
+            ligne.updated_at = maintenant
+            modifiees.append(ligne)
+
+    LigneFacturationConsultation.objects.bulk_create(nouvelles)
+    LigneFacturationConsultation.objects.bulk_update(
+        modifiees, CHAMPS_TARIFES + ['updated_at']
+    )
+    compteurs['lignes_creees'] += len(nouvelles)
+    compteurs['lignes_mises_a_jour'] += len(modifiees)
+    compteurs['sans_tarif'] += len(sans_tarif)
+    return sans_tarif
+
+
+def facturer_consultations(tenant_id=None, depuis=None, taille_lot=500):
+    """
+    Tarifer par lots les consultations passées et créer leurs lignes de
+    facturation.
+
+    Sans `depuis`, l'exécution reprend au filigrane de la dernière exécution
+    complète : seules les consultations modifiées depuis (updated_at), ou
+    dont la date est passée depuis, sont relues. Le traitement est
+    idempotent, une consultation relue ne crée jamais de seconde ligne.
+    Le filigrane ne dépasse pas la plus ancienne consultation restée sans
+    tarif : elle est relue aux exécutions suivantes jusqu'à ce qu'un tarif
+    la couvre. Les exécutions limitées à un tenant ou à une date ne
+    déplacent pas le filigrane.
+
+    Les tenants sont traités l'un après l'autre, chacun comme tenant
+    courant : le filigrane ne dépasse pas non plus le début de l'exécution,
+    une consultation d'un tenant déjà parcouru pouvant être modifiée
+    pendant le traitement des suivants.
+    """
+    from medical.models import Consultation
+
+    debut = time.monotonic()
+    maintenant = timezone.now()
+    partielle = tenant_id is not None or depuis is not None
+
+    if depuis is not None:
+        a_relire = Q(updated_at__gte=depuis)
+    else:
+        a_relire = Q()
+        precedente = ExecutionFacturationConsultation.objects.filter(
+            filigrane__isnull=False
+        ).first()
+        if precedente:
+            a_relire = (
+                Q(updated_at__gte=precedente.filigrane - MARGE_FILIGRANE) |
+                Q(date_consultation__gt=precedente.date_limite - MARGE_FILIGRANE)
+            )
+
+    compteurs = {
+        'consultations_traitees': 0,
+        'lignes_creees': 0,
+        'lignes_mises_a_jour': 0,
+        'sans_tarif': 0,
+    }
+    filigrane = None
+    # updated_at des premières consultations laissées sans tarif (lots triés)
+    retenues = []
+    for _ in tenancy.par_tenant(None if tenant_id is None else [tenant_id]):
+        consultations = Consultation.objects.filter(
+            a_relire, date_consultation__lte=maintenant
+        ).select_related('medecin', 'rendez_vous__type').order_by('updated_at', 'consultation_id')
+        lot = list(consultations[:taille_lot])
+        while lot:
+            with transaction.atomic():
+                sans_tarif = _facturer_lot(lot, compteurs)
+            if sans_tarif:
+                retenues.append(sans_tarif[0].updated_at)
+            compteurs['consultations_traitees'] += len(lot)
+            dernier = lot[-1]
+            filigrane = max(filigrane or dernier.updated_at, dernier.updated_at)
+            lot = list(consultations.filter(
+                Q(updated_at__gt=dernier.updated_at) |
+                Q(updated_at=dernier.updated_at, consultation_id__gt=dernier.consultation_id)
+            )[:taille_lot])
+    if filigrane is not None:
+        filigrane = min([filigrane, maintenant] + retenues)
+
+    if not partielle and filigrane is None:
+        # Rien de nouveau : conserver le filigrane précédent
+        precedente = ExecutionFacturationConsultation.objects.filter(
+            filigrane__isnull=False
+        ).first()
+        filigrane = precedente.filigrane if precedente else maintenant
+
+    return ExecutionFacturationConsultation.objects.create(
+        filigrane=None if partielle else filigrane,
+        date_limite=None if partielle else maintenant,
+        duree_secondes=time.monotonic() - debut,
+        **compteurs
+    )
@@ -0,0 +1,203 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from trimed_backend import referentiel
+from .models import (
+    PaiementMethode, PaiementStatut, InvoiceStatut, AbonnementStatut, Paiement, Coupon,
+    TarifConsultation, Abonnement, Plan
+)
+from .services import etat_revenu, appliquer_revenu, invalider_coupon, invalider_tarifs
+from . import quotas
+from comptes.models import Utilisateur
+from medical.models import ExamenMedical
+from patients.models import Patient
+
+@receiver([post_save, post_delete], sender=PaiementMethode)
+@receiver([post_save, post_delete], sender=PaiementStatut)
+@receiver([post_save, post_delete], sender=InvoiceStatut)
+@receiver([post_save, post_delete], sender=AbonnementStatut)
+def invalider_referentiel(sender, **kwargs):
+    """
+    Invalider le cache des tables de référence de la facturation
+    """
+    referentiel.invalider(sender)
+
+
+@receiver(pre_save, sender=Paiement)
+def memoriser_revenu_precedent(sender, instance, raw=False, **kwargs):
+    """
+    Mémoriser la clé d'agrégat et le montant d'un paiement avant sa
+    modification, pour pouvoir les retirer de RevenueRollup
+    """
+    instance._revenu_precedent = None
+    if raw or instance.pk is None:
+        return
+    precedent = Paiement.objects.filter(pk=instance.pk).only(
+        'tenant_id', 'date_paiement', 'methode_id', 'statut_id', 'montant'
+    ).first()
+    if precedent is not None:
+        instance._revenu_precedent = etat_revenu(precedent)
+
+
+@receiver(post_save, sender=Paiement)
+def mettre_a_jour_revenus(sender, instance, raw=False, **kwargs):
+    """
+    Reporter la création ou la modification d'un paiement dans RevenueRollup
+    """
+    if raw:
+        return
+    cle, montant = etat_revenu(instance)
+    precedent = getattr(instance, '_revenu_precedent', None)
+    if precedent == (cle, montant):
+        return
+    if precedent is not None:
+        appliquer_revenu(precedent[0], -1, -precedent[1])
+    appliquer_revenu(cle, 1, montant)
+    instance._revenu_precedent = (cle, montant)
+
+
+@receiver(post_delete, sender=Paiement)
+def retirer_revenus(sender, instance, **kwargs):
+    """
+    Retirer un paiement supprimé de RevenueRollup
+    """
+    cle, montant = etat_revenu(instance)
+    appliquer_revenu(cle, -1, -montant)
+
+
+@receiver([post_save, post_delete], sender=Coupon)
+def invalider_cache_coupon(sender, instance, **kwargs):
+    """
+    Retirer un coupon modifié ou supprimé du cache de validation
+    """
+    invalider_coupon(instance.code)
+
+
+@receiver(m2m_changed, sender=Coupon.plans_valides.through)
+def invalider_cache_coupon_plans(sender, instance, **kwargs):
+    """
+    Retirer un coupon du cache quand ses plans autorisés changent
+    """
+    if isinstance(instance, Coupon):
+        invalider_coupon(instance.code)
+    else:
+        for code in Coupon.objects.filter(plans_valides=instance).values_list('code', flat=True):
+            invalider_coupon(code)
+
+
+@receiver([post_save, post_delete], sender=TarifConsultation)
+def invalider_grille_tarifaire(sender, instance, **kwargs):
+    """
+    Recharger la grille tarifaire du tenant après modification d'un tarif
+    """
+    invalider_tarifs(instance.tenant_id)
+
+
+@receiver([post_save, post_delete], sender=Abonnement)
+def invalider_limites_abonnement(sender, instance, **kwargs):
+    """
+    Relire les limites du plan après changement d'abonnement
+    """
+    quotas.invalider_limites([instance.tenant_id])
+
+
+@receiver(post_save, sender=Plan)
+def invalider_limites_plan(sender, instance, **kwargs):
+    """
+    Relire les limites des tenants abonnés à un plan modifié
+    """
+    quotas.invalider_limites(
+        Abonnement.objects.filter(plan=instance).values_list('tenant_id', flat=True)
+    )
+
+
+def _tenant_precedent(sender, instance, champ):
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(champ, flat=True).first()
+
+
+@receiver(pre_save, sender=Utilisateur)
+@receiver(pre_save, sender=Patient)
+def memoriser_tenant_precedent(sender, instance, raw=False, **kwargs):
+    """
+    Mémoriser l'établissement d'un utilisateur ou d'un patient avant
+    modification, pour déplacer son décompte s'il change
+    """
+    if not raw:
+        instance._hopital_precedent = _tenant_precedent(sender, instance, 'hopital_id')
+
+
+@receiver(post_save, sender=Utilisateur)
+@receiver(post_save, sender=Patient)
+def compter_utilisation(sender, instance, created, raw=False, **kwargs):
+    """
+    Mettre à jour les compteurs de quotas à la création ou au changement
+    d'établissement d'un utilisateur ou d'un patient
+    """
+    if raw:
+        return
+    champ = 'utilisateurs' if sender is Utilisateur else 'patients'
+    precedent = None if created else getattr(instance, '_hopital_precedent', None)
+    if precedent != instance.hopital_id:
+        quotas.ajuster_usage(precedent, **{champ: -1})
+        quotas.ajuster_usage(instance.hopital_id, **{champ: 1})
+    instance._hopital_precedent = instance.hopital_id
+
+
+@receiver(post_delete, sender=Utilisateur)
+@receiver(post_delete, sender=Patient)
+def decompter_utilisation(sender, instance, **kwargs):
+    """
+    Décrémenter les compteurs de quotas à la suppression
+    """
+    champ = 'utilisateurs' if sender is Utilisateur else 'patients'
+    quotas.ajuster_usage(instance.hopital_id, **{champ: -1})
+
+
+@receiver(pre_save, sender=ExamenMedical)
+def mesurer_fichier_resultat(sender, instance, raw=False, **kwargs):
+    """
+    Renseigner la taille du fichier de résultat et mémoriser l'état
+    précédent de l'examen pour le décompte du stockage
+    """
+    if raw:
+        return
+    fichier = instance.fichier_resultat
+    if not fichier:
+        instance.taille_fichier_resultat = 0
+    elif not fichier._committed:
+        instance.taille_fichier_resultat = fichier.size
+
+    instance._stockage_precedent = None
+    if instance.pk is not None:
+        instance._stockage_precedent = sender.objects.filter(pk=instance.pk).values_list(
+            'tenant_id', 'taille_fichier_resultat'
+        ).first()
+
+
+@receiver(post_save, sender=ExamenMedical)
+def compter_stockage(sender, instance, raw=False, **kwargs):
+    """
+    Reporter la variation de taille du fichier de résultat dans les
+    compteurs de stockage
+    """
+    if raw:
+        return
+    precedent = getattr(instance, '_stockage_precedent', None)
+    if precedent and precedent[0] != instance.tenant_id:
+        quotas.ajuster_usage(precedent[0], stockage_octets=-precedent[1])
+        precedent = None
+    ancienne_taille = precedent[1] if precedent else 0
+    quotas.ajuster_usage(
+        instance.tenant_id,
+        stockage_octets=instance.taille_fichier_resultat - ancienne_taille
+    )
+    instance._stockage_precedent = (instance.tenant_id, instance.taille_fichier_resultat)
+
+
+@receiver(post_delete, sender=ExamenMedical)
+def decompter_stockage(sender, instance, **kwargs):
+    """
+    Libérer le stockage d'un examen supprimé
+    """
+    quotas.ajuster_usage(instance.tenant_id, stockage_octets=-instance.taille_fichier_resultat)
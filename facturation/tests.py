@@ -1,3 +1,281 @@
-from django.test import TestCase
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from comptes.models import Utilisateur
+from gestion_tenants.models import ParametreHopital, Tenant
+from medical.models import Consultation, Medecin, Specialite
+from patients.models import Patient
+from notifications import services as notifications
+from notifications.models import Notification
+from trimed_backend import referentiel, tenancy
+from . import services
+from .models import (
+    Abonnement, Invoice, LigneFacturationConsultation, Paiement, Plan, RevenueRollup,
+    SequenceFacture, TarifConsultation, UsageTenant
+)
+from .services import (
+    STATUT_ABONNEMENT_EXPIRE, STATUT_PAIEMENT_PAYE, allouer_numero_facture,
+    allouer_numeros_facture, executer_cycle_abonnements, facturer_consultations,
+    generer_factures_manquantes, grille_tarifaire, tarif_applicable
+)
 
-# Create your tests here.
+
+SCHEMA_DEPLACE = 'hopital_deplace'
+
+
+@contextmanager
+def tenants_traites(objet, nom):
+    """Noter (tenant courant, schéma des connexions) à chaque appel de objet.nom"""
+    vus = []
+    original = getattr(objet, nom)
+
+    def espion(*args, **kwargs):
+        vus.append((tenancy.tenant_courant(), tenancy._parametres_voulus()[1]))
+        return original(*args, **kwargs)
+
+    with mock.patch.object(objet, nom, side_effect=espion):
+        yield vus
+
+
+class FacturationTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+
+    def setUp(self):
+        # Les ids sont réutilisés d'un test à l'autre : pas de cache hérité
+        cache.clear()
+
+    def consultation(self, nom_specialite, il_y_a):
+        specialite = Specialite.objects.create(nom_specialite=nom_specialite)
+        utilisateur = Utilisateur.objects.creer_utilisateur(
+            f'{nom_specialite.lower()}@test.fr', f'Dr {nom_specialite}', 'secret',
+            role='medecin', hopital=self.tenant
+        )
+        medecin = Medecin.objects.get(utilisateur=utilisateur)
+        medecin.specialite_principale = specialite
+        medecin.save()
+        patient = Patient.objects.create(
+            hopital=self.tenant, nom='Patient', prenom=nom_specialite,
+            numero_dossier_medical=f'DOS-{nom_specialite}'
+        )
+        consultation = Consultation.objects.create(
+            tenant=self.tenant, patient=patient, medecin=medecin, motif='Suivi',
+            date_consultation=timezone.now() - il_y_a
+        )
+        Consultation.objects.filter(pk=consultation.pk).update(updated_at=timezone.now() - il_y_a)
+        return consultation, specialite
+
+
+class NumerotationTests(FacturationTestCase):
+
+    def test_numeros_consecutifs_par_annee(self):
+        self.assertEqual(
+            allouer_numeros_facture(self.tenant.pk, 2026, 2),
+            [f'FAC-2026-{self.tenant.pk:04d}-000001', f'FAC-2026-{self.tenant.pk:04d}-000002']
+        )
+        self.assertEqual(allouer_numero_facture(self.tenant.pk, 2026), f'FAC-2026-{self.tenant.pk:04d}-000003')
+        self.assertEqual(allouer_numero_facture(self.tenant.pk, 2027), f'FAC-2027-{self.tenant.pk:04d}-000001')
+
+    def test_rollback_libere_les_numeros(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                allouer_numeros_facture(self.tenant.pk, 2026, 5)
+                raise RuntimeError
+        self.assertEqual(allouer_numero_facture(self.tenant.pk, 2026), f'FAC-2026-{self.tenant.pk:04d}-000001')
+
+
+class FacturesManquantesTests(FacturationTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        plan = Plan.objects.create(nom='Essentiel', prix_mensuel=10, prix_annuel=100)
+        cls.abonnement = Abonnement.objects.create(
+            tenant=cls.tenant, plan=plan, statut=referentiel.statut_abonnement('actif', creer=True),
+            date_debut=timezone.localdate(), date_fin=timezone.localdate() + timedelta(days=30)
+        )
+
+    def paiement(self, statut, date_paiement=None):
+        return Paiement.objects.create(
+            tenant=self.tenant, abonnement=self.abonnement,
+            methode=referentiel.methode_paiement('carte', creer=True),
+            statut=referentiel.statut_paiement(statut, creer=True),
+            montant=Decimal('100.00'), date_paiement=date_paiement or timezone.now()
+        )
+
+    def test_numeros_dans_l_ordre_des_paiements(self):
+        """Un paiement saisi après coup reçoit un numéro à sa place chronologique"""
+        maintenant = timezone.now().replace(month=6, day=15)
+        recent = self.paiement(STATUT_PAIEMENT_PAYE, maintenant)
+        ancien = self.paiement(STATUT_PAIEMENT_PAYE, maintenant - timedelta(days=3))
+        meme_date = self.paiement(STATUT_PAIEMENT_PAYE, maintenant - timedelta(days=3))
+
+        # Lots d'un paiement : la reprise après chaque lot suit aussi (date, id)
+        self.assertEqual(generer_factures_manquantes(self.tenant.pk, taille_lot=1), 3)
+        numeros = {
+            facture.paiement_id: facture.numero_facture[-6:] for facture in Invoice.objects.all()
+        }
+        self.assertEqual(
+            [numeros[ancien.pk], numeros[meme_date.pk], numeros[recent.pk]],
+            ['000001', '000002', '000003']
+        )
+
+    def test_seuls_les_paiements_payes_sont_factures(self):
+        paye = self.paiement(STATUT_PAIEMENT_PAYE)
+        self.paiement('en attente')
+        self.paiement('remboursé')
+
+        self.assertEqual(generer_factures_manquantes(self.tenant.pk), 1)
+        facture = Invoice.objects.get()
+        self.assertEqual(facture.paiement, paye)
+        self.assertEqual(facture.statut.nom, STATUT_PAIEMENT_PAYE)
+        self.assertTrue(facture.numero_facture.endswith('-000001'))
+
+        # Déjà facturé : rien à refaire
+        self.assertEqual(generer_factures_manquantes(self.tenant.pk), 0)
+
+
+class CycleAbonnementsTests(FacturationTestCase):
+
+    def test_echeance_a_la_date_locale_du_tenant(self):
+        """À midi UTC le 15, Kiritimati (UTC+14) est déjà le 16, Pago Pago (UTC-11) encore le 15"""
+        plan = Plan.objects.create(nom='Essentiel', prix_mensuel=10, prix_annuel=100)
+        actif = referentiel.statut_abonnement('actif', creer=True)
+        abonnements = {}
+        for fuseau in ('Pacific/Kiritimati', 'Pacific/Pago_Pago'):
+            tenant = Tenant.objects.create(nom=fuseau, nombre_de_lits=10)
+            ParametreHopital.objects.create(tenant=tenant, fuseau_horaire=fuseau)
+            abonnements[fuseau] = Abonnement.objects.create(
+                tenant=tenant, plan=plan, statut=actif,
+                date_debut=date(2026, 5, 15), date_fin=date(2026, 6, 15)
+            )
+
+        midi_utc = datetime(2026, 6, 15, 12, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=midi_utc):
+            execution = executer_cycle_abonnements()
+
+        self.assertEqual(execution.abonnements_expires, 1)
+        for abonnement in abonnements.values():
+            abonnement.refresh_from_db()
+        self.assertEqual(abonnements['Pacific/Kiritimati'].statut.nom, STATUT_ABONNEMENT_EXPIRE)
+        self.assertEqual(abonnements['Pacific/Pago_Pago'].statut, actif)
+
+
+class FacturationConsultationsTests(FacturationTestCase):
+
+    def test_consultation_sans_tarif_reprise_apres_ajout_du_tarif(self):
+        sans_tarif, specialite = self.consultation('Dermatologie', timedelta(days=2))
+        tarifee, autre = self.consultation('Cardiologie', timedelta(hours=1))
+        debut = timezone.localdate() - timedelta(days=10)
+        TarifConsultation.objects.create(
+            tenant=self.tenant, specialite=autre, tarif_normal=Decimal('50'), date_debut=debut
+        )
+
+        execution = facturer_consultations()
+        self.assertEqual((execution.lignes_creees, execution.sans_tarif), (1, 1))
+        # Filigrane retenu avant la consultation sans tarif, malgré la suivante
+        self.assertLessEqual(execution.filigrane, Consultation.objects.get(pk=sans_tarif.pk).updated_at)
+
+        TarifConsultation.objects.create(
+            tenant=self.tenant, specialite=specialite, tarif_normal=Decimal('40'), date_debut=debut
+        )
+        execution = facturer_consultations()
+        self.assertEqual((execution.lignes_creees, execution.sans_tarif), (1, 0))
+        self.assertEqual(
+            LigneFacturationConsultation.objects.get(consultation=sans_tarif).montant, Decimal('40')
+        )
+        self.assertTrue(LigneFacturationConsultation.objects.filter(consultation=tarifee).exists())
+
+
+class GrilleTarifaireTests(FacturationTestCase):
+
+    def test_nouveau_tarif_visible_aussitot(self):
+        specialite = Specialite.objects.create(nom_specialite='Cardiologie')
+        debut = timezone.localdate() - timedelta(days=10)
+        TarifConsultation.objects.create(
+            tenant=self.tenant, specialite=specialite, tarif_normal=Decimal('50'), date_debut=debut
+        )
+        self.assertEqual(tarif_applicable(self.tenant.pk, specialite.pk).tarif_normal, Decimal('50'))
+
+        TarifConsultation.objects.create(
+            tenant=self.tenant, specialite=specialite, tarif_normal=Decimal('60'),
+            date_debut=debut + timedelta(days=5)
+        )
+        self.assertEqual(len(grille_tarifaire(self.tenant.pk)[specialite.pk][1]), 2)
+        self.assertEqual(tarif_applicable(self.tenant.pk, specialite.pk).tarif_normal, Decimal('60'))
+
+    def test_date_reference_invalide_refusee(self):
+        utilisateur = Utilisateur.objects.creer_utilisateur(
+            'personnel@test.fr', 'Personnel Test', 'secret', role='personnel', hopital=self.tenant
+        )
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(utilisateur)
+        response = client.get('/api/facturation/tarifs-consultation/', {'date_reference': '2026-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_reference', response.json())
+        response = client.get('/api/facturation/tarifs-consultation/', {'date_reference': '2026-06-15'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(TENANT_SCHEMAS=True)
+class TraitementsParTenantTests(FacturationTestCase):
+    """Les commandes traitent chaque tenant dans ses tables, y compris un tenant déplacé"""
+
+    def setUp(self):
+        super().setUp()
+        Tenant.objects.filter(pk=self.tenant.pk).update(nom_schema_base_de_donnees=SCHEMA_DEPLACE)
+        self.attendu = [(self.tenant.pk, SCHEMA_DEPLACE)]
+
+    def executer(self, nom, *args):
+        call_command(nom, *args, stdout=StringIO())
+
+    def test_facturer_consultations(self):
+        consultation, specialite = self.consultation('Cardiologie', timedelta(hours=1))
+        TarifConsultation.objects.create(
+            tenant=self.tenant, specialite=specialite, tarif_normal=Decimal('50'),
+            date_debut=timezone.localdate() - timedelta(days=10)
+        )
+        with tenants_traites(services, '_facturer_lot') as vus:
+            self.executer('facturer_consultations')
+        self.assertEqual(vus, self.attendu)
+        self.assertTrue(LigneFacturationConsultation.objects.filter(consultation=consultation).exists())
+
+    def test_recalculer_quotas(self):
+        self.consultation('Cardiologie', timedelta(hours=1))
+        with tenants_traites(Patient.objects, 'count') as vus:
+            self.executer('recalculer_quotas')
+        self.assertEqual(vus, self.attendu)
+        self.assertEqual(UsageTenant.objects.get(tenant=self.tenant).patients, 1)
+
+    def test_cycle_abonnements(self):
+        proprietaire = Utilisateur.objects.creer_utilisateur(
+            'proprietaire@test.fr', 'Propriétaire Test', 'secret',
+            role='proprietaire-hopital', hopital=self.tenant
+        )
+        Tenant.objects.filter(pk=self.tenant.pk).update(proprietaire_utilisateur=proprietaire)
+        Abonnement.objects.create(
+            tenant=self.tenant, plan=Plan.objects.create(nom='Essentiel', prix_mensuel=10, prix_annuel=100),
+            statut=referentiel.statut_abonnement('actif', creer=True),
+            date_debut=timezone.localdate() - timedelta(days=30),
+            date_fin=timezone.localdate() - timedelta(days=1)
+        )
+        with tenants_traites(notifications, 'creer_notifications') as vus:
+            self.executer('cycle_abonnements')
+        self.assertEqual(vus, self.attendu)
+        self.assertTrue(Notification.objects.filter(tenant=self.tenant, utilisateur=proprietaire).exists())
+
+    def test_factures_et_revenus_dans_les_tables_partagees(self):
+        """generer_factures et recalculer_revenus ne lisent que des tables restées partagées"""
+        dans_les_schemas = {modele for modele, _ in tenancy.modeles_du_schema()}
+        for modele in (Paiement, Invoice, RevenueRollup, SequenceFacture):
+            self.assertNotIn(modele, dans_les_schemas)
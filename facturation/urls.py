@@ -1,8 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .views import (
+    AbonnementViewSet, PaiementViewSet, CouponViewSet, TarifConsultationViewSet,
+    PaiementMethodeViewSet, PaiementStatutViewSet, InvoiceStatutViewSet,
+    AbonnementStatutViewSet, InvoiceViewSet
+)
 
 router = DefaultRouter()
-# TODO: Ajouter les routes nécessaires
+router.register(r'abonnements', AbonnementViewSet, basename='abonnement')
+router.register(r'paiements', PaiementViewSet, basename='paiement')
+router.register(r'factures', InvoiceViewSet, basename='facture')
+router.register(r'coupons', CouponViewSet, basename='coupon')
+router.register(r'tarifs-consultation', TarifConsultationViewSet, basename='tarif')
+router.register(r'methodes-paiement', PaiementMethodeViewSet, basename='methode-paiement')
+router.register(r'statuts-paiement', PaiementStatutViewSet, basename='statut-paiement')
+router.register(r'statuts-facture', InvoiceStatutViewSet, basename='statut-facture')
+router.register(r'statuts-abonnement', AbonnementStatutViewSet, basename='statut-abonnement')
 
 urlpatterns = [
     path('', include(router.urls)),
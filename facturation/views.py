@@ -4,20 +4,57 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.throttling import ScopedRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.db import models
 from datetime import timedelta
 from .models import (
     Plan, Abonnement, Paiement, Invoice, Coupon, TarifConsultation,
-    PaiementMethode, PaiementStatut
+    PaiementMethode, PaiementStatut, InvoiceStatut, AbonnementStatut, RevenueRollup
 )
 from .serializers import (
     PlanSerializer, AbonnementSerializer, PaiementSerializer,
     InvoiceSerializer, CouponSerializer, ValidationCouponSerializer,
-    TarifConsultationSerializer
+    TarifConsultationSerializer, PaiementMethodeSerializer,
+    PaiementStatutSerializer, InvoiceStatutSerializer, AbonnementStatutSerializer,
+    CalculTarifsSerializer
+)
+from .services import (
+    renouveler_abonnement, RenouvellementError, pdf_facture,
+    utiliser_coupon, CouponError, tarifs_en_vigueur, tarif_applicable
 )
 from comptes.permissions import EstAdminSysteme, EstProprietaireHopital
+from trimed_backend.filtres import date_requete, journee_requete
+from trimed_backend.referentiel import ReferentielCacheMixin
+from . import quotas
+from trimed_backend.replicas import lecture_replica
+
+class PaiementMethodeViewSet(ReferentielCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les méthodes de paiement (lecture seule)"""
+    queryset = PaiementMethode.objects.order_by('nom')
+    serializer_class = PaiementMethodeSerializer
+    permission_classes = [IsAuthenticated]
+
+class PaiementStatutViewSet(ReferentielCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les statuts de paiement (lecture seule)"""
+    queryset = PaiementStatut.objects.order_by('nom')
+    serializer_class = PaiementStatutSerializer
+    permission_classes = [IsAuthenticated]
+
+class InvoiceStatutViewSet(ReferentielCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les statuts de facture (lecture seule)"""
+    queryset = InvoiceStatut.objects.order_by('nom')
+    serializer_class = InvoiceStatutSerializer
+    permission_classes = [IsAuthenticated]
+
+class AbonnementStatutViewSet(ReferentielCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les statuts d'abonnement (lecture seule)"""
+    queryset = AbonnementStatut.objects.order_by('nom')
+    serializer_class = AbonnementStatutSerializer
+    permission_classes = [IsAuthenticated]
 
 class AbonnementViewSet(viewsets.ModelViewSet):
     """ViewSet pour les abonnements"""
@@ -56,6 +93,25 @@ class AbonnementViewSet(viewsets.ModelViewSet):
         
         return Abonnement.objects.none()
     
+    @action(detail=False, methods=['get'])
+    def utilisation(self, request):
+        """Utilisation du tenant comparée aux limites de son plan"""
+        if not request.user.hopital:
+            return Response(
+                {'error': 'Aucun tenant associé'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        usage = quotas.usage(request.user.hopital_id)
+        limites = quotas.limites(request.user.hopital_id)
+        return Response({
+            ressource: {
+                'utilise': getattr(usage, champ),
+                'limite': limites.get(champ),
+            }
+            for ressource, (champ, _, _) in quotas.RESSOURCES.items()
+        })
+    
     @action(detail=True, methods=['post'])
     def renouveler(self, request, pk=None):
         """Renouveler un abonnement"""
@@ -68,38 +124,31 @@ class AbonnementViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        periode_mois = request.data.get('periode_mois', 1)
-        date_renouvellement = timezone.now()
-        
-        # Calculer la nouvelle date de fin
-        if abonnement.date_fin < date_renouvellement.date():
-            nouvelle_date_fin = date_renouvellement.date() + timedelta(days=30 * periode_mois)
-        else:
-            nouvelle_date_fin = abonnement.date_fin + timedelta(days=30 * periode_mois)
-        
-        # Mettre à jour l'abonnement
-        abonnement.date_fin = nouvelle_date_fin
-        abonnement.save()
-        
-        # Créer un paiement pour le renouvellement
-        montant = abonnement.plan.prix_mensuel * periode_mois
-        
-        paiement = Paiement.objects.create(
-            tenant=abonnement.tenant,
-            abonnement=abonnement,
-            methode=PaiementMethode.objects.get(nom='Carte bancaire'),
-            statut=PaiementStatut.objects.get(nom='payé'),
-            montant=montant,
-            date_paiement=date_renouvellement,
-            reference=f"RENOUV_{abonnement.tenant.tenant_id}_{date_renouvellement.strftime('%Y%m%d')}"
+        cle_idempotence = (
+            request.headers.get('Idempotency-Key') or
+            request.data.get('cle_idempotence')
         )
         
+        try:
+            renouvellement, cree = renouveler_abonnement(
+                abonnement.pk,
+                periode_mois=request.data.get('periode_mois', 1),
+                cle_idempotence=cle_idempotence
+            )
+        except RenouvellementError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        paiement = renouvellement.paiement
         return Response({
-            'message': 'Abonnement renouvelé avec succès',
-            'ancienne_date_fin': abonnement.date_fin - timedelta(days=30 * periode_mois),
-            'nouvelle_date_fin': abonnement.date_fin,
-            'paiement': PaiementSerializer(paiement).data
-        })
+            'message': 'Abonnement renouvelé avec succès' if cree else 'Renouvellement déjà effectué',
+            'ancienne_date_fin': renouvellement.ancienne_date_fin,
+            'nouvelle_date_fin': renouvellement.nouvelle_date_fin,
+            'paiement': PaiementSerializer(paiement).data,
+            'facture': InvoiceSerializer(paiement.invoice).data
+        }, status=status.HTTP_201_CREATED if cree else status.HTTP_200_OK)
     
     @action(detail=False, methods=['get'])
     def abonnements_expirant(self, request):
@@ -110,14 +159,14 @@ class AbonnementViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset().filter(
             date_fin__lte=date_limite,
             date_fin__gte=timezone.now().date()
-        )
+        ).select_related('plan', 'statut', 'tenant')
         
         serializer = self.get_serializer(queryset, many=True)
         return Response({
             'date_limite': date_limite,
             'jours': jours,
             'abonnements': serializer.data,
-            'total': queryset.count()
+            'total': len(serializer.data)
         })
 
 class PaiementViewSet(viewsets.ModelViewSet):
@@ -143,47 +192,221 @@ class PaiementViewSet(viewsets.ModelViewSet):
         
         return Paiement.objects.none()
     
-    @action(detail=False, methods=['get'])
-    def statistiques(self, request):
-        """Statistiques des paiements"""
+    def _revenus(self, request):
+        """Agrégats de revenus visibles par l'utilisateur (None si aucun tenant)"""
         user = request.user
-        
         if user.role == 'admin-systeme':
-            queryset = Paiement.objects.all()
-        elif user.hopital:
-            queryset = Paiement.objects.filter(tenant=user.hopital)
-        else:
+            return RevenueRollup.objects.all()
+        if user.hopital:
+            return RevenueRollup.objects.filter(tenant=user.hopital)
+        return None
+    
+    @action(detail=False, methods=['get'])
+    @lecture_replica
+    def statistiques(self, request):
+        """Statistiques des paiements (lues dans les agrégats mensuels)"""
+        revenus = self._revenus(request)
+        if revenus is None:
             return Response(
                 {'error': 'Aucun tenant associé'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Paiements du mois
-        debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        paiements_mois = queryset.filter(date_paiement__gte=debut_mois)
-        
-        # Paiements de l'année
+        debut_mois = timezone.localdate().replace(day=1)
         debut_annee = debut_mois.replace(month=1)
-        paiements_annee = queryset.filter(date_paiement__gte=debut_annee)
+        
+        # Une seule requête groupée, repliée ensuite en Python
+        lignes = revenus.values('mois', 'methode__nom', 'statut__nom').annotate(
+            total=models.Sum('nombre'),
+            montant=models.Sum('montant')
+        ).order_by()
         
         data = {
-            'total_paiements': queryset.count(),
-            'montant_total': float(queryset.aggregate(models.Sum('montant'))['montant__sum'] or 0),
-            'paiements_mois': paiements_mois.count(),
-            'montant_mois': float(paiements_mois.aggregate(models.Sum('montant'))['montant__sum'] or 0),
-            'paiements_annee': paiements_annee.count(),
-            'montant_annee': float(paiements_annee.aggregate(models.Sum('montant'))['montant__sum'] or 0),
-            'par_methode': list(queryset.values('methode__nom').annotate(
-                total=models.Count('paiement_id'),
-                montant=models.Sum('montant')
-            )),
-            'par_statut': list(queryset.values('statut__nom').annotate(
-                total=models.Count('paiement_id'),
-                montant=models.Sum('montant')
-            )),
+            'total_paiements': 0,
+            'montant_total': 0.0,
+            'paiements_mois': 0,
+            'montant_mois': 0.0,
+            'paiements_annee': 0,
+            'montant_annee': 0.0,
         }
+        par_methode = {}
+        par_statut = {}
+        for ligne in lignes:
+            total = ligne['total'] or 0
+            montant = float(ligne['montant'] or 0)
+            if not total:
+                continue
+            data['total_paiements'] += total
+            data['montant_total'] += montant
+            if ligne['mois'] >= debut_mois:
+                data['paiements_mois'] += total
+                data['montant_mois'] += montant
+            if ligne['mois'] >= debut_annee:
+                data['paiements_annee'] += total
+                data['montant_annee'] += montant
+            for groupes, cle, nom in (
+                (par_methode, 'methode__nom', ligne['methode__nom']),
+                (par_statut, 'statut__nom', ligne['statut__nom']),
+            ):
+                groupe = groupes.setdefault(nom, {cle: nom, 'total': 0, 'montant': 0.0})
+                groupe['total'] += total
+                groupe['montant'] += montant
+        
+        data['par_methode'] = list(par_methode.values())
+        data['par_statut'] = list(par_statut.values())
         
         return Response(data)
+    
+    @action(detail=False, methods=['get'])
+    @lecture_replica
+    def revenus_mensuels(self, request):
+        """Revenus mois par mois d'une année, comparés à l'année précédente"""
+        revenus = self._revenus(request)
+        if revenus is None:
+            return Response(
+                {'error': 'Aucun tenant associé'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            annee = int(request.query_params.get('annee', timezone.localdate().year))
+        except ValueError:
+            return Response(
+                {'error': 'Année invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        revenus = revenus.filter(mois__year__in=[annee - 1, annee])
+        if request.query_params.get('statut'):
+            revenus = revenus.filter(statut__nom=request.query_params['statut'])
+        
+        lignes = revenus.values('mois').annotate(
+            total=models.Sum('nombre'),
+            montant=models.Sum('montant')
+        ).order_by()
+        par_mois = {(ligne['mois'].year, ligne['mois'].month): ligne for ligne in lignes}
+        
+        mois = []
+        for numero in range(1, 13):
+            courant = par_mois.get((annee, numero), {})
+            precedent = par_mois.get((annee - 1, numero), {})
+            mois.append({
+                'mois': numero,
+                'paiements': courant.get('total') or 0,
+                'montant': float(courant.get('montant') or 0),
+                'paiements_annee_precedente': precedent.get('total') or 0,
+                'montant_annee_precedente': float(precedent.get('montant') or 0),
+            })
+        
+        return Response({
+            'annee': annee,
+            'mois': mois,
+            'montant_total': sum(m['montant'] for m in mois),
+            'montant_total_annee_precedente': sum(m['montant_annee_precedente'] for m in mois),
+        })
+
+TAILLE_BLOC_PDF = 64 * 1024
+
+
+def _plage_demandee(entete, taille):
+    """
+    Interpréter un en-tête Range à une seule plage (bytes=debut-fin).
+    Retourne (debut, fin) inclusifs, None pour servir le fichier entier,
+    ou False si la plage ne peut être satisfaite.
+    """
+    if not entete or not entete.startswith('bytes=') or ',' in entete:
+        return None
+    debut, _, fin = entete[len('bytes='):].strip().partition('-')
+    try:
+        if debut:
+            debut = int(debut)
+            fin = min(int(fin), taille - 1) if fin else taille - 1
+        elif fin:
+            # Suffixe : les N derniers octets
+            debut = max(taille - int(fin), 0)
+            fin = taille - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if debut > fin or debut >= taille:
+        return False
+    return debut, fin
+
+
+def _lire_fichier(fichier, debut, longueur):
+    try:
+        fichier.seek(debut)
+        while longueur > 0:
+            bloc = fichier.read(min(TAILLE_BLOC_PDF, longueur))
+            if not bloc:
+                break
+            longueur -= len(bloc)
+            yield bloc
+    finally:
+        fichier.close()
+
+
+class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les factures (lecture seule)"""
+    queryset = Invoice.objects.select_related('paiement', 'statut', 'tenant')
+    serializer_class = InvoiceSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['tenant', 'statut']
+    search_fields = ['numero_facture']
+    ordering_fields = ['date_emission', 'montant_ttc', 'created_at']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        
+        if self.action == 'pdf':
+            queryset = queryset.select_related('paiement__methode', 'paiement__abonnement__plan')
+        
+        if user.role == 'admin-systeme':
+            return queryset
+        
+        if user.role == 'proprietaire-hopital' and user.hopital:
+            return queryset.filter(tenant=user.hopital)
+        
+        return Invoice.objects.none()
+    
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Télécharger le PDF de la facture (prend en charge Range)"""
+        facture = self.get_object()
+        chemin = pdf_facture(facture)
+        
+        # Le nom du fichier est l'empreinte du contenu : il sert d'ETag
+        etag = '"%s"' % chemin.rsplit('/', 1)[-1][:-len('.pdf')]
+        if etag in [valeur.strip() for valeur in request.headers.get('If-None-Match', '').split(',')]:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        
+        taille = default_storage.size(chemin)
+        plage = None
+        if request.headers.get('If-Range', etag) == etag:
+            plage = _plage_demandee(request.headers.get('Range'), taille)
+        if plage is False:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{taille}'
+            return response
+        
+        debut, fin = plage or (0, taille - 1)
+        response = StreamingHttpResponse(
+            _lire_fichier(default_storage.open(chemin, 'rb'), debut, fin - debut + 1),
+            content_type='application/pdf',
+            status=status.HTTP_206_PARTIAL_CONTENT if plage else status.HTTP_200_OK
+        )
+        response['Content-Length'] = str(fin - debut + 1)
+        if plage:
+            response['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'attachment; filename="{facture.numero_facture}.pdf"'
+        return response
 
 class CouponViewSet(viewsets.ModelViewSet):
     """ViewSet pour les coupons"""
@@ -194,17 +417,20 @@ class CouponViewSet(viewsets.ModelViewSet):
     search_fields = ['code', 'description']
     ordering_fields = ['date_debut', 'date_fin', 'created_at']
     
-    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    throttle_scope = 'coupon_validation'
+    
+    @action(
+        detail=False, methods=['post'],
+        permission_classes=[AllowAny], throttle_classes=[ScopedRateThrottle]
+    )
     def valider(self, request):
         """Valider un coupon"""
         serializer = ValidationCouponSerializer(data=request.data)
         
         if serializer.is_valid():
-            coupon = serializer.validated_data['coupon']
-            
             return Response({
                 'valide': True,
-                'coupon': CouponSerializer(coupon).data,
+                'coupon': serializer.validated_data['coupon_donnees'],
                 'montant_initial': serializer.validated_data['montant_initial'],
                 'montant_final': serializer.validated_data['montant_final'],
                 'reduction': serializer.validated_data['reduction'],
@@ -215,6 +441,41 @@ class CouponViewSet(viewsets.ModelViewSet):
             'valide': False,
             'erreurs': serializer.errors
         }, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, EstProprietaireHopital])
+    def utiliser(self, request):
+        """Utiliser un coupon pour l'établissement de l'utilisateur"""
+        if not request.user.hopital:
+            return Response(
+                {'error': 'Aucun tenant associé'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = ValidationCouponSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'valide': False,
+                'erreurs': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            utilisation = utiliser_coupon(
+                serializer.validated_data['code'],
+                request.user.hopital.pk,
+                serializer.validated_data['montant'],
+                plan_id=serializer.validated_data.get('plan_id')
+            )
+        except CouponError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        
+        return Response({
+            'coupon': utilisation.coupon.code,
+            'date_utilisation': utilisation.date_utilisation,
+            'montant_initial': utilisation.montant_avant,
+            'montant_final': utilisation.montant_apres,
+            'reduction': utilisation.montant_avant - utilisation.montant_apres,
+            'message': 'Coupon appliqué'
+        }, status=status.HTTP_201_CREATED)
 
 class TarifConsultationViewSet(viewsets.ModelViewSet):
     """ViewSet pour les tarifs de consultation"""
@@ -229,19 +490,14 @@ class TarifConsultationViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        # Filtrer par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
         # Filtrer par date de validité
-        date_reference = self.request.query_params.get('date_reference')
-        if date_reference:
-            try:
-                date_ref = timezone.datetime.strptime(date_reference, '%Y-%m-%d').date()
-            except ValueError:
-                date_ref = timezone.now().date()
-        else:
-            date_ref = timezone.now().date()
+        date_ref = date_requete(self.request, 'date_reference')
+        
+        if user.hopital:
+            # Tarifs en vigueur lus dans la grille en mémoire du tenant
+            return queryset.filter(
+                pk__in=[tarif.pk for tarif in tarifs_en_vigueur(user.hopital.pk, date_ref)]
+            )
         
         queryset = queryset.filter(
             date_debut__lte=date_ref
@@ -269,34 +525,69 @@ class TarifConsultationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if not request.user.hopital:
+            return Response(
+                {'error': 'Aucun tenant associé'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
-            tarif = TarifConsultation.objects.filter(
-                tenant=request.user.hopital,
-                specialite_id=specialite_id,
-                actif=True,
-                date_debut__lte=timezone.now().date()
-            ).filter(
-                models.Q(date_fin__isnull=True) | models.Q(date_fin__gte=timezone.now().date())
-            ).first()
-            
-            if not tarif:
-                raise TarifConsultation.DoesNotExist()
-            
-            montant = tarif.get_tarif(est_urgence, est_nuit, est_weekend)
-            
-            return Response({
-                'tarif': TarifConsultationSerializer(tarif).data,
-                'conditions': {
-                    'urgence': est_urgence,
-                    'nuit': est_nuit,
-                    'weekend': est_weekend
-                },
-                'montant': montant,
-                'duree': tarif.duree_consultation
-            })
+            specialite_id = int(specialite_id)
+        except ValueError:
+            return Response(
+                {'error': 'specialite_id invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        except TarifConsultation.DoesNotExist:
+        tarif = tarif_applicable(request.user.hopital.pk, specialite_id, journee_requete(request))
+        if not tarif:
             return Response(
                 {'error': 'Aucun tarif trouvé pour cette spécialité'},
                 status=status.HTTP_404_NOT_FOUND
-            )
\ No newline at end of file
+            )
+        
+        montant = tarif.get_tarif(est_urgence, est_nuit, est_weekend)
+        
+        return Response({
+            'tarif': TarifConsultationSerializer(tarif).data,
+            'conditions': {
+                'urgence': est_urgence,
+                'nuit': est_nuit,
+                'weekend': est_weekend
+            },
+            'montant': montant,
+            'duree': tarif.duree_consultation
+        })
+    
+    @action(detail=False, methods=['post'])
+    def calculer_tarifs(self, request):
+        """Calculer en une fois les tarifs de plusieurs combinaisons"""
+        if not request.user.hopital:
+            return Response(
+                {'error': 'Aucun tenant associé'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = CalculTarifsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        date_reference = serializer.validated_data.get('date_reference') or journee_requete(request)
+        resultats = []
+        for demande in serializer.validated_data['demandes']:
+            tarif = tarif_applicable(request.user.hopital.pk, demande['specialite_id'], date_reference)
+            resultat = dict(demande)
+            if tarif:
+                resultat.update({
+                    'tarif_id': tarif.tarif_id,
+                    'montant': tarif.get_tarif(demande['urgence'], demande['nuit'], demande['weekend']),
+                    'duree': tarif.duree_consultation,
+                })
+            else:
+                resultat['error'] = 'Aucun tarif trouvé pour cette spécialité'
+            resultats.append(resultat)
+        
+        return Response({
+            'date_reference': date_reference,
+            'resultats': resultats
+        })
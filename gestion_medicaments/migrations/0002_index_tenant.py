@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_medicaments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicament',
+            index=models.Index(fields=['tenant', 'stock_actuel'], name='medicament_tenant__cfd3bb_idx'),
+        ),
+    ]
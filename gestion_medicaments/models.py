@@ -2,6 +2,7 @@
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator
+from trimed_backend.tenancy import TenantManager
 
 class MedicamentCategorie(models.Model):
     """TABLE MedicamentCategorie"""
@@ -19,6 +20,8 @@ class MedicamentCategorie(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return self.nom
     
@@ -91,6 +94,8 @@ class Medicament(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return self.nom
     
@@ -105,6 +110,7 @@ class Medicament(models.Model):
         verbose_name_plural = 'Médicaments'
         indexes = [
             models.Index(fields=['tenant', 'nom']),
+            models.Index(fields=['tenant', 'stock_actuel']),
             models.Index(fields=['categorie']),
             models.Index(fields=['actif']),
         ]
\ No newline at end of file
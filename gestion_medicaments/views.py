@@ -15,6 +15,7 @@ from .serializers import (
     MedicamentRechercheSerializer
 )
 from comptes.permissions import EstMedecin, EstPersonnel
+from trimed_backend.replicas import lecture_replica
 
 class MedicamentCategorieViewSet(viewsets.ModelViewSet):
     """ViewSet pour les catégories de médicaments"""
@@ -33,16 +34,6 @@ class MedicamentCategorieViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
-        return queryset
-    
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.hopital)
 
@@ -75,10 +66,6 @@ class MedicamentViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
         # Filtres spéciaux
         stock_faible = self.request.query_params.get('stock_faible', None)
         if stock_faible == 'true':
@@ -199,6 +186,7 @@ class MedicamentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @lecture_replica
     def statistiques(self, request):
         """Statistiques générales des médicaments"""
         queryset = self.get_queryset()
@@ -360,6 +348,7 @@ class MedicamentViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
+    @lecture_replica
     def export_stock(self, request):
         """Exporter la liste des médicaments avec leur stock"""
         queryset = self.get_queryset().filter(actif=True).order_by('nom')
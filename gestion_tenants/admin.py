@@ -6,7 +6,7 @@ class TenantAdmin(admin.ModelAdmin):
     list_display = ('nom', 'email_professionnel', 'type_abonnement', 'statut', 'cree_le')
     list_filter = ('statut', 'type_abonnement', 'statut_verification_document')
     search_fields = ('nom', 'email_professionnel', 'directeur')
-    readonly_fields = ('cree_le', 'date_verification')
+    readonly_fields = ('cree_le', 'date_verification', 'nom_schema_base_de_donnees')
     
     fieldsets = (
         ('Informations Générales', {
@@ -25,7 +25,10 @@ class TenantAdmin(admin.ModelAdmin):
             'fields': ('verifie_par', 'date_verification')
         }),
         ('Système', {
-            'fields': ('nom_schema_base_de_donnees', 'cree_par_utilisateur', 'proprietaire_utilisateur')
+            'fields': (
+                'nom_schema_base_de_donnees', 'ecritures_gelees',
+                'cree_par_utilisateur', 'proprietaire_utilisateur'
+            )
         }),
     )
 
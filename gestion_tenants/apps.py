@@ -5,4 +5,6 @@ class GestionTenantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_tenants'
     verbose_name = 'Gestion des Tenants'
-
+    
+    def ready(self):
+        import gestion_tenants.signals
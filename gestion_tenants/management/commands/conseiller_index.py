@@ -0,0 +1,250 @@
+import re
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+
+# Filtres posés par get_queryset selon le rôle de l'utilisateur connecté
+FILTRES_ROLES = ('utilisateur', 'patient', 'medecin', 'medecin_prescripteur')
+# Taille de page des listes
+LIMITE = 20
+
+
+def _viewsets(motifs):
+    """ViewSets des routeurs DRF qui exposent une liste"""
+    for motif in motifs:
+        if isinstance(motif, URLResolver):
+            yield from _viewsets(motif.url_patterns)
+            continue
+        cls = getattr(motif.callback, 'cls', None)
+        if cls is not None and 'list' in (getattr(motif.callback, 'actions', None) or {}).values():
+            yield cls
+
+
+def _champ(modele, nom):
+    """Champ concret du modèle (ni relation inverse ni chemin), ou None"""
+    try:
+        champ = modele._meta.get_field(nom)
+    except Exception:
+        return None
+    return champ if getattr(champ, 'concrete', False) else None
+
+
+def _tenant(modele):
+    """
+    Colonne du tenant : celle du TenantManager, sinon la clé étrangère vers
+    le tenant filtrée par get_queryset (None si le cloisonnement passe par
+    une jointure)
+    """
+    nom = getattr(modele._meta, 'champ_tenant', None)
+    if nom:
+        return _champ(modele, nom)
+    for champ in modele._meta.concrete_fields:
+        if champ.is_relation and champ.related_model._meta.label == 'gestion_tenants.Tenant':
+            return champ
+    return None
+
+
+def _cloisonne_par_jointure(modele):
+    """Sans colonne tenant, mais rattaché à un modèle qui en a une (ordonnance, patient...)"""
+    if modele._meta.label == 'gestion_tenants.Tenant':
+        return False
+    return _tenant(modele) is None and any(
+        champ.is_relation and champ.related_model is not modele and _tenant(champ.related_model)
+        for champ in modele._meta.concrete_fields
+    )
+
+
+def _valeur(modele, champ):
+    """Valeur représentative d'une colonne pour l'EXPLAIN"""
+    if isinstance(champ, models.BooleanField):
+        # La valeur par défaut est la plus filtrée (non lues, actifs...)
+        return champ.get_default() if champ.has_default() else False
+    valeur = modele._base_manager.exclude(
+        **{f'{champ.attname}__isnull': True}
+    ).values_list(champ.attname, flat=True).first()
+    if valeur is not None:
+        return valeur
+    if isinstance(champ, models.DateTimeField):
+        return timezone.now()
+    if isinstance(champ, models.DateField):
+        return timezone.localdate()
+    if champ.choices:
+        return champ.choices[0][0]
+    if isinstance(champ, (models.CharField, models.TextField)):
+        return ''
+    return 1
+
+
+def _ordre(viewset, modele):
+    ordre = getattr(viewset, 'ordering', None) or modele._meta.ordering or []
+    ordre = [ordre] if isinstance(ordre, str) else list(ordre)
+    return [nom for nom in ordre if _champ(modele, nom.lstrip('-'))]
+
+
+def _filtres(viewset):
+    filterset_class = getattr(viewset, 'filterset_class', None)
+    if filterset_class is not None:
+        return list(getattr(filterset_class._meta, 'fields', None) or [])
+    champs = getattr(viewset, 'filterset_fields', None) or []
+    return list(champs.keys()) if isinstance(champs, dict) else list(champs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rejoue par EXPLAIN les filtres et tris déclarés par les viewsets "
+        "(filterset_fields, ordering_fields, filtres par rôle), signale les "
+        "parcours complets et les tris, et recommande (ou génère) les index"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', nargs='+', help='Limiter l\'analyse à ces applications')
+        parser.add_argument('--plans', action='store_true', help='Afficher les plans d\'exécution')
+        parser.add_argument(
+            '--generer',
+            action='store_true',
+            help='Générer les migrations des index recommandés (makemigrations)'
+        )
+        parser.add_argument('--nom', default='index_recommandes', help='Nom des migrations générées')
+
+    def combinaisons(self, viewset, modele):
+        """
+        (prédicats, tri, à indexer) rejoués pour un viewset : liste, filtres
+        par rôle et par paramètre sous le tri par défaut, puis tris facultatifs.
+        Les booléens filtrés se combinent aux rôles (index partiels) ; les
+        tris facultatifs sont signalés sans index recommandé.
+        """
+        tenant = _tenant(modele)
+        base = {tenant.name: _valeur(modele, tenant)} if tenant else {}
+        ordre = _ordre(viewset, modele)
+
+        roles = [None] + [nom for nom in FILTRES_ROLES if _champ(modele, nom)]
+        filtres = [nom for nom in _filtres(viewset) if _champ(modele, nom) and nom not in FILTRES_ROLES]
+        booleens = [nom for nom in filtres if isinstance(_champ(modele, nom), models.BooleanField)]
+        for role in roles:
+            predicats = dict(base)
+            if role:
+                predicats[role] = _valeur(modele, _champ(modele, role))
+            yield predicats, ordre, True
+            for filtre in (filtres if role is None else booleens):
+                yield {**predicats, filtre: _valeur(modele, _champ(modele, filtre))}, ordre, True
+        for nom in getattr(viewset, 'ordering_fields', None) or []:
+            if nom != '__all__' and _champ(modele, nom):
+                yield base, [f'-{nom}'], False
+
+    def plan(self, modele, predicats, ordre):
+        queryset = modele._base_manager.filter(**predicats).order_by(*ordre)[:LIMITE]
+        if connection.vendor == 'postgresql':
+            # Sans ces méthodes, seul un index manquant laisse un Seq Scan ou un Sort
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def problemes(self, plan, table):
+        if connection.vendor == 'postgresql':
+            parcours = re.search(rf'Seq Scan on "?{table}"?', plan) is not None
+            tri = re.search(r'^\s*(->\s*)?Sort\b', plan, re.MULTILINE) is not None
+        else:
+            parcours = re.search(rf'\bSCAN "?{table}"?\s*$', plan, re.MULTILINE) is not None
+            tri = 'TEMP B-TREE FOR ORDER BY' in plan
+        return [nom for nom, present in (('parcours complet', parcours), ('tri', tri)) if present]
+
+    def recommandation(self, modele, predicats, ordre):
+        """Index composite (égalités puis tri), partiel sur les booléens filtrés"""
+        condition = {
+            nom: valeur for nom, valeur in predicats.items()
+            if isinstance(_champ(modele, nom), models.BooleanField)
+        }
+        egalites = [nom for nom in predicats if nom not in condition]
+        tenant = _tenant(modele)
+        # Le patient, le médecin ou l'utilisateur filtré implique le tenant
+        if tenant is not None and tenant.name in egalites and any(nom in FILTRES_ROLES for nom in egalites):
+            egalites.remove(tenant.name)
+        champs = egalites + [nom for nom in ordre if nom.lstrip('-') not in egalites]
+        if not champs:
+            return None
+
+        index = models.Index(fields=champs)
+        index.set_name_with_model(modele)
+        if condition:
+            index = models.Index(
+                fields=champs, condition=models.Q(**condition), name=f'{index.name[:-4][:25]}_part'
+            )
+        return index
+
+    def handle(self, *args, **options):
+        vus = set()
+        recommandes = {}
+        with transaction.atomic():
+            for viewset in _viewsets(get_resolver().url_patterns):
+                queryset = getattr(viewset, 'queryset', None)
+                if queryset is None or viewset in vus:
+                    continue
+                vus.add(viewset)
+                modele = queryset.model
+                if options['app'] and modele._meta.app_label not in options['app']:
+                    continue
+                table = modele._meta.db_table
+                if _cloisonne_par_jointure(modele):
+                    # L'index de la clé étrangère sert la jointure ; la liste non filtrée
+                    # (admin système) reste un parcours complet, sans index à recommander
+                    self.stdout.write(
+                        f"{table} ({viewset.__name__}) : cloisonné par jointure dans get_queryset, "
+                        f"seuls les filtres déclarés sont rejoués"
+                    )
+
+                existants = {
+                    (tuple(index.fields), str(index.condition)) for index in modele._meta.indexes
+                }
+                deja = set()
+                for predicats, ordre, a_indexer in self.combinaisons(viewset, modele):
+                    cle = (tuple(sorted(predicats)), tuple(ordre))
+                    if cle in deja:
+                        continue
+                    deja.add(cle)
+                    plan = self.plan(modele, predicats, ordre)
+                    problemes = self.problemes(plan, table)
+                    requete = (
+                        f"{' AND '.join(f'{nom}=?' for nom in predicats) or '-'}"
+                        f"{' ORDER BY ' + ', '.join(ordre) if ordre else ''}"
+                    )
+                    if options['plans']:
+                        self.stdout.write(f"{viewset.__name__} {requete}\n{plan}\n")
+                    if not problemes:
+                        continue
+
+                    index = self.recommandation(modele, predicats, ordre)
+                    self.stdout.write(self.style.WARNING(
+                        f"{table} ({viewset.__name__}) : {', '.join(problemes)} pour {requete}"
+                    ))
+                    if not a_indexer or index is None or (tuple(index.fields), str(index.condition)) in existants:
+                        continue
+                    existants.add((tuple(index.fields), str(index.condition)))
+                    recommandes.setdefault(modele, []).append(index)
+
+        if not recommandes:
+            self.stdout.write(self.style.SUCCESS('Aucun index manquant'))
+            return
+
+        self.stdout.write('\nIndex recommandés (Meta.indexes) :')
+        for modele, index in recommandes.items():
+            self.stdout.write(f"  {modele._meta.label}")
+            for idx in index:
+                condition = f", condition=models.Q(**{dict(idx.condition.children)!r})" if idx.condition else ''
+                self.stdout.write(f"    models.Index(fields={idx.fields!r}{condition}, name={idx.name!r}),")
+
+        if options['generer']:
+            # makemigrations compare l'état des modèles en mémoire aux migrations
+            for modele, index in recommandes.items():
+                modele._meta.indexes = [*modele._meta.indexes, *index]
+                modele._meta.original_attrs['indexes'] = modele._meta.indexes
+            call_command(
+                'makemigrations',
+                *sorted({modele._meta.app_label for modele in recommandes}),
+                name=options['nom']
+            )
+            self.stdout.write(self.style.WARNING(
+                'Reportez ces index dans Meta.indexes des modèles avant la prochaine makemigrations'
+            ))
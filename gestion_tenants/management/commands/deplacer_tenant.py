@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from gestion_tenants.models import Tenant
+from gestion_tenants.services import ATTENTE_ECRITURES_EN_COURS, deplacer_tenant
+from trimed_backend import referentiel, tenancy
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les données d'un tenant vers un schéma PostgreSQL dédié "
+        "ou les ramène dans les tables partagées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tenant', type=int, help='Identifiant du tenant')
+        destination = parser.add_mutually_exclusive_group(required=True)
+        destination.add_argument(
+            '--schema',
+            help='Schéma dédié de destination (créé et migré au besoin)'
+        )
+        destination.add_argument(
+            '--partage',
+            action='store_true',
+            help='Ramener le tenant dans les tables partagées'
+        )
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=1000,
+            help='Nombre de lignes copiées par transaction (1000 par défaut)'
+        )
+        parser.add_argument(
+            '--attente',
+            type=int,
+            default=ATTENTE_ECRITURES_EN_COURS,
+            help=(
+                "Secondes d'attente entre le gel des écritures et la copie "
+                f"({ATTENTE_ECRITURES_EN_COURS} par défaut)"
+            )
+        )
+
+    def handle(self, *args, **options):
+        if not referentiel.cache_partage():
+            # Les caches des workers (agendas, flux...) ne seraient pas invalidés
+            raise CommandError('Un cache partagé est requis (CACHE_URL) pour déplacer un tenant')
+        try:
+            tenant = Tenant.objects.get(pk=options['tenant'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Tenant {options['tenant']} introuvable")
+
+        schema = options['schema']
+        if schema is not None and not tenancy.schema_valide(schema):
+            raise CommandError(f"Nom de schéma invalide : {schema}")
+        if schema and Tenant.objects.filter(
+            nom_schema_base_de_donnees=schema
+        ).exclude(pk=tenant.pk).exists():
+            raise CommandError(f"Le schéma {schema} est déjà attribué à un autre tenant")
+
+        try:
+            copies = deplacer_tenant(
+                tenant, schema, taille_lot=options['taille_lot'], attente=options['attente']
+            )
+        except RuntimeError as erreur:
+            raise CommandError(str(erreur))
+
+        if not copies:
+            self.stdout.write('Le tenant est déjà à cet emplacement')
+            return
+        for label, nombre in copies.items():
+            if nombre:
+                self.stdout.write(f"{label} : {nombre} ligne(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Tenant {tenant} déplacé vers {schema or tenancy.SCHEMA_PARTAGE}"
+        ))
@@ -0,0 +1,50 @@
+import os
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from gestion_tenants.services import migrer_schemas, schemas_dedies
+
+
+class Command(BaseCommand):
+    help = (
+        "Applique les migrations au schéma partagé puis, en parallèle, "
+        "aux schémas dédiés des tenants"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schema',
+            action='append',
+            dest='schemas',
+            help='Limiter aux schémas indiqués (option répétable)'
+        )
+        parser.add_argument(
+            '--processus',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Nombre de schémas migrés simultanément (4 au plus par défaut)'
+        )
+        parser.add_argument(
+            '--sans-partage',
+            action='store_true',
+            help='Ne pas migrer le schéma partagé'
+        )
+
+    def handle(self, *args, **options):
+        if not options['sans_partage']:
+            call_command('migrate', interactive=False, verbosity=options['verbosity'])
+
+        schemas = options['schemas'] or schemas_dedies()
+        if not schemas:
+            self.stdout.write('Aucun schéma dédié à migrer')
+            return
+
+        resultats = migrer_schemas(schemas, processus=options['processus'])
+        echecs = {schema: erreur for schema, erreur in resultats.items() if erreur}
+        for schema, erreur in echecs.items():
+            self.stderr.write(self.style.ERROR(f"{schema} : {erreur}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resultats) - len(echecs)} schéma(s) migré(s), {len(echecs)} échec(s)"
+        ))
+        if echecs:
+            raise CommandError('Certains schémas n\'ont pas pu être migrés')
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from trimed_backend.tenancy import modeles_cloisonnes
+
+NOM_POLITIQUE = 'isolation_tenant'
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche (ou applique) les politiques PostgreSQL de sécurité au niveau "
+        "des lignes pour les tables cloisonnées par tenant. À utiliser avec TENANT_RLS=True. "
+        "Sans tenant courant, aucune ligne n'est visible, sauf pour les requêtes "
+        "de l'administration système (paramètre app.bypass). Les commandes "
+        "parcourent les tenants un à un ; la maintenance hors application peut "
+        "utiliser un rôle BYPASSRLS (--role-maintenance)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--appliquer',
+            action='store_true',
+            help='Exécuter les instructions au lieu de les afficher'
+        )
+        parser.add_argument(
+            '--retirer',
+            action='store_true',
+            help='Supprimer les politiques et désactiver la sécurité au niveau des lignes'
+        )
+        parser.add_argument(
+            '--role-maintenance',
+            help='Rôle PostgreSQL (distinct de celui de l\'application) qui contourne les politiques'
+        )
+
+    def instructions(self, retirer, role_maintenance=None):
+        if role_maintenance:
+            role = connection.ops.quote_name(role_maintenance)
+            yield f"ALTER ROLE {role} {'NOBYPASSRLS' if retirer else 'BYPASSRLS'};"
+        for modele in modeles_cloisonnes():
+            table = connection.ops.quote_name(modele._meta.db_table)
+            colonne = connection.ops.quote_name(
+                modele._meta.get_field(modele._meta.champ_tenant).column
+            )
+            yield f"DROP POLICY IF EXISTS {NOM_POLITIQUE} ON {table};"
+            if retirer:
+                yield f"ALTER TABLE {table} NO FORCE ROW LEVEL SECURITY;"
+                yield f"ALTER TABLE {table} DISABLE ROW LEVEL SECURITY;"
+                continue
+            yield f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;"
+            yield f"ALTER TABLE {table} FORCE ROW LEVEL SECURITY;"
+            # Sans tenant courant, le paramètre vaut NULL : aucune ligne visible ni
+            # insérable, sauf contournement explicite de l'administration système
+            yield (
+                f"CREATE POLICY {NOM_POLITIQUE} ON {table} USING ("
+                f"current_setting('app.bypass', true) = 'on' OR "
+                f"{colonne} = NULLIF(current_setting('app.tenant_id', true), '')::integer);"
+            )
+
+    def handle(self, *args, **options):
+        if options['role_maintenance'] and options['role_maintenance'] == connection.settings_dict.get('USER'):
+            raise CommandError(
+                "Le rôle de maintenance doit être distinct de celui de l'application"
+            )
+        instructions = list(self.instructions(options['retirer'], options['role_maintenance']))
+
+        if not options['appliquer']:
+            self.stdout.write('\n'.join(instructions))
+            return
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('La sécurité au niveau des lignes nécessite PostgreSQL')
+
+        with connection.cursor() as cursor:
+            for instruction in instructions:
+                cursor.execute(instruction)
+        self.stdout.write(self.style.SUCCESS(f"{len(instructions)} instruction(s) exécutée(s)"))
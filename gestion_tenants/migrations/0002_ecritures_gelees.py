@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='ecritures_gelees',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -70,6 +70,8 @@ class Tenant(models.Model):
         related_name='tenants_proprietaires'
     )
     nom_schema_base_de_donnees = models.CharField(max_length=255, blank=True, null=True)
+    # Écritures refusées pendant le déplacement des données du tenant
+    ecritures_gelees = models.BooleanField(default=False)
     
     def __str__(self):
         return self.nom
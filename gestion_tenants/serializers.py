@@ -34,7 +34,7 @@ class TenantSerializer(serializers.ModelSerializer):
             'proprietaire_utilisateur_id', 'nom_schema_base_de_donnees',
             'parametres'
         ]
-        read_only_fields = ('tenant_id', 'cree_le', 'date_verification')
+        read_only_fields = ('tenant_id', 'cree_le', 'date_verification', 'nom_schema_base_de_donnees')
     
     def validate(self, data):
         """Validation personnalisée"""
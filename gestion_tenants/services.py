@@ -0,0 +1,253 @@
+# services.py
+"""
+Services des tenants : fuseaux horaires et schémas PostgreSQL dédiés.
+
+Un schéma dédié contient les tables des modèles cloisonnés (et de leurs
+tables dépendantes) ; les tables partagées restent dans `public` et sont
+atteintes par le search_path. Les clés primaires d'un schéma dédié tirent
+leurs valeurs des séquences de `public`, si bien qu'un identifiant reste
+unique quel que soit le schéma où se trouve la ligne.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from trimed_backend import tenancy
+
+
+# Filet de sécurité si une modification des paramètres n'est pas suivie
+DUREE_CACHE_FUSEAU = 60 * 60
+# Secondes laissées aux requêtes d'écriture déjà authentifiées avant la copie
+ATTENTE_ECRITURES_EN_COURS = 30
+
+
+def _cle_fuseau(tenant_id):
+    return f'gestion_tenants:fuseau:{tenant_id}'
+
+
+def invalider_fuseau(tenant_id):
+    cache.delete(_cle_fuseau(tenant_id))
+
+
+def fuseaux_horaires(tenant_ids):
+    """
+    Fuseaux horaires des tenants : {tenant_id: ZoneInfo}. Les noms sont
+    mis en cache ; les manquants sont lus en une requête.
+    """
+    from gestion_tenants.models import ParametreHopital
+
+    tenant_ids = set(tenant_ids)
+    en_cache = cache.get_many([_cle_fuseau(tenant_id) for tenant_id in tenant_ids])
+    noms = {
+        tenant_id: en_cache[_cle_fuseau(tenant_id)]
+        for tenant_id in tenant_ids if _cle_fuseau(tenant_id) in en_cache
+    }
+    manquants = tenant_ids - noms.keys()
+    if manquants:
+        lus = dict(
+            ParametreHopital.objects.filter(
+                tenant_id__in=manquants
+            ).values_list('tenant_id', 'fuseau_horaire')
+        )
+        for tenant_id in manquants:
+            noms[tenant_id] = lus.get(tenant_id) or ''
+        cache.set_many({_cle_fuseau(tenant_id): noms[tenant_id] for tenant_id in manquants}, DUREE_CACHE_FUSEAU)
+
+    fuseaux = {}
+    for tenant_id in tenant_ids:
+        try:
+            fuseaux[tenant_id] = ZoneInfo(noms[tenant_id])
+        except (ValueError, ZoneInfoNotFoundError):
+            fuseaux[tenant_id] = timezone.get_default_timezone()
+    return fuseaux
+
+
+def fuseau_horaire(tenant_id):
+    """Fuseau horaire d'un tenant (celui du projet à défaut)"""
+    return fuseaux_horaires([tenant_id])[tenant_id]
+
+
+def _exiger_postgresql():
+    if connection.vendor != 'postgresql':
+        raise RuntimeError('Les schémas dédiés nécessitent PostgreSQL')
+
+
+def _table(schema, modele):
+    return f'{connection.ops.quote_name(schema)}.{connection.ops.quote_name(modele._meta.db_table)}'
+
+
+def schemas_dedies():
+    """Noms des schémas dédiés déclarés par les tenants"""
+    from gestion_tenants.models import Tenant
+
+    noms = Tenant.objects.exclude(
+        nom_schema_base_de_donnees__isnull=True
+    ).exclude(
+        nom_schema_base_de_donnees=''
+    ).values_list('nom_schema_base_de_donnees', flat=True).distinct()
+    return sorted(nom for nom in noms if tenancy.schema_valide(nom))
+
+
+def partager_sequences(schema):
+    """
+    Brancher les clés primaires des tables du schéma sur les séquences
+    des tables partagées correspondantes
+    """
+    with connection.cursor() as cursor:
+        for modele, _ in tenancy.modeles_du_schema():
+            colonne = modele._meta.pk.column
+            cursor.execute(
+                'SELECT pg_get_serial_sequence(%s, %s)',
+                [_table(tenancy.SCHEMA_PARTAGE, modele), colonne]
+            )
+            sequence = cursor.fetchone()[0]
+            if sequence is None:
+                continue
+            table = _table(schema, modele)
+            colonne = connection.ops.quote_name(colonne)
+            cursor.execute(f'ALTER TABLE {table} ALTER COLUMN {colonne} DROP IDENTITY IF EXISTS')
+            cursor.execute(
+                f'ALTER TABLE {table} ALTER COLUMN {colonne} SET DEFAULT nextval(%s::regclass)',
+                [sequence]
+            )
+
+
+def migrer_schema(schema):
+    """
+    Créer le schéma au besoin et y appliquer les migrations des modèles
+    du schéma. L'historique des migrations est tenu dans le schéma même.
+    """
+    _exiger_postgresql()
+    if not tenancy.schema_valide(schema):
+        raise ValueError(f"Nom de schéma invalide : {schema!r}")
+
+    nom = connection.ops.quote_name(schema)
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {nom}')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {nom}.django_migrations '
+            f'(LIKE public.django_migrations INCLUDING ALL)'
+        )
+    with tenancy.dans_schema(schema):
+        call_command('migrate', verbosity=0, interactive=False)
+    partager_sequences(schema)
+    return schema
+
+
+def _initialiser_processus():
+    import django
+
+    django.setup()
+
+
+def migrer_schemas(schemas, processus=1):
+    """
+    Migrer plusieurs schémas dédiés, en parallèle sur `processus`
+    processus (une connexion chacun). Retourne {schéma: erreur ou None}.
+    """
+    resultats = {}
+    if processus > 1 and len(schemas) > 1:
+        # Les processus ouvrent leurs propres connexions
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus) as executeur:
+            futures = {executeur.submit(migrer_schema, schema): schema for schema in schemas}
+            for future, schema in futures.items():
+                erreur = future.exception()
+                resultats[schema] = None if erreur is None else str(erreur)
+        return resultats
+
+    for schema in schemas:
+        try:
+            migrer_schema(schema)
+            resultats[schema] = None
+        except Exception as erreur:
+            resultats[schema] = str(erreur)
+    return resultats
+
+
+def _lots_tenant(modele, chemin, tenant_id, schema, taille_lot):
+    """Clés primaires des lignes du tenant dans un schéma, par lots croissants"""
+    lignes = modele._base_manager.filter(
+        **{f'{chemin}_id': tenant_id}
+    ).order_by('pk').values_list('pk', flat=True)
+    dernier = None
+    while True:
+        with tenancy.dans_schema(schema):
+            lot = lignes if dernier is None else lignes.filter(pk__gt=dernier)
+            lot = list(lot[:taille_lot])
+        if not lot:
+            return
+        dernier = lot[-1]
+        yield lot
+
+
+def _copier(modele, chemin, tenant_id, source, destination, taille_lot):
+    colonnes = [connection.ops.quote_name(champ.column) for champ in modele._meta.concrete_fields]
+    cle = connection.ops.quote_name(modele._meta.pk.column)
+    liste = ', '.join(colonnes)
+    mises_a_jour = ', '.join(f'{colonne} = EXCLUDED.{colonne}' for colonne in colonnes if colonne != cle)
+    conflit = f'DO UPDATE SET {mises_a_jour}' if mises_a_jour else 'DO NOTHING'
+    instruction = (
+        f'INSERT INTO {_table(destination, modele)} ({liste}) '
+        f'SELECT {liste} FROM {_table(source, modele)} WHERE {cle} = ANY(%s) '
+        f'ON CONFLICT ({cle}) {conflit}'
+    )
+
+    copiees = 0
+    for lot in _lots_tenant(modele, chemin, tenant_id, source, taille_lot):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(instruction, [lot])
+        copiees += len(lot)
+    return copiees
+
+
+def _supprimer(modele, chemin, tenant_id, schema, taille_lot):
+    cle = connection.ops.quote_name(modele._meta.pk.column)
+    instruction = f'DELETE FROM {_table(schema, modele)} WHERE {cle} = ANY(%s)'
+    for lot in _lots_tenant(modele, chemin, tenant_id, schema, taille_lot):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(instruction, [lot])
+
+
+def deplacer_tenant(tenant, destination=None, taille_lot=1000, attente=ATTENTE_ECRITURES_EN_COURS):
+    """
+    Déplacer les lignes d'un tenant vers un schéma dédié, ou vers les
+    tables partagées (destination None), par lots.
+
+    Les écritures du tenant sont refusées (503) pendant la copie, qui ne
+    commence qu'après `attente` secondes, le temps que les requêtes
+    d'écriture en cours se terminent ; les lectures continuent sur
+    l'ancien emplacement jusqu'à la bascule de
+    Tenant.nom_schema_base_de_donnees. Les lignes d'origine sont ensuite
+    supprimées, enfants avant parents. La copie est idempotente : une
+    exécution interrompue peut être relancée.
+    Retourne {modèle: nombre de lignes copiées}.
+    """
+    from gestion_tenants.models import Tenant
+
+    _exiger_postgresql()
+    source = tenancy.schema_tenant(tenant.pk) or tenancy.SCHEMA_PARTAGE
+    destination = destination or tenancy.SCHEMA_PARTAGE
+    if source == destination:
+        return {}
+    if destination != tenancy.SCHEMA_PARTAGE:
+        migrer_schema(destination)
+
+    modeles = tenancy.modeles_du_schema()
+    copies = {}
+    with tenancy.geler_ecritures(tenant.pk):
+        time.sleep(attente)
+        for modele, chemin in modeles:
+            copies[modele._meta.label] = _copier(
+                modele, chemin, tenant.pk, source, destination, taille_lot
+            )
+        Tenant.objects.filter(pk=tenant.pk).update(
+            nom_schema_base_de_donnees=None if destination == tenancy.SCHEMA_PARTAGE else destination
+        )
+
+    for modele, chemin in reversed(modeles):
+        _supprimer(modele, chemin, tenant.pk, source, taille_lot)
+    return copies
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import ParametreHopital
+from .services import invalider_fuseau
+
+
+@receiver([post_save, post_delete], sender=ParametreHopital)
+def invalider_fuseau_tenant(sender, instance, **kwargs):
+    """
+    Oublier le fuseau horaire mis en cache pour le tenant
+    """
+    invalider_fuseau(instance.tenant_id)
@@ -1,3 +1,197 @@
-from django.test import TestCase
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from unittest import skipUnless
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from medical.models import Medecin
+from patients.models import AdressePatient, Patient
+from rendez_vous.models import HoraireMedecin, ListeAttente, SerieRendezVous
+from rendez_vous.views import SerieRendezVousViewSet
+from trimed_backend import tenancy
+from .management.commands.conseiller_index import Command as ConseillerIndex
+from .models import Tenant
+from .services import deplacer_tenant
 
-# Create your tests here.
+
+@override_settings(TENANT_SCHEMAS=True)
+class GelEcrituresTests(TestCase):
+
+    def test_gel_enregistre_sur_la_ligne_du_tenant(self):
+        tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+        self.assertFalse(tenancy.ecritures_gelees(tenant.pk))
+        with tenancy.geler_ecritures(tenant.pk):
+            # Lu en base : visible des autres processus
+            self.assertTrue(Tenant.objects.get(pk=tenant.pk).ecritures_gelees)
+            self.assertTrue(tenancy.ecritures_gelees(tenant.pk))
+        self.assertFalse(tenancy.ecritures_gelees(tenant.pk))
+
+    def test_deplacement_refuse_sans_cache_partage(self):
+        tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+        with self.assertRaisesMessage(CommandError, 'cache partagé'):
+            call_command('deplacer_tenant', str(tenant.pk), schema='hopital_test', stdout=StringIO())
+        self.assertFalse(Tenant.objects.get(pk=tenant.pk).ecritures_gelees)
+
+    def test_ecritures_du_tenant_courant_refusees_pendant_le_gel(self):
+        tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+        with tenancy.geler_ecritures(tenant.pk), tenancy.pour_tenant(tenant):
+            with self.assertRaises(tenancy.EcrituresGelees), transaction.atomic():
+                Patient.objects.create(hopital=tenant, nom='Patient', prenom='Test', numero_dossier_medical='DOS-1')
+            with self.assertRaises(tenancy.EcrituresGelees), transaction.atomic():
+                Patient.objects.update(nom='Autre')
+            # Lectures et tables partagées restent disponibles
+            self.assertFalse(Patient.objects.exists())
+            Tenant.objects.filter(pk=tenant.pk).update(nombre_de_lits=20)
+
+        with tenancy.pour_tenant(tenant):
+            Patient.objects.create(hopital=tenant, nom='Patient', prenom='Test', numero_dossier_medical='DOS-1')
+
+    def test_ecritures_sans_tenant_courant_controlees_sur_l_instance(self):
+        """Commandes et admin système : le tenant est celui de la ligne écrite"""
+        gele, autre = (Tenant.objects.create(nom=f'Hôpital {numero}', nombre_de_lits=10) for numero in range(2))
+        patient = Patient.objects.create(hopital=gele, nom='Patient', prenom='Test', numero_dossier_medical='DOS-1')
+        with tenancy.geler_ecritures(gele.pk):
+            with self.assertRaises(tenancy.EcrituresGelees), transaction.atomic():
+                AdressePatient.objects.create(patient=patient, ville='Lyon', adresse_ligne1='1 rue', code_postal='69000')
+            with self.assertRaises(tenancy.EcrituresGelees), transaction.atomic():
+                patient.delete()
+            Patient.objects.create(hopital=autre, nom='Patient', prenom='Test', numero_dossier_medical='DOS-2')
+        self.assertTrue(Patient.objects.filter(pk=patient.pk).exists())
+
+    def test_tables_de_liaison_deplacees_avec_le_tenant(self):
+        modeles = {modele for modele, _ in tenancy.modeles_du_schema()}
+        self.assertIn(ListeAttente.creneaux_refuses.through, modeles)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Schémas dédiés PostgreSQL')
+@override_settings(TENANT_SCHEMAS=True)
+class DeplacementTenantTests(TransactionTestCase):
+    """Un tenant déplacé reste lisible, dans son schéma dédié et lui seul"""
+
+    schema = 'hopital_test_deplacement'
+
+    def setUp(self):
+        self.addCleanup(self.supprimer_schema)
+        self.tenant, self.autre = (
+            Tenant.objects.create(nom=f'Hôpital {numero}', nombre_de_lits=10) for numero in range(2)
+        )
+        self.patient = Patient.objects.create(
+            hopital=self.tenant, nom='Patient', prenom='Test', numero_dossier_medical='DOS-1'
+        )
+        AdressePatient.objects.create(patient=self.patient, ville='Lyon', adresse_ligne1='1 rue', code_postal='69000')
+        Patient.objects.create(hopital=self.autre, nom='Patient', prenom='Test', numero_dossier_medical='DOS-2')
+
+    def supprimer_schema(self):
+        tenancy.definir_tenant(None)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {connection.ops.quote_name(self.schema)} CASCADE')
+
+    def test_tenant_deplace_lisible_dans_son_schema(self):
+        copies = deplacer_tenant(self.tenant, self.schema, attente=0)
+        self.assertEqual(copies['patients.Patient'], 1)
+        self.assertEqual(copies['patients.AdressePatient'], 1)
+
+        with tenancy.pour_tenant(self.tenant):
+            self.assertEqual(list(Patient.objects.values_list('pk', flat=True)), [self.patient.pk])
+            self.assertEqual(AdressePatient.objects.filter(patient=self.patient).count(), 1)
+            # Gel levé : les écritures reprennent, dans le schéma dédié
+            Patient.objects.create(hopital=self.tenant, nom='Patient', prenom='Test', numero_dossier_medical='DOS-3')
+            self.assertEqual(Patient.objects.count(), 2)
+
+        with tenancy.dans_schema(None):
+            self.assertFalse(Patient.objects.tous_tenants().filter(hopital=self.tenant).exists())
+            self.assertEqual(Patient.objects.tous_tenants().filter(hopital=self.autre).count(), 1)
+        with tenancy.pour_tenant(self.autre):
+            self.assertEqual(Patient.objects.count(), 1)
+
+
+class PolitiquesRlsTests(TestCase):
+
+    def politiques(self, *args):
+        sortie = StringIO()
+        call_command('politiques_rls', *args, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_aucune_ligne_sans_tenant_courant(self):
+        politiques = [ligne for ligne in self.politiques().splitlines() if ligne.startswith('CREATE POLICY')]
+        self.assertTrue(politiques)
+        for politique in politiques:
+            self.assertIn("= NULLIF(current_setting('app.tenant_id', true), '')::integer", politique)
+            # Seul contournement : le paramètre explicite de l'administration système
+            self.assertIn("USING (current_setting('app.bypass', true) = 'on' OR ", politique)
+            self.assertEqual(politique.count(' OR '), 1)
+
+    def test_role_de_maintenance(self):
+        self.assertIn('ALTER ROLE "maintenance" BYPASSRLS;', self.politiques('--role-maintenance', 'maintenance'))
+        self.assertIn(
+            'ALTER ROLE "maintenance" NOBYPASSRLS;',
+            self.politiques('--retirer', '--role-maintenance', 'maintenance')
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Sécurité au niveau des lignes PostgreSQL')
+@override_settings(TENANT_RLS=True)
+class PolitiquesRlsPostgresqlTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenants = [Tenant.objects.create(nom=f'Hôpital {numero}', nombre_de_lits=10) for numero in range(2)]
+        for tenant, nombre in zip(cls.tenants, (1, 2)):
+            for numero in range(nombre):
+                Patient.objects.create(
+                    hopital=tenant, nom='Patient', prenom='Test', numero_dossier_medical=f'DOS-{tenant.pk}-{numero}'
+                )
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rolsuper OR rolbypassrls FROM pg_roles WHERE rolname = current_user')
+            if cursor.fetchone()[0]:
+                self.skipTest('Le rôle de test contourne toujours les politiques')
+        call_command('politiques_rls', '--appliquer', stdout=StringIO())
+        self.addCleanup(tenancy.definir_tenant, None)
+
+    def visibles(self):
+        # tous_tenants() : seules les politiques filtrent
+        return Patient.objects.tous_tenants().count()
+
+    def test_lignes_visibles_selon_le_tenant_courant(self):
+        tenancy.definir_tenant(self.tenants[0])
+        self.assertEqual(self.visibles(), 1)
+        tenancy.definir_tenant(self.tenants[1])
+        self.assertEqual(self.visibles(), 2)
+        tenancy.definir_tenant(None)
+        self.assertEqual(self.visibles(), 0)
+
+    def test_administration_systeme_voit_tous_les_tenants(self):
+        tenancy.definir_tenant(None, contournement=True)
+        self.assertEqual(self.visibles(), 3)
+        # Un tenant courant reprend le dessus sur le contournement
+        with tenancy.pour_tenant(self.tenants[0]):
+            self.assertEqual(self.visibles(), 1)
+
+
+class ConseillerIndexTests(TestCase):
+
+    def test_tenant_retire_seulement_pour_les_filtres_par_role(self):
+        commande = ConseillerIndex()
+        index = commande.recommandation(Medecin, {'hopital': 1, 'utilisateur': 1}, [])
+        self.assertEqual(index.fields, ['utilisateur'])
+
+        index = commande.recommandation(HoraireMedecin, {'tenant': 1, 'jour_semaine': 0}, ['heure_debut'])
+        self.assertEqual(index.fields, ['tenant', 'jour_semaine', 'heure_debut'])
+
+    def test_index_recommande_utilise_par_le_plan(self):
+        commande = ConseillerIndex()
+        table = SerieRendezVous._meta.db_table
+        # Liste du tenant sous le tri par défaut du viewset
+        predicats, ordre, _ = next(commande.combinaisons(SerieRendezVousViewSet, SerieRendezVous))
+        self.assertTrue(commande.problemes(commande.plan(SerieRendezVous, predicats, ordre), table))
+
+        index = commande.recommandation(SerieRendezVous, predicats, ordre)
+        # Instruction seule : annulée avec la transaction du test, y compris sous SQLite
+        with connection.cursor() as cursor:
+            cursor.execute(str(index.create_sql(SerieRendezVous, connection.schema_editor())))
+
+        plan = commande.plan(SerieRendezVous, predicats, ordre)
+        self.assertIn(index.name, plan)
+        self.assertEqual(commande.problemes(plan, table), [])
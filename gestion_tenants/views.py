@@ -7,6 +7,7 @@ from django.utils import timezone
 from .models import Tenant, ParametreHopital
 from .serializers import TenantSerializer, ParametreHopitalSerializer
 from comptes.permissions import EstAdminSysteme, EstProprietaireHopital
+from trimed_backend.replicas import lecture_replica
 
 class TenantViewSet(viewsets.ModelViewSet):
     """
@@ -84,6 +85,7 @@ class TenantViewSet(viewsets.ModelViewSet):
         )
     
     @action(detail=True, methods=['get'])
+    @lecture_replica
     def statistiques(self, request, pk=None):
         """Statistiques d'un tenant"""
         tenant = self.get_object()
@@ -5,3 +5,6 @@ class MedicalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'medical'
     verbose_name = 'Gestion Médicale'
+    
+    def ready(self):
+        import medical.signals
@@ -0,0 +1,12 @@
+# filtres.py
+from trimed_backend.filtres import PlageDatesFilterSet
+from .models import Consultation
+
+
+class ConsultationFilterSet(PlageDatesFilterSet):
+    """Filtres des consultations (journées locales de l'établissement)"""
+    champ_date = 'date_consultation'
+
+    class Meta:
+        model = Consultation
+        fields = ['patient', 'medecin', 'rendez_vous']
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examenmedical',
+            name='taille_fichier_resultat',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
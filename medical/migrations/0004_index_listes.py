@@ -0,0 +1,45 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0003_taille_fichier_resultat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['tenant', '-date_consultation'], name='consultatio_tenant__353ac6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['patient', '-date_consultation'], name='consultatio_patient_91cacd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examenmedical',
+            index=models.Index(fields=['tenant', '-date_examen'], name='examen_medi_tenant__f9f5cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examenmedical',
+            index=models.Index(fields=['patient', '-date_examen'], name='examen_medi_patient_9e720a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examenmedical',
+            index=models.Index(fields=['medecin_prescripteur', '-date_examen'], name='examen_medi_medecin_6c263e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordonnance',
+            index=models.Index(fields=['tenant', '-date_ordonnance'], name='ordonnance_tenant__9a6b2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordonnance',
+            index=models.Index(fields=['patient', '-date_ordonnance'], name='ordonnance_patient_7bc34a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordonnance',
+            index=models.Index(fields=['medecin', '-date_ordonnance'], name='ordonnance_medecin_4bd3e5_idx'),
+        ),
+    ]
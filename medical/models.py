@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator, EmailValidator
+from trimed_backend.tenancy import TenantManager
 
 class GroupeSanguin(models.Model):
     """TABLE GroupeSanguin"""
@@ -121,6 +122,8 @@ class Medecin(models.Model):
         related_name='medecin_lie'
     )
     
+    objects = TenantManager(champ='hopital')
+    
     def __str__(self):
         return f"Dr {self.prenom} {self.nom}"
     
@@ -168,6 +171,8 @@ class Consultation(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return f"Consultation {self.patient} - {self.date_consultation.date()}"
     
@@ -179,6 +184,8 @@ class Consultation(models.Model):
         indexes = [
             models.Index(fields=['tenant', 'patient']),
             models.Index(fields=['medecin', 'date_consultation']),
+            models.Index(fields=['tenant', '-date_consultation']),
+            models.Index(fields=['patient', '-date_consultation']),
         ]
 
 class Ordonnance(models.Model):
@@ -212,6 +219,8 @@ class Ordonnance(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return f"Ordonnance {self.patient} - {self.date_ordonnance.date()}"
     
@@ -220,6 +229,11 @@ class Ordonnance(models.Model):
         verbose_name = 'Ordonnance'
         verbose_name_plural = 'Ordonnances'
         ordering = ['-date_ordonnance']
+        indexes = [
+            models.Index(fields=['tenant', '-date_ordonnance']),
+            models.Index(fields=['patient', '-date_ordonnance']),
+            models.Index(fields=['medecin', '-date_ordonnance']),
+        ]
 
 class ExamenMedical(models.Model):
     """TABLE ExamenMedical"""
@@ -277,12 +291,15 @@ class ExamenMedical(models.Model):
         blank=True,
         max_length=255
     )
+    taille_fichier_resultat = models.BigIntegerField(default=0)  # en octets
     
     date_examen = models.DateTimeField()
     date_resultat = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return f"Examen {self.nom_examen} - {self.patient}"
     
@@ -291,6 +308,11 @@ class ExamenMedical(models.Model):
         verbose_name = 'Examen Médical'
         verbose_name_plural = 'Examens Médicaux'
         ordering = ['-date_examen']
+        indexes = [
+            models.Index(fields=['tenant', '-date_examen']),
+            models.Index(fields=['patient', '-date_examen']),
+            models.Index(fields=['medecin_prescripteur', '-date_examen']),
+        ]
 
 class Prescription(models.Model):
     """Prescription de médicaments dans une ordonnance"""
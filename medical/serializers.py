@@ -243,7 +243,7 @@ class ExamenMedicalSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExamenMedical
         fields = '__all__'
-        read_only_fields = ['examen_id', 'created_at', 'updated_at']
+        read_only_fields = ['examen_id', 'taille_fichier_resultat', 'created_at', 'updated_at']
 
 class ConsultationCreateSerializer(serializers.ModelSerializer):
     """Serializer pour la création de consultations"""
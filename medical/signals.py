@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from trimed_backend import referentiel
+from .models import GroupeSanguin, Specialite
+
+@receiver([post_save, post_delete], sender=GroupeSanguin)
+@receiver([post_save, post_delete], sender=Specialite)
+def invalider_referentiel(sender, **kwargs):
+    """
+    Invalider le cache des groupes sanguins et spécialités
+    """
+    referentiel.invalider(sender)
@@ -1,3 +1,67 @@
+from datetime import datetime, time, timedelta
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from comptes.models import Utilisateur
+from gestion_tenants.models import Tenant
+from gestion_tenants.services import fuseau_horaire
+from patients.models import Patient
+from trimed_backend import tenancy
+from .filtres import ConsultationFilterSet
+from .models import Consultation, Medecin
 
-# Create your tests here.
+
+class ConsultationFiltresTests(TestCase):
+    """Les bornes de dates des consultations sont des plages demi-ouvertes servies par index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+        cls.utilisateur = Utilisateur.objects.creer_utilisateur(
+            'medecin@test.fr', 'Dr Test', 'secret', role='medecin', hopital=cls.tenant
+        )
+        cls.medecin = Medecin.objects.get(utilisateur=cls.utilisateur)
+        cls.patient = Patient.objects.create(
+            hopital=cls.tenant, nom='Patient', prenom='Test', numero_dossier_medical='DOS-1'
+        )
+        fuseau = fuseau_horaire(cls.tenant.pk)
+        cls.jour = timezone.localdate()
+        for decalage, heure in ((0, time(0, 30)), (0, time(23, 30)), (1, time(0, 30))):
+            Consultation.objects.create(
+                tenant=cls.tenant, patient=cls.patient, medecin=cls.medecin, motif='Suivi',
+                date_consultation=datetime.combine(cls.jour - timedelta(days=decalage), heure, tzinfo=fuseau)
+            )
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.utilisateur)
+
+    def filtrer(self, donnees):
+        with tenancy.pour_tenant(self.tenant):
+            filterset = ConsultationFilterSet(
+                donnees, queryset=Consultation.objects.filter(medecin=self.medecin)
+            )
+            self.assertTrue(filterset.is_valid(), filterset.errors)
+            return filterset.qs, filterset.qs.explain()
+
+    def test_plage_de_dates_parcourt_l_index(self):
+        queryset, plan = self.filtrer({'date_debut': self.jour, 'date_fin': self.jour})
+
+        self.assertNotRegex(plan, r'\bSCAN "?consultation"?\s*$')
+        self.assertRegex(plan, r'USING (COVERING )?INDEX .*date_consultation>')
+        # Journée locale entière, bornes comprises
+        self.assertEqual(queryset.count(), 2)
+
+    def test_date_invalide_refusee(self):
+        response = self.client.get(
+            f'/api/medical/medecins/{self.medecin.pk}/consultations/', {'date_fin': 'abc'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_action_consultations_du_medecin(self):
+        response = self.client.get(
+            f'/api/medical/medecins/{self.medecin.pk}/consultations/',
+            {'date_debut': self.jour - timedelta(days=1), 'date_fin': self.jour - timedelta(days=1)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
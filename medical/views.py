@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from datetime import timedelta
+from .filtres import ConsultationFilterSet
 from .models import (
     Medecin, Specialite, GroupeSanguin, Consultation,
     Ordonnance, ExamenMedical, Prescription
@@ -17,8 +18,12 @@ from .serializers import (
     PrescriptionSerializer
 )
 from comptes.permissions import EstMedecin, EstPersonnel, EstPatient
+from trimed_backend.filtres import filtrer
+from trimed_backend.referentiel import ReferentielCacheMixin
+from facturation.quotas import verifier_quota
+from trimed_backend.replicas import lecture_replica
 
-class SpecialiteViewSet(viewsets.ModelViewSet):
+class SpecialiteViewSet(ReferentielCacheMixin, viewsets.ModelViewSet):
     """ViewSet pour les spécialités médicales"""
     queryset = Specialite.objects.all()
     serializer_class = SpecialiteSerializer
@@ -27,7 +32,7 @@ class SpecialiteViewSet(viewsets.ModelViewSet):
     search_fields = ['nom_specialite', 'description']
     filterset_fields = ['actif']
 
-class GroupeSanguinViewSet(viewsets.ReadOnlyModelViewSet):
+class GroupeSanguinViewSet(ReferentielCacheMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les groupes sanguins (lecture seule)"""
     queryset = GroupeSanguin.objects.all()
     serializer_class = GroupeSanguinSerializer
@@ -57,14 +62,7 @@ class MedecinViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(hopital=user.hopital)
-        
-        return queryset.select_related('specialite_principale', 'utilisateur')
+        return super().get_queryset().select_related('specialite_principale', 'utilisateur')
     
     def perform_create(self, serializer):
         serializer.save(
@@ -76,23 +74,10 @@ class MedecinViewSet(viewsets.ModelViewSet):
     def consultations(self, request, pk=None):
         """Récupérer les consultations d'un médecin"""
         medecin = self.get_object()
-        consultations = Consultation.objects.filter(medecin=medecin).order_by('-date_consultation')
-        
-        # Filtrage par date
-        date_debut = request.query_params.get('date_debut')
-        date_fin = request.query_params.get('date_fin')
-        
-        if date_debut:
-            try:
-                consultations = consultations.filter(date_consultation__date__gte=date_debut)
-            except ValueError:
-                pass
-        
-        if date_fin:
-            try:
-                consultations = consultations.filter(date_consultation__date__lte=date_fin)
-            except ValueError:
-                pass
+        consultations = filtrer(
+            ConsultationFilterSet, request,
+            Consultation.objects.filter(medecin=medecin).order_by('-date_consultation')
+        )
         
         page = self.paginate_queryset(consultations)
         if page is not None:
@@ -103,6 +88,7 @@ class MedecinViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
+    @lecture_replica
     def statistiques(self, request, pk=None):
         """Statistiques d'un médecin"""
         medecin = self.get_object()
@@ -133,7 +119,7 @@ class ConsultationViewSet(viewsets.ModelViewSet):
     serializer_class = ConsultationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['patient', 'medecin', 'rendez_vous']
+    filterset_class = ConsultationFilterSet
     search_fields = ['patient__nom', 'patient__prenom', 'medecin__nom', 'motif', 'diagnostic_principal']
     ordering_fields = ['date_consultation', 'created_at']
     ordering = ['-date_consultation']
@@ -158,32 +144,12 @@ class ConsultationViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
         # Filtrage par rôle
         if user.role == 'patient' and hasattr(user, 'patient_lie'):
             queryset = queryset.filter(patient=user.patient_lie)
         elif user.role == 'medecin' and hasattr(user, 'medecin_lie'):
             queryset = queryset.filter(medecin=user.medecin_lie)
         
-        # Filtres par date
-        date_debut = self.request.query_params.get('date_debut')
-        date_fin = self.request.query_params.get('date_fin')
-        
-        if date_debut:
-            try:
-                queryset = queryset.filter(date_consultation__date__gte=date_debut)
-            except ValueError:
-                pass
-        
-        if date_fin:
-            try:
-                queryset = queryset.filter(date_consultation__date__lte=date_fin)
-            except ValueError:
-                pass
-        
         return queryset.select_related('patient', 'medecin', 'rendez_vous')
     
     def perform_create(self, serializer):
@@ -283,10 +249,6 @@ class OrdonnanceViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
         # Filtrage par rôle
         if user.role == 'patient' and hasattr(user, 'patient_lie'):
             queryset = queryset.filter(patient=user.patient_lie)
@@ -327,10 +289,6 @@ class ExamenMedicalViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
         # Filtrage par rôle
         if user.role == 'patient' and hasattr(user, 'patient_lie'):
             queryset = queryset.filter(patient=user.patient_lie)
@@ -339,9 +297,23 @@ class ExamenMedicalViewSet(viewsets.ModelViewSet):
         
         return queryset.select_related('patient', 'consultation', 'medecin_prescripteur')
     
+    def _verifier_stockage(self, serializer, tenant_id, ancienne_taille=0):
+        fichier = serializer.validated_data.get('fichier_resultat')
+        if fichier:
+            verifier_quota(tenant_id, 'stockage', fichier.size - ancienne_taille)
+    
     def perform_create(self, serializer):
+        self._verifier_stockage(serializer, self.request.user.hopital_id)
         serializer.save(tenant=self.request.user.hopital)
     
+    def perform_update(self, serializer):
+        self._verifier_stockage(
+            serializer,
+            serializer.instance.tenant_id,
+            serializer.instance.taille_fichier_resultat
+        )
+        serializer.save()
+    
     @action(detail=True, methods=['post'])
     def ajouter_resultat(self, request, pk=None):
         """Ajouter le résultat d'un examen"""
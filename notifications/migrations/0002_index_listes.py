@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['utilisateur', '-created_at'], name='notificatio_utilisa_b41671_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('est_lu', False)), fields=['utilisateur', '-created_at'], name='notification_non_lues_idx'),
+        ),
+    ]
@@ -2,6 +2,7 @@
 from django.db import models
 from django.utils import timezone
 from django.utils.html import format_html
+from trimed_backend.tenancy import TenantManager
 
 class NotificationType(models.Model):
     """TABLE NotificationType"""
@@ -31,6 +32,8 @@ class NotificationType(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return self.nom
     
@@ -90,6 +93,8 @@ class Notification(models.Model):
     date_lu = models.DateTimeField(null=True, blank=True)
     date_envoyee = models.DateTimeField(null=True, blank=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return f"{self.titre} - {self.utilisateur}"
     
@@ -150,6 +155,13 @@ class Notification(models.Model):
         indexes = [
             models.Index(fields=['tenant', 'utilisateur', 'est_lu']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['utilisateur', '-created_at']),
+            # Boîte de réception : notifications non lues de l'utilisateur, les plus récentes d'abord
+            models.Index(
+                fields=['utilisateur', '-created_at'],
+                condition=models.Q(est_lu=False),
+                name='notification_non_lues_idx'
+            ),
         ]
 
 class PreferenceNotification(models.Model):
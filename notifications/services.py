@@ -0,0 +1,157 @@
+# services.py
+from django.core.cache import cache
+from django.db import transaction
+from .models import NotificationType, PreferenceNotification
+
+# Filet de sécurité si une invalidation est manquée (cache partagé : settings.CACHES)
+DUREE_CACHE_PREFERENCES = 5 * 60  # 5 minutes
+
+# Type de notification -> champ booléen de PreferenceNotification
+TYPES_PREFERENCE = {
+    'rdv_rappel': 'notify_rdv_rappel',
+    'rdv_annulation': 'notify_rdv_annulation',
+    'rdv_confirmation': 'notify_rdv_confirmation',
+    'consultation_ajout': 'notify_consultation_ajout',
+    'examen_resultat': 'notify_examen_resultat',
+    'paiement_success': 'notify_paiement_success',
+    'paiement_echec': 'notify_paiement_echec',
+    'abonnement_expiration': 'notify_abonnement_expiration',
+    'securite_connexion': 'notify_securite_connexion',
+    'securite_changement_mdp': 'notify_security_changement_mdp',
+}
+
+# Canal -> champ booléen de PreferenceNotification
+CANAUX_PREFERENCE = {
+    NotificationType.Canal.EMAIL: 'notifications_email',
+    NotificationType.Canal.SMS: 'notifications_sms',
+    NotificationType.Canal.APPLICATION: 'notifications_application',
+}
+
+
+def cle_cache_preferences(utilisateur_id):
+    return f'notifications:preferences:{utilisateur_id}'
+
+
+def invalider_preferences(utilisateur_id):
+    """
+    Supprimer les préférences d'un utilisateur du cache, tout de suite et
+    après la validation de la transaction en cours (une lecture concurrente
+    a pu remettre en cache l'ancienne ligne entre-temps)
+    """
+    cle = cle_cache_preferences(utilisateur_id)
+    cache.delete(cle)
+    transaction.on_commit(lambda: cache.delete(cle))
+
+
+def _utilisateur_id(utilisateur):
+    return getattr(utilisateur, 'pk', utilisateur)
+
+
+def charger_preferences(utilisateurs):
+    """
+    Charger les préférences d'une liste d'utilisateurs (instances ou ids).
+
+    Les préférences en cache sont réutilisées, les autres sont lues en une
+    seule requête ; les utilisateurs sans ligne reçoivent une instance non
+    enregistrée portant les valeurs par défaut du modèle.
+    Retourne un dictionnaire {utilisateur_id: PreferenceNotification}.
+    """
+    ids = list(dict.fromkeys(_utilisateur_id(u) for u in utilisateurs))
+    if not ids:
+        return {}
+
+    cles = {cle_cache_preferences(pk): pk for pk in ids}
+    preferences = {
+        cles[cle]: valeur for cle, valeur in cache.get_many(list(cles)).items()
+    }
+
+    manquants = [pk for pk in ids if pk not in preferences]
+    if manquants:
+        trouvees = {
+            p.utilisateur_id: p
+            for p in PreferenceNotification.objects.filter(utilisateur_id__in=manquants)
+        }
+        a_mettre_en_cache = {}
+        for pk in manquants:
+            preference = trouvees.get(pk) or PreferenceNotification(utilisateur_id=pk)
+            preferences[pk] = preference
+            a_mettre_en_cache[cle_cache_preferences(pk)] = preference
+        cache.set_many(a_mettre_en_cache, DUREE_CACHE_PREFERENCES)
+
+    return preferences
+
+
+def obtenir_preferences(utilisateur):
+    """Préférences d'un utilisateur (instance éventuellement non enregistrée)"""
+    pk = _utilisateur_id(utilisateur)
+    return charger_preferences([pk])[pk]
+
+
+def accepte(preference, type_notification, canal):
+    """Vérifier qu'une préférence autorise un type sur un canal"""
+    try:
+        champ_type = TYPES_PREFERENCE[type_notification]
+    except KeyError:
+        raise ValueError(f"Type de notification inconnu: {type_notification}")
+
+    if not getattr(preference, champ_type):
+        return False
+
+    if canal == NotificationType.Canal.TOUS:
+        return any(getattr(preference, champ) for champ in CANAUX_PREFERENCE.values())
+
+    try:
+        champ_canal = CANAUX_PREFERENCE[canal]
+    except KeyError:
+        raise ValueError(f"Canal inconnu: {canal}")
+
+    return getattr(preference, champ_canal)
+
+
+def destinataires_eligibles(type_notification, canal, utilisateurs):
+    """
+    Filtrer une liste d'utilisateurs (instances ou ids) selon leurs
+    préférences pour un envoi groupé. L'ordre d'entrée est conservé.
+    """
+    utilisateurs = list(utilisateurs)
+    preferences = charger_preferences(utilisateurs)
+
+    return [
+        u for u in utilisateurs
+        if accepte(preferences[_utilisateur_id(u)], type_notification, canal)
+    ]
+
+
+def creer_notifications(type_preference, nom_type, notifications, canal=NotificationType.Canal.APPLICATION):
+    """
+    Enregistrer en masse des notifications (instances non enregistrées,
+    sans type) pour les destinataires dont les préférences acceptent
+    `type_preference` sur le canal. Le type `nom_type` de chaque tenant
+    est créé au besoin. Les notifications restent à envoyer
+    (est_envoyee=False). Retourne les notifications créées.
+    """
+    from .models import Notification
+
+    eligibles = set(destinataires_eligibles(
+        type_preference, canal, {notification.utilisateur_id for notification in notifications}
+    ))
+    notifications = [n for n in notifications if n.utilisateur_id in eligibles]
+    if not notifications:
+        return []
+
+    tenant_ids = {notification.tenant_id for notification in notifications}
+    NotificationType._base_manager.bulk_create(
+        [
+            NotificationType(tenant_id=tenant_id, nom=nom_type, template='{titre}', canal=canal)
+            for tenant_id in tenant_ids
+        ],
+        ignore_conflicts=True
+    )
+    types = dict(
+        NotificationType._base_manager.filter(
+            tenant_id__in=tenant_ids, nom=nom_type
+        ).values_list('tenant_id', 'type_id')
+    )
+    for notification in notifications:
+        notification.type_id = types[notification.tenant_id]
+    return Notification._base_manager.bulk_create(notifications)
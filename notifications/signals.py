@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import PreferenceNotification
+from .services import invalider_preferences
+
+@receiver(post_save, sender=PreferenceNotification)
+@receiver(post_delete, sender=PreferenceNotification)
+def invalider_cache_preferences(sender, instance, **kwargs):
+    """
+    Retirer du cache les préférences modifiées ou supprimées
+    """
+    invalider_preferences(instance.utilisateur_id)
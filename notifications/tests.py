@@ -1,3 +1,126 @@
-from django.test import TestCase
+from unittest import mock
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from comptes.models import Utilisateur
+from gestion_tenants.models import Tenant
+from trimed_backend import tenancy
+from trimed_backend.authentication import TenantJWTAuthentication
+from .models import Notification, NotificationType, PreferenceNotification
+from .services import cle_cache_preferences, obtenir_preferences
+from .views import NotificationViewSet
 
-# Create your tests here.
+
+class PreferencesCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.utilisateur = Utilisateur.objects.creer_utilisateur(
+            'personnel@test.fr', 'Personnel Test', 'secret', role='personnel'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_relecture_concurrente_purgee_apres_validation(self):
+        """Une lecture de l'ancienne ligne pendant la transaction ne reste pas en cache"""
+        preference = PreferenceNotification.objects.create(utilisateur=self.utilisateur)
+        self.assertTrue(obtenir_preferences(self.utilisateur).notifications_email)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                preference.notifications_email = False
+                preference.save()
+                # Lecture concurrente de l'ancienne ligne, remise en cache avant la validation
+                cache.set(cle_cache_preferences(self.utilisateur.pk), PreferenceNotification(
+                    utilisateur=self.utilisateur
+                ))
+
+        self.assertFalse(obtenir_preferences(self.utilisateur).notifications_email)
+
+
+@override_settings(TENANT_SCHEMAS=True)
+class StatistiquesTenantsTests(TestCase):
+    """L'administration système lit chaque tenant dans son schéma"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Utilisateur.objects.creer_superutilisateur('admin@test.fr', 'Admin Test', 'secret')
+        cls.tenants = [Tenant.objects.create(nom=f'Hôpital {numero}', nombre_de_lits=10) for numero in range(2)]
+        for tenant, nombre in zip(cls.tenants, (1, 2)):
+            type_notification = NotificationType.objects.create(tenant=tenant, nom='Info', template='{titre}')
+            for _ in range(nombre):
+                Notification.objects.create(
+                    tenant=tenant, type=type_notification, utilisateur=cls.admin, titre='Titre', message='Message'
+                )
+
+    def test_tenant_deplace_lu_dans_son_schema(self):
+        Tenant.objects.filter(pk=self.tenants[1].pk).update(nom_schema_base_de_donnees='hopital_deplace')
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.admin)
+
+        schemas = []
+        volumetrie = NotificationViewSet._volumetrie
+
+        def espion(vue, queryset):
+            schemas.append(tenancy._parametres_voulus()[1])
+            return volumetrie(vue, queryset)
+
+        with mock.patch.object(NotificationViewSet, '_volumetrie', espion):
+            response = client.get('/api/notifications/notifications/statistiques_tenants/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(schemas, [None, 'hopital_deplace'])
+        self.assertEqual(
+            {ligne['tenant_id']: ligne['total'] for ligne in response.json()['tenants']},
+            {self.tenants[0].pk: 1, self.tenants[1].pk: 2}
+        )
+
+
+@override_settings(TENANT_RLS=True)
+class ContournementRlsTests(TestCase):
+    """Sous RLS, seule l'administration système lit tous les tenants à la fois"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+        cls.admin = Utilisateur.objects.creer_superutilisateur('admin@test.fr', 'Admin Test', 'secret')
+        cls.proprietaire = Utilisateur.objects.creer_utilisateur(
+            'proprietaire@test.fr', 'Propriétaire Test', 'secret', role='proprietaire-hopital', hopital=cls.tenant
+        )
+
+    def parametres_de_la_requete(self, utilisateur):
+        client = APIClient(SERVER_NAME='localhost')
+        # Passage par TenantJWTAuthentication, qui pose le tenant et le contournement
+        jeton = AccessToken()
+        jeton['user_id'] = utilisateur.pk
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {jeton}')
+        parametres = []
+        volumetrie = NotificationViewSet._volumetrie
+
+        def espion(vue, queryset):
+            parametres.append(tenancy._parametres_voulus())
+            return volumetrie(vue, queryset)
+
+        with mock.patch.object(TenantJWTAuthentication, 'get_user', return_value=utilisateur), \
+                mock.patch.object(NotificationViewSet, '_volumetrie', espion):
+            response = client.get('/api/notifications/notifications/statistiques_tenants/')
+        self.assertEqual(response.status_code, 200)
+        return parametres
+
+    def test_administration_systeme_contourne_les_politiques(self):
+        self.assertEqual(self.parametres_de_la_requete(self.admin), [(None, None, True)])
+        # Rien ne subsiste pour la requête suivante
+        self.assertEqual(tenancy._parametres_voulus(), (None, None, False))
+
+    def test_autres_roles_restent_cloisonnes(self):
+        self.assertEqual(self.parametres_de_la_requete(self.proprietaire), [(self.tenant.pk, None, False)])
+
+    def test_contournement_sans_effet_pour_un_tenant(self):
+        with tenancy.pour_tenant(None):
+            tenancy.definir_tenant(None, contournement=True)
+            with tenancy.pour_tenant(self.tenant):
+                self.assertEqual(tenancy._parametres_voulus(), (self.tenant.pk, None, False))
+            self.assertEqual(tenancy._parametres_voulus(), (None, None, True))
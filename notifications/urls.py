@@ -1,8 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .views import (
+    NotificationViewSet, NotificationTypeViewSet,
+    PreferenceNotificationViewSet
+)
 
 router = DefaultRouter()
-# TODO: Ajouter les routes nécessaires
+router.register(r'notifications', NotificationViewSet, basename='notification')
+router.register(r'types', NotificationTypeViewSet, basename='type')
+router.register(r'preferences', PreferenceNotificationViewSet, basename='preference')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -5,13 +5,16 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, Count, Max
 from .models import Notification, NotificationType, PreferenceNotification
 from .serializers import (
     NotificationSerializer, NotificationTypeSerializer,
     PreferenceNotificationSerializer, NotificationLueSerializer
 )
+from .services import obtenir_preferences
 from comptes.permissions import EstAdminSysteme, EstProprietaireHopital
+from trimed_backend.replicas import lecture_replica
+from trimed_backend import tenancy
 
 class NotificationViewSet(viewsets.ModelViewSet):
     """ViewSet pour les notifications"""
@@ -19,6 +22,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['est_lu', 'priorite']
     ordering_fields = ['created_at', 'priorite']
     
     def get_queryset(self):
@@ -28,22 +32,6 @@ class NotificationViewSet(viewsets.ModelViewSet):
         # Filtrer par utilisateur (chacun ne voit que ses notifications)
         queryset = queryset.filter(utilisateur=user)
         
-        # Filtrer par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
-        # Filtrer par lecture
-        est_lu = self.request.query_params.get('est_lu')
-        if est_lu == 'true':
-            queryset = queryset.filter(est_lu=True)
-        elif est_lu == 'false':
-            queryset = queryset.filter(est_lu=False)
-        
-        # Filtrer par priorité
-        priorite = self.request.query_params.get('priorite')
-        if priorite:
-            queryset = queryset.filter(priorite=priorite)
-        
         # Filtrer par type
         type_id = self.request.query_params.get('type_id')
         if type_id:
@@ -99,33 +87,83 @@ class NotificationViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @lecture_replica
     def statistiques(self, request):
         """Statistiques des notifications"""
-        user = request.user
-        
-        total_notifications = self.get_queryset().count()
-        notifications_lues = self.get_queryset().filter(est_lu=True).count()
-        notifications_non_lues = self.get_queryset().filter(est_lu=False).count()
-        
-        # Notifications par priorité
-        par_priorite = self.get_queryset().values('priorite').annotate(
-            total=models.Count('notification_id')
+        # Une seule requête groupée par (priorité, type), repliée en Python
+        groupes = self.get_queryset().order_by().values('priorite', 'type__nom').annotate(
+            total=Count('notification_id'),
+            lues=Count('notification_id', filter=Q(est_lu=True))
         )
         
-        # Notifications par type
-        par_type = self.get_queryset().values('type__nom').annotate(
-            total=models.Count('notification_id')
-        )
+        total_notifications = 0
+        notifications_lues = 0
+        par_priorite = {}
+        par_type = {}
+        for groupe in groupes:
+            total_notifications += groupe['total']
+            notifications_lues += groupe['lues']
+            par_priorite[groupe['priorite']] = par_priorite.get(groupe['priorite'], 0) + groupe['total']
+            par_type[groupe['type__nom']] = par_type.get(groupe['type__nom'], 0) + groupe['total']
         
         data = {
             'total': total_notifications,
             'lues': notifications_lues,
-            'non_lues': notifications_non_lues,
-            'par_priorite': list(par_priorite),
-            'par_type': list(par_type),
+            'non_lues': total_notifications - notifications_lues,
+            'par_priorite': [
+                {'priorite': priorite, 'total': total}
+                for priorite, total in par_priorite.items()
+            ],
+            'par_type': [
+                {'type__nom': nom, 'total': total}
+                for nom, total in par_type.items()
+            ],
         }
         
         return Response(data)
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, EstAdminSysteme | EstProprietaireHopital]
+    )
+    @lecture_replica
+    def statistiques_tenants(self, request):
+        """Volumétrie des notifications par tenant, tous utilisateurs confondus"""
+        user = request.user
+        
+        queryset = Notification.objects.all()
+        if user.role == 'admin-systeme':
+            # Chaque schéma est lu pour les seuls tenants qui y résident
+            par_tenant = []
+            for _, tenant_ids in tenancy.par_schema():
+                par_tenant += self._volumetrie(queryset.filter(tenant_id__in=tenant_ids))
+            par_tenant.sort(key=lambda ligne: -ligne['total'])
+        elif not user.hopital:
+            return Response(
+                {'error': 'Aucun tenant associé'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        else:
+            par_tenant = self._volumetrie(queryset.filter(tenant=user.hopital))
+        
+        return Response({
+            'tenants': par_tenant,
+            'total_tenants': len(par_tenant),
+        })
+    
+    def _volumetrie(self, queryset):
+        return list(queryset.order_by().values('tenant_id', 'tenant__nom').annotate(
+            total=Count('notification_id'),
+            non_lues=Count('notification_id', filter=Q(est_lu=False)),
+            non_envoyees=Count('notification_id', filter=Q(est_envoyee=False)),
+            urgentes_non_lues=Count(
+                'notification_id',
+                filter=Q(est_lu=False, priorite=Notification.Priorite.URGENT)
+            ),
+            utilisateurs=Count('utilisateur', distinct=True),
+            derniere_notification=Max('created_at')
+        ).order_by('-total'))
 
 class PreferenceNotificationViewSet(viewsets.ModelViewSet):
     """ViewSet pour les préférences de notifications"""
@@ -143,15 +181,18 @@ class PreferenceNotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def mes_preferences(self, request):
         """Récupérer les préférences de l'utilisateur connecté"""
-        try:
-            preferences = PreferenceNotification.objects.get(utilisateur=request.user)
+        preferences = obtenir_preferences(request.user)
+        
+        if preferences.pk:
             serializer = self.get_serializer(preferences)
             return Response(serializer.data)
-        except PreferenceNotification.DoesNotExist:
-            # Créer des préférences par défaut
-            preferences = PreferenceNotification.objects.create(utilisateur=request.user)
-            serializer = self.get_serializer(preferences)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        
+        # Enregistrer les préférences par défaut
+        preferences, created = PreferenceNotification.objects.get_or_create(
+            utilisateur=request.user
+        )
+        serializer = self.get_serializer(preferences)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class NotificationTypeViewSet(viewsets.ModelViewSet):
     """ViewSet pour les types de notifications"""
@@ -162,16 +203,6 @@ class NotificationTypeViewSet(viewsets.ModelViewSet):
     filterset_fields = ['tenant']
     search_fields = ['nom', 'description']
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Filtrer par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
-        return queryset
-    
     def perform_create(self, serializer):
         """Surcharge pour ajouter automatiquement le tenant"""
         serializer.save(tenant=self.request.user.hopital)
\ No newline at end of file
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='suivipatient',
+            index=models.Index(fields=['patient', '-date_suivi'], name='suivi_patie_patient_296aff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suivipatient',
+            index=models.Index(fields=['medecin', '-date_suivi'], name='suivi_patie_medecin_9b141f_idx'),
+        ),
+    ]
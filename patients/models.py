@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator, EmailValidator
+from trimed_backend.tenancy import TenantManager
 
 class Patient(models.Model):
     """TABLE Patient"""
@@ -53,6 +54,8 @@ class Patient(models.Model):
         related_name='patient_lie'
     )
     
+    objects = TenantManager(champ='hopital')
+    
     def __str__(self):
         return f"{self.prenom} {self.nom}"
     
@@ -329,4 +332,8 @@ class SuiviPatient(models.Model):
         db_table = 'suivi_patient'
         verbose_name = 'Suivi Patient'
         verbose_name_plural = 'Suivis Patients'
-        ordering = ['-date_suivi']
\ No newline at end of file
+        ordering = ['-date_suivi']
+        indexes = [
+            models.Index(fields=['patient', '-date_suivi']),
+            models.Index(fields=['medecin', '-date_suivi']),
+        ]
\ No newline at end of file
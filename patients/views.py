@@ -17,10 +17,12 @@ from .serializers import (
     AssurancePatientSerializer, AllergiePatientSerializer,
     AntecedentMedicalSerializer, SuiviPatientSerializer
 )
+from facturation.quotas import verifier_quota
 from comptes.permissions import (
     EstMedecin, EstPersonnel, EstPatient,
     EstDansMemesTenant
 )
+from trimed_backend.replicas import lecture_replica
 
 class PatientViewSet(viewsets.ModelViewSet):
     """
@@ -62,10 +64,6 @@ class PatientViewSet(viewsets.ModelViewSet):
         if user.role == 'patient' and hasattr(user, 'patient_lie'):
             return queryset.filter(pk=user.patient_lie.pk)
         
-        # Filtrer par tenant
-        if user.hopital:
-            queryset = queryset.filter(hopital=user.hopital)
-        
         # Recherche par date de naissance
         date_naissance = self.request.query_params.get('date_naissance', None)
         if date_naissance:
@@ -89,6 +87,7 @@ class PatientViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Surcharge pour ajouter automatiquement le tenant"""
+        verifier_quota(self.request.user.hopital_id, 'patients')
         serializer.save(hopital=self.request.user.hopital)
     
     @action(detail=True, methods=['get'])
@@ -109,6 +108,7 @@ class PatientViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
+    @lecture_replica
     def statistiques(self, request, pk=None):
         """Statistiques du patient"""
         patient = self.get_object()
@@ -1,6 +1,9 @@
 # admin.py
 from django.contrib import admin
-from .models import RendezVousType, RendezVousStatut, RendezVous
+from .models import (
+    RendezVousType, RendezVousStatut, RendezVous, HoraireMedecin, AbsenceMedecin, SerieRendezVous,
+    TauxAbsenceMedecin, TauxAbsencePatient, ListeAttente, JetonCalendrier
+)
 
 @admin.register(RendezVousType)
 class RendezVousTypeAdmin(admin.ModelAdmin):
@@ -41,7 +44,7 @@ class RendezVousAdmin(admin.ModelAdmin):
             'fields': ('tenant', 'patient', 'medecin', 'date_heure')
         }),
         ('Détails', {
-            'fields': ('type', 'statut', 'motif')
+            'fields': ('type', 'statut', 'motif', 'serie')
         }),
         ('Notes', {
             'fields': ('notes', 'raison_annulation')
@@ -49,4 +52,48 @@ class RendezVousAdmin(admin.ModelAdmin):
         ('Système', {
             'fields': ('created_at', 'updated_at')
         }),
-    )
\ No newline at end of file
+    )
+@admin.register(HoraireMedecin)
+class HoraireMedecinAdmin(admin.ModelAdmin):
+    list_display = ('medecin', 'jour_semaine', 'heure_debut', 'heure_fin', 'tenant')
+    list_filter = ('tenant', 'jour_semaine')
+    search_fields = ('medecin__nom', 'medecin__prenom')
+
+@admin.register(AbsenceMedecin)
+class AbsenceMedecinAdmin(admin.ModelAdmin):
+    list_display = ('medecin', 'debut', 'fin', 'motif', 'tenant')
+    list_filter = ('tenant', 'debut')
+    search_fields = ('medecin__nom', 'medecin__prenom', 'motif')
+
+@admin.register(SerieRendezVous)
+class SerieRendezVousAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'medecin', 'frequence', 'intervalle', 'date_debut', 'tenant')
+    list_filter = ('tenant', 'frequence')
+    search_fields = ('patient__nom', 'patient__prenom', 'medecin__nom', 'motif')
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(TauxAbsenceMedecin)
+class TauxAbsenceMedecinAdmin(admin.ModelAdmin):
+    list_display = ('medecin', 'rendez_vous_clos', 'absences', 'taux', 'updated_at')
+    list_filter = ('tenant',)
+    search_fields = ('medecin__nom', 'medecin__prenom')
+
+@admin.register(TauxAbsencePatient)
+class TauxAbsencePatientAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'rendez_vous_clos', 'absences', 'taux', 'derniere_absence')
+    list_filter = ('tenant',)
+    search_fields = ('patient__nom', 'patient__prenom')
+
+@admin.register(ListeAttente)
+class ListeAttenteAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'medecin', 'specialite', 'date_debut', 'date_fin', 'priorite', 'statut', 'tenant')
+    list_filter = ('tenant', 'statut')
+    search_fields = ('patient__nom', 'patient__prenom', 'medecin__nom', 'motif')
+    readonly_fields = ('date_proposition', 'created_at', 'updated_at')
+
+@admin.register(JetonCalendrier)
+class JetonCalendrierAdmin(admin.ModelAdmin):
+    list_display = ('utilisateur', 'cible', 'cible_id', 'tenant', 'created_at')
+    list_filter = ('tenant', 'cible')
+    search_fields = ('utilisateur__email',)
+    exclude = ('jeton',)
@@ -0,0 +1,165 @@
+# agenda.py
+"""
+Agenda journalier des médecins en cache.
+
+L'agenda d'un médecin pour une journée locale est un document (liste des
+rendez-vous sérialisés et son ETag) gardé dans le cache partagé. Il est
+construit à la première lecture ou préchauffé la nuit pour le lendemain.
+Sa clé porte le numéro de version de la journée du médecin, renouvelé
+après la validation de toute modification d'un de ses rendez-vous : par
+les signaux pour les enregistrements unitaires, explicitement pour les
+mises à jour groupées. Un document construit d'après une lecture
+antérieure à la modification est rangé sous l'ancienne version et n'est
+plus jamais servi. Une ouverture répétée de l'agenda ne touche donc pas
+la base.
+"""
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from gestion_tenants.services import fuseau_horaire
+from trimed_backend import referentiel
+from .models import RendezVous
+
+# Filet de sécurité pour les changements non suivis (nom d'un patient, d'un type...)
+DUREE_CACHE_AGENDA = 24 * 60 * 60
+MEDECINS_PAR_LOT = 200
+
+
+def _cle_version_agenda(tenant_id, medecin_id, jour):
+    return f'rendez_vous:agenda:version:{tenant_id}:{medecin_id}:{jour.isoformat()}'
+
+
+def _cle_agenda(tenant_id, medecin_id, jour, version):
+    return f'rendez_vous:agenda:{tenant_id}:{medecin_id}:{jour.isoformat()}:{version}'
+
+
+def _versions(tenant_id, medecin_ids, jour):
+    """Numéros de version des journées des médecins, en une lecture du cache"""
+    cles = {medecin_id: _cle_version_agenda(tenant_id, medecin_id, jour) for medecin_id in medecin_ids}
+    en_cache = cache.get_many(list(cles.values()))
+    return {
+        medecin_id: en_cache[cle] if cle in en_cache else referentiel.version_de(cle, DUREE_CACHE_AGENDA)
+        for medecin_id, cle in cles.items()
+    }
+
+
+def _cle_medecin_utilisateur(utilisateur_id):
+    return f'rendez_vous:medecin_utilisateur:{utilisateur_id}'
+
+
+def invalider_agenda(tenant_id, creneaux):
+    """
+    Renouveler la version des agendas touchés par des rendez-vous
+    [(medecin_id, date_heure)], après la validation de la transaction en cours
+    """
+    fuseau = fuseau_horaire(tenant_id)
+    cles = {
+        _cle_version_agenda(tenant_id, medecin_id, date_heure.astimezone(fuseau).date())
+        for medecin_id, date_heure in creneaux
+    }
+
+    def renouveler():
+        for cle in cles:
+            referentiel.changer_version(cle, DUREE_CACHE_AGENDA)
+
+    if cles:
+        transaction.on_commit(renouveler)
+
+
+def invalider_medecin_utilisateur(utilisateur_id):
+    cache.delete(_cle_medecin_utilisateur(utilisateur_id))
+
+
+def medecin_de(utilisateur):
+    """Id du médecin lié à l'utilisateur, ou None (mis en cache)"""
+    from medical.models import Medecin
+
+    cle = _cle_medecin_utilisateur(utilisateur.pk)
+    medecin_id = cache.get(cle)
+    if medecin_id is None:
+        medecin_id = Medecin._base_manager.filter(
+            utilisateur_id=utilisateur.pk
+        ).values_list('pk', flat=True).first() or 0
+        cache.set(cle, medecin_id, DUREE_CACHE_AGENDA)
+    return medecin_id or None
+
+
+def journee(tenant_id, moment=None, decalage=0):
+    """Date locale du tenant (aujourd'hui par défaut), décalée de `decalage` jours"""
+    moment = moment or timezone.now()
+    return moment.astimezone(fuseau_horaire(tenant_id)).date() + timedelta(days=decalage)
+
+
+def construire_agendas(tenant_id, medecin_ids, jour):
+    """
+    Construire et mettre en cache les agendas des médecins pour une
+    journée locale, en une requête. Retourne {medecin_id: document}.
+    """
+    from .serializers import RendezVousListSerializer
+
+    # Versions lues avant les rendez-vous : une modification validée entre-temps
+    # renouvelle la version, et ce document ne sera pas servi
+    versions = _versions(tenant_id, medecin_ids, jour)
+    fuseau = fuseau_horaire(tenant_id)
+    debut = datetime.combine(jour, time.min, tzinfo=fuseau)
+    fin = datetime.combine(jour + timedelta(days=1), time.min, tzinfo=fuseau)
+    par_medecin = {medecin_id: [] for medecin_id in medecin_ids}
+    for rdv in RendezVous._base_manager.filter(
+        tenant_id=tenant_id,
+        medecin_id__in=par_medecin,
+        date_heure__gte=debut,
+        date_heure__lt=fin,
+    ).select_related('patient', 'medecin', 'type', 'statut').order_by('date_heure'):
+        par_medecin[rdv.medecin_id].append(rdv)
+
+    documents = {}
+    for medecin_id, rendez_vous in par_medecin.items():
+        contenu = {
+            'medecin_id': medecin_id,
+            'date': jour.isoformat(),
+            'rendez_vous': json.loads(json.dumps(
+                RendezVousListSerializer(rendez_vous, many=True).data, cls=DjangoJSONEncoder
+            )),
+        }
+        empreinte = hashlib.md5(json.dumps(contenu, sort_keys=True).encode()).hexdigest()
+        documents[medecin_id] = {'etag': f'"{empreinte}"', 'contenu': contenu}
+    cache.set_many(
+        {
+            _cle_agenda(tenant_id, medecin_id, jour, versions[medecin_id]): document
+            for medecin_id, document in documents.items()
+        },
+        DUREE_CACHE_AGENDA
+    )
+    return documents
+
+
+def agenda(tenant_id, medecin_id, jour):
+    """
+    Document de l'agenda du médecin pour la journée, lu dans le cache ou
+    construit ; None si le médecin n'appartient pas au tenant
+    """
+    from medical.models import Medecin
+
+    version = _versions(tenant_id, [medecin_id], jour)[medecin_id]
+    document = cache.get(_cle_agenda(tenant_id, medecin_id, jour, version))
+    if document is None:
+        if not Medecin._base_manager.filter(pk=medecin_id, hopital_id=tenant_id).exists():
+            return None
+        document = construire_agendas(tenant_id, [medecin_id], jour)[medecin_id]
+    return document
+
+
+def prechauffer_agendas(tenant_id, jour):
+    """Construire les agendas de tous les médecins du tenant ; retourne leur nombre"""
+    from medical.models import Medecin
+
+    medecin_ids = list(
+        Medecin._base_manager.filter(hopital_id=tenant_id).order_by('pk').values_list('pk', flat=True)
+    )
+    for indice in range(0, len(medecin_ids), MEDECINS_PAR_LOT):
+        construire_agendas(tenant_id, medecin_ids[indice:indice + MEDECINS_PAR_LOT], jour)
+    return len(medecin_ids)
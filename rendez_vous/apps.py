@@ -5,3 +5,6 @@ class RendezVousConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rendez_vous'
     verbose_name = 'Gestion des Rendez-vous'
+    
+    def ready(self):
+        import rendez_vous.signals
@@ -0,0 +1,168 @@
+# calendrier.py
+"""
+Flux iCalendar des rendez-vous d'un médecin ou d'un patient.
+
+Chaque utilisateur peut obtenir un jeton secret donnant accès, sans
+authentification, au flux de ses rendez-vous (clients d'agenda des
+téléphones). Le flux est écrit au fil d'un itérateur sur les seules
+colonnes utiles. Son ETag, dérivé du dernier `updated_at` et du nombre de
+rendez-vous de la fenêtre, est gardé en cache et invalidé à chaque
+modification : les interrogations périodiques des clients reçoivent un
+304 sans requête sur les rendez-vous. Le jeton, lui, est relu à chaque
+requête (index unique) : sa révocation prend effet immédiatement.
+"""
+import hashlib
+import secrets
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from trimed_backend import referentiel, tenancy
+from .models import DUREE_PAR_DEFAUT, JetonCalendrier, RendezVous, RendezVousStatut
+
+# Filet de sécurité pour les changements non suivis (nom d'un patient, d'un type...)
+DUREE_CACHE_CALENDRIER = 24 * 60 * 60
+HISTORIQUE_JOURS = 30
+HORIZON_JOURS = 365
+TAILLE_LOT = 500
+
+
+def _cle_etag(tenant_id, cible, cible_id):
+    return f'rendez_vous:calendrier:etag:{tenant_id}:{cible}:{cible_id}'
+
+
+def invalider_calendriers(tenant_id, medecin_ids=(), patient_ids=()):
+    """Supprimer les ETags des flux touchés, après la validation de la transaction en cours"""
+    cles = [_cle_etag(tenant_id, JetonCalendrier.Cible.MEDECIN, pk) for pk in set(medecin_ids)]
+    cles += [_cle_etag(tenant_id, JetonCalendrier.Cible.PATIENT, pk) for pk in set(patient_ids)]
+    if cles:
+        transaction.on_commit(lambda: cache.delete_many(cles))
+
+
+def creer_jeton(utilisateur, cible, cible_id):
+    """Créer le jeton du flux de l'utilisateur, en révoquant le précédent"""
+    with transaction.atomic():
+        revoquer_jeton(utilisateur)
+        return JetonCalendrier.objects.create(
+            jeton=secrets.token_urlsafe(32),
+            tenant_id=utilisateur.hopital_id,
+            utilisateur=utilisateur,
+            cible=cible,
+            cible_id=cible_id,
+        )
+
+
+def revoquer_jeton(utilisateur):
+    """Supprimer le jeton de l'utilisateur ; retourne True s'il en avait un"""
+    supprimes, _ = JetonCalendrier.objects.filter(utilisateur=utilisateur).delete()
+    return supprimes > 0
+
+
+def flux_du_jeton(jeton):
+    """(tenant_id, cible, cible_id) du flux du jeton, ou None"""
+    return JetonCalendrier.objects.filter(jeton=jeton).values_list(
+        'tenant_id', 'cible', 'cible_id'
+    ).first()
+
+
+def _fenetre(jour):
+    debut = datetime.combine(jour - timedelta(days=HISTORIQUE_JOURS), time.min, tzinfo=timezone.utc)
+    return debut, debut + timedelta(days=HISTORIQUE_JOURS + HORIZON_JOURS)
+
+
+def _rendez_vous(flux, jour):
+    tenant_id, cible, cible_id = flux
+    debut, fin = _fenetre(jour)
+    return RendezVous._base_manager.filter(
+        tenant_id=tenant_id, date_heure__gte=debut, date_heure__lt=fin, **{f'{cible}_id': cible_id}
+    )
+
+
+def etag(flux):
+    """ETag du flux pour la fenêtre du jour (mis en cache)"""
+    cle = _cle_etag(*flux)
+    jour = timezone.now().date()
+    en_cache = cache.get(cle)
+    if en_cache and en_cache[0] == jour:
+        return en_cache[1]
+
+    with tenancy.pour_tenant(flux[0]):
+        resume = _rendez_vous(flux, jour).aggregate(modifie=Max('updated_at'), nombre=Count('pk'))
+    empreinte = hashlib.md5(
+        f"{jour}:{resume['modifie'] and resume['modifie'].isoformat()}:{resume['nombre']}".encode()
+    ).hexdigest()
+    valeur = f'"{empreinte}"'
+    cache.set(cle, (jour, valeur), DUREE_CACHE_CALENDRIER)
+    return valeur
+
+
+def _texte(valeur):
+    return (
+        (valeur or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _horodatage(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ligne(contenu):
+    """Ligne iCalendar repliée à 75 octets (RFC 5545, 3.1)"""
+    octets = contenu.encode()
+    morceaux = []
+    while len(octets) > 75:
+        coupure = 75 if not morceaux else 74
+        # Ne pas couper au milieu d'un caractère UTF-8
+        while octets[coupure] & 0xC0 == 0x80:
+            coupure -= 1
+        morceaux.append(octets[:coupure])
+        octets = octets[coupure:]
+    morceaux.append(octets)
+    return b'\r\n '.join(morceaux) + b'\r\n'
+
+
+def generer_ics(flux):
+    """Itérateur sur les lignes (bytes) du flux iCalendar"""
+    tenant_id, cible, cible_id = flux
+    autre = 'patient' if cible == JetonCalendrier.Cible.MEDECIN else 'medecin'
+    yield _ligne('BEGIN:VCALENDAR')
+    yield _ligne('VERSION:2.0')
+    yield _ligne('PRODID:-//Trimedh//Rendez-vous//FR')
+    yield _ligne('CALSCALE:GREGORIAN')
+    yield _ligne('X-WR-CALNAME:Rendez-vous')
+
+    with tenancy.pour_tenant(tenant_id):
+        statuts = {
+            statut.pk: statut
+            for statut in referentiel.references(RendezVousStatut, tenant_id).values()
+        }
+        lignes = _rendez_vous(flux, timezone.now().date()).order_by('date_heure').values_list(
+            'pk', 'date_heure', 'updated_at', 'statut_id', 'motif',
+            'type__nom', 'type__duree_defaut', f'{autre}__prenom', f'{autre}__nom'
+        ).iterator(chunk_size=TAILLE_LOT)
+        for pk, date_heure, modifie, statut_id, motif, type_nom, duree, prenom, nom in lignes:
+            statut = statuts.get(statut_id)
+            if statut and statut.est_annule:
+                etat = 'CANCELLED'
+            elif statut and statut.nom == 'Confirmé':
+                etat = 'CONFIRMED'
+            else:
+                etat = 'TENTATIVE'
+            titre = f"{type_nom or 'Rendez-vous'} - {'Dr ' if autre == 'medecin' else ''}{prenom} {nom}"
+            fin = date_heure + timedelta(minutes=DUREE_PAR_DEFAUT if duree is None else duree)
+
+            yield _ligne('BEGIN:VEVENT')
+            yield _ligne(f'UID:rendez-vous-{pk}@trimedh')
+            yield _ligne(f'DTSTAMP:{_horodatage(modifie)}')
+            yield _ligne(f'LAST-MODIFIED:{_horodatage(modifie)}')
+            yield _ligne(f'DTSTART:{_horodatage(date_heure)}')
+            yield _ligne(f'DTEND:{_horodatage(fin)}')
+            yield _ligne(f'SUMMARY:{_texte(titre)}')
+            if motif:
+                yield _ligne(f'DESCRIPTION:{_texte(motif)}')
+            yield _ligne(f'STATUS:{etat}')
+            yield _ligne('END:VEVENT')
+
+    yield _ligne('END:VCALENDAR')
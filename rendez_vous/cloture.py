@@ -0,0 +1,143 @@
+# cloture.py
+"""
+Clôture des journées passées.
+
+Chaque nuit, les rendez-vous passés restés planifiés ou confirmés sont
+clos par deux UPDATE ensemblistes par tenant, devenu tenant courant le
+temps de son tour : 'Terminé' s'il existe une consultation liée (WHERE
+EXISTS), 'Absent' sinon. Les taux d'absence des
+médecins et patients concernés sont ensuite recalculés par agrégation.
+"""
+from datetime import datetime, time
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q
+from django.utils import timezone
+from gestion_tenants.services import fuseaux_horaires
+from trimed_backend import referentiel, tenancy
+from .agenda import invalider_agenda
+from .calendrier import invalider_calendriers
+from .models import RendezVous, RendezVousStatut, TauxAbsenceMedecin, TauxAbsencePatient
+
+
+def statuts_clos(tenant_id):
+    """Ids des statuts qui closent un rendez-vous (annulé, terminé, absent)"""
+    return [
+        statut.pk for statut in referentiel.references(RendezVousStatut, tenant_id).values()
+        if statut.est_annule or statut.est_termine or statut.est_absence
+    ]
+
+
+def _taux(absences, total):
+    if not total:
+        return Decimal('0')
+    return (Decimal(absences) * 100 / total).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def recalculer_taux_absence(tenant_id, medecin_ids=None, patient_ids=None):
+    """
+    Recalculer les taux d'absence du tenant (limités aux médecins et
+    patients donnés) à partir des rendez-vous terminés et absents
+    """
+    termine = referentiel.statut_rendez_vous(tenant_id, 'Terminé')
+    absent = referentiel.statut_rendez_vous(tenant_id, 'Absent')
+    clos = RendezVous._base_manager.filter(tenant_id=tenant_id, statut_id__in=[termine.pk, absent.pk])
+    absence = Q(statut_id=absent.pk)
+
+    medecins = clos if medecin_ids is None else clos.filter(medecin_id__in=medecin_ids)
+    TauxAbsenceMedecin._base_manager.bulk_create(
+        [
+            TauxAbsenceMedecin(
+                medecin_id=ligne['medecin_id'],
+                tenant_id=tenant_id,
+                rendez_vous_clos=ligne['total'],
+                absences=ligne['absences'],
+                taux=_taux(ligne['absences'], ligne['total']),
+            )
+            for ligne in medecins.order_by().values('medecin_id').annotate(
+                total=Count('pk'), absences=Count('pk', filter=absence)
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=['medecin'],
+        update_fields=['rendez_vous_clos', 'absences', 'taux', 'updated_at'],
+        batch_size=1000
+    )
+
+    patients = clos if patient_ids is None else clos.filter(patient_id__in=patient_ids)
+    TauxAbsencePatient._base_manager.bulk_create(
+        [
+            TauxAbsencePatient(
+                patient_id=ligne['patient_id'],
+                tenant_id=tenant_id,
+                rendez_vous_clos=ligne['total'],
+                absences=ligne['absences'],
+                taux=_taux(ligne['absences'], ligne['total']),
+                derniere_absence=ligne['derniere_absence'],
+            )
+            for ligne in patients.order_by().values('patient_id').annotate(
+                total=Count('pk'),
+                absences=Count('pk', filter=absence),
+                derniere_absence=Max('date_heure', filter=absence),
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=['patient'],
+        update_fields=['rendez_vous_clos', 'absences', 'taux', 'derniere_absence', 'updated_at'],
+        batch_size=1000
+    )
+
+
+def cloturer_tenant(tenant_id, limite):
+    """
+    Clore les rendez-vous du tenant antérieurs à `limite`.
+    Retourne (nombre de terminés, nombre d'absents).
+    """
+    from medical.models import Consultation
+
+    # Statuts créés au besoin avant de lister les statuts clos
+    termine = referentiel.statut_rendez_vous(tenant_id, 'Terminé')
+    absent = referentiel.statut_rendez_vous(tenant_id, 'Absent')
+    ouverts = RendezVous._base_manager.filter(
+        tenant_id=tenant_id, date_heure__lt=limite
+    ).exclude(statut_id__in={termine.pk, absent.pk, *statuts_clos(tenant_id)})
+    consultation = Exists(Consultation._base_manager.filter(rendez_vous_id=OuterRef('pk')))
+
+    with transaction.atomic():
+        concernes = list(ouverts.order_by().values_list('medecin_id', 'patient_id', 'date_heure'))
+        if not concernes:
+            return 0, 0
+        maintenant = timezone.now()
+        termines = ouverts.filter(consultation).update(statut=termine, updated_at=maintenant)
+        # Les terminés sont désormais exclus de `ouverts`
+        absents = ouverts.update(statut=absent, updated_at=maintenant)
+        medecin_ids = {medecin_id for medecin_id, _, _ in concernes}
+        patient_ids = {patient_id for _, patient_id, _ in concernes}
+        recalculer_taux_absence(tenant_id, medecin_ids=medecin_ids, patient_ids=patient_ids)
+        invalider_agenda(tenant_id, [(medecin_id, date_heure) for medecin_id, _, date_heure in concernes])
+        invalider_calendriers(tenant_id, medecin_ids=medecin_ids, patient_ids=patient_ids)
+    return termines, absents
+
+
+def cloturer_journees(tenant_ids=None, date_reference=None):
+    """
+    Clore les rendez-vous des journées locales antérieures à
+    `date_reference` (aujourd'hui par défaut) dans chaque tenant.
+    Retourne {tenant_id: (terminés, absents)} pour les tenants modifiés.
+    """
+    from gestion_tenants.models import Tenant
+
+    if tenant_ids is None:
+        tenant_ids = Tenant.objects.order_by('pk').values_list('pk', flat=True)
+    tenant_ids = list(tenant_ids)
+    fuseaux = fuseaux_horaires(tenant_ids)
+    maintenant = timezone.now()
+
+    resultats = {}
+    for tenant_id in tenancy.par_tenant(tenant_ids):
+        jour = date_reference or maintenant.astimezone(fuseaux[tenant_id]).date()
+        limite = datetime.combine(jour, time.min, tzinfo=fuseaux[tenant_id])
+        termines, absents = cloturer_tenant(tenant_id, limite)
+        if termines or absents:
+            resultats[tenant_id] = (termines, absents)
+    return resultats
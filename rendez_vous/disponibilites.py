@@ -0,0 +1,335 @@
+# disponibilites.py
+"""
+Disponibilités des médecins en bitmaps.
+
+Chaque journée locale d'un médecin est découpée en créneaux de 5 minutes ;
+DisponibiliteMedecin en garde deux bitmaps (bit i = créneau commençant à
+i*5 min, heure locale de l'établissement) :
+- creneaux_ouverts : horaires du médecin moins ses absences ;
+- creneaux_libres : créneaux ouverts non occupés par un rendez-vous.
+
+Les journées enregistrées sont recalculées par les signaux quand un
+horaire ou une absence change, ou quand le créneau d'un rendez-vous
+(médecin, horaire, type, statut) change : seules ses journées locales sont
+alors recalculées, sous verrou. Les journées manquantes sont calculées à
+la première lecture. Chercher un créneau revient ensuite à des
+opérations sur des entiers, sans parcourir les rendez-vous.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.utils import timezone
+from gestion_tenants.services import fuseau_horaire, fuseaux_horaires
+from .models import (
+    AbsenceMedecin, DisponibiliteMedecin, HoraireMedecin, RendezVous, DUREE_PAR_DEFAUT
+)
+from .services import duree_max_rendez_vous, statuts_annules
+
+GRANULARITE = 5  # minutes
+CRENEAUX_PAR_JOUR = 24 * 60 // GRANULARITE
+TAILLE_BITMAP = CRENEAUX_PAR_JOUR // 8
+HORIZON_JOURS = 60
+PAS_CRENEAUX = 30  # minutes entre deux créneaux proposés
+
+# Horaires des médecins sans HoraireMedecin : 8h-18h du lundi au samedi
+HORAIRES_PAR_DEFAUT = {jour: [(time(8), time(18))] for jour in range(6)}
+
+
+def encoder(bits):
+    return bits.to_bytes(TAILLE_BITMAP, 'little')
+
+
+def decoder(valeur):
+    return int.from_bytes(bytes(valeur), 'little')
+
+
+def masque(premier, dernier):
+    """Bits des créneaux [premier, dernier["""
+    premier, dernier = max(premier, 0), min(dernier, CRENEAUX_PAR_JOUR)
+    if dernier <= premier:
+        return 0
+    return ((1 << (dernier - premier)) - 1) << premier
+
+
+def _minutes(moment):
+    """Minutes écoulées depuis minuit (heure murale)"""
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+def _couverture(debut_minutes, fin_minutes):
+    """Bits des créneaux touchés par un intervalle en minutes"""
+    return masque(math.floor(debut_minutes / GRANULARITE), math.ceil(fin_minutes / GRANULARITE))
+
+
+def _par_jour(debut, fin, fuseau):
+    """Découper [debut, fin[ en (date locale, minute de début, minute de fin)"""
+    debut, fin = debut.astimezone(fuseau), fin.astimezone(fuseau)
+    jour = debut.date()
+    while jour <= fin.date():
+        premiere = _minutes(debut) if jour == debut.date() else 0
+        derniere = _minutes(fin) if jour == fin.date() else 24 * 60
+        if derniere > premiere:
+            yield jour, premiere, derniere
+        jour += timedelta(days=1)
+
+
+def premier_bloc(bits, nombre):
+    """Indice du premier créneau suivi de `nombre` créneaux libres consécutifs, ou None"""
+    bloc = bits
+    for decalage in range(1, nombre):
+        bloc &= bits >> decalage
+    if not bloc:
+        return None
+    return (bloc & -bloc).bit_length() - 1
+
+
+def _tenants_medecins(medecin_ids):
+    from medical.models import Medecin
+
+    return dict(Medecin._base_manager.filter(pk__in=medecin_ids).values_list('pk', 'hopital_id'))
+
+
+def calculer_disponibilites(medecin_ids, dates, remplacer=True):
+    """
+    Recalculer et enregistrer les bitmaps des médecins pour les dates
+    données, en quatre requêtes quel que soit leur nombre. Sans
+    `remplacer`, les journées déjà enregistrées entre-temps sont conservées.
+    Retourne {(medecin_id, date): (ouverts, libres)}.
+    """
+    dates = sorted(set(dates))
+    tenants = _tenants_medecins(set(medecin_ids))
+    if not dates or not tenants:
+        return {}
+    fuseaux = fuseaux_horaires(set(tenants.values()))
+    # Un fuseau décale la journée locale d'au plus un jour par rapport à UTC
+    debut = datetime.combine(dates[0] - timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+    fin = datetime.combine(dates[-1] + timedelta(days=2), time.min, tzinfo=dt_timezone.utc)
+
+    horaires = defaultdict(lambda: defaultdict(list))
+    for medecin_id, jour, heure_debut, heure_fin in HoraireMedecin._base_manager.filter(
+        medecin_id__in=tenants
+    ).values_list('medecin_id', 'jour_semaine', 'heure_debut', 'heure_fin'):
+        horaires[medecin_id][jour].append((heure_debut, heure_fin))
+
+    bloques = defaultdict(int)
+    for medecin_id, absence_debut, absence_fin in AbsenceMedecin._base_manager.filter(
+        medecin_id__in=tenants, debut__lt=fin, fin__gt=debut
+    ).values_list('medecin_id', 'debut', 'fin'):
+        for jour, premiere, derniere in _par_jour(absence_debut, absence_fin, fuseaux[tenants[medecin_id]]):
+            bloques[(medecin_id, jour)] |= _couverture(premiere, derniere)
+
+    annules = set()
+    for tenant_id in set(tenants.values()):
+        annules.update(statuts_annules(tenant_id))
+    duree_max = max(duree_max_rendez_vous(tenant_id) for tenant_id in set(tenants.values()))
+    occupes = defaultdict(int)
+    for medecin_id, date_heure, duree in RendezVous._base_manager.filter(
+        medecin_id__in=tenants,
+        date_heure__gt=debut - timedelta(minutes=duree_max),
+        date_heure__lt=fin,
+    ).exclude(statut_id__in=annules).values_list('medecin_id', 'date_heure', 'type__duree_defaut'):
+        rdv_fin = date_heure + timedelta(minutes=DUREE_PAR_DEFAUT if duree is None else duree)
+        for jour, premiere, derniere in _par_jour(date_heure, rdv_fin, fuseaux[tenants[medecin_id]]):
+            occupes[(medecin_id, jour)] |= _couverture(premiere, derniere)
+
+    resultat, lignes = {}, []
+    for medecin_id, tenant_id in tenants.items():
+        plages = horaires.get(medecin_id) or HORAIRES_PAR_DEFAUT
+        for jour in dates:
+            ouverts = 0
+            for heure_debut, heure_fin in plages.get(jour.weekday(), ()):
+                ouverts |= masque(
+                    math.ceil(_minutes(heure_debut) / GRANULARITE),
+                    math.floor(_minutes(heure_fin) / GRANULARITE)
+                )
+            ouverts &= ~bloques[(medecin_id, jour)]
+            libres = ouverts & ~occupes[(medecin_id, jour)]
+            resultat[(medecin_id, jour)] = (ouverts, libres)
+            lignes.append(DisponibiliteMedecin(
+                tenant_id=tenant_id,
+                medecin_id=medecin_id,
+                date=jour,
+                creneaux_ouverts=encoder(ouverts),
+                creneaux_libres=encoder(libres),
+            ))
+
+    if remplacer:
+        DisponibiliteMedecin._base_manager.bulk_create(
+            lignes,
+            update_conflicts=True,
+            unique_fields=['medecin', 'date'],
+            update_fields=['creneaux_ouverts', 'creneaux_libres', 'updated_at'],
+            batch_size=1000
+        )
+    else:
+        DisponibiliteMedecin._base_manager.bulk_create(lignes, ignore_conflicts=True, batch_size=1000)
+    return resultat
+
+
+def disponibilites(medecin_ids, dates):
+    """
+    Bitmaps {(medecin_id, date): (ouverts, libres)} des médecins pour les
+    dates données ; les journées absentes sont calculées et enregistrées
+    """
+    medecin_ids, dates = set(medecin_ids), set(dates)
+    resultat = {
+        (medecin_id, jour): (decoder(ouverts), decoder(libres))
+        for medecin_id, jour, ouverts, libres in DisponibiliteMedecin._base_manager.filter(
+            medecin_id__in=medecin_ids, date__in=dates
+        ).values_list('medecin_id', 'date', 'creneaux_ouverts', 'creneaux_libres')
+    }
+    manquants = {(medecin_id, jour) for medecin_id in medecin_ids for jour in dates} - resultat.keys()
+    if manquants:
+        # Une réservation validée entre-temps a pu enregistrer la journée : elle prime
+        resultat.update(calculer_disponibilites(
+            {medecin_id for medecin_id, _ in manquants},
+            {jour for _, jour in manquants},
+            remplacer=False
+        ))
+    return resultat
+
+
+def actualiser_disponibilites(medecin_ids, debut=None, fin=None):
+    """
+    Recalculer les journées déjà enregistrées des médecins entre deux
+    dates (à partir d'aujourd'hui par défaut). Les journées non encore
+    enregistrées seront calculées à leur première lecture.
+    """
+    jours = DisponibiliteMedecin._base_manager.filter(
+        medecin_id__in=medecin_ids,
+        date__gte=debut or timezone.localdate()
+    )
+    if fin is not None:
+        jours = jours.filter(date__lte=fin)
+    par_medecin = defaultdict(set)
+    for medecin_id, jour in jours.values_list('medecin_id', 'date'):
+        par_medecin[medecin_id].add(jour)
+    for medecin_id, dates in par_medecin.items():
+        calculer_disponibilites([medecin_id], dates)
+
+
+def actualiser_rendez_vous(medecin_id, creneaux):
+    """
+    Recalculer les journées locales du médecin touchées par des
+    rendez-vous [(début, durée en minutes)], d'hier à HORIZON_JOURS.
+
+    Les journées enregistrées sont verrouillées avant la relecture des
+    rendez-vous : deux réservations concurrentes se succèdent et la
+    seconde voit la première. Les journées absentes sont créées, si bien
+    qu'une lecture concurrente ne peut plus y enregistrer un calcul
+    antérieur à la réservation.
+    """
+    tenants = _tenants_medecins([medecin_id])
+    if not tenants:
+        return
+    fuseau = fuseau_horaire(tenants[medecin_id])
+    aujourd_hui = timezone.now().astimezone(fuseau).date()
+    jours = {
+        jour
+        for debut, duree in creneaux
+        for jour, _, _ in _par_jour(debut, debut + timedelta(minutes=duree), fuseau)
+        if aujourd_hui - timedelta(days=1) <= jour <= aujourd_hui + timedelta(days=HORIZON_JOURS)
+    }
+    if not jours:
+        return
+    with transaction.atomic():
+        list(DisponibiliteMedecin._base_manager.select_for_update().filter(
+            medecin_id=medecin_id, date__in=jours
+        ).values_list('pk', flat=True))
+        calculer_disponibilites([medecin_id], jours)
+
+
+def creneaux_fermes(medecin, creneaux):
+    """
+    Indices des créneaux [(début, durée)] qui sortent des horaires du
+    médecin ou tombent pendant une absence, en une lecture des bitmaps
+    """
+    fuseau = fuseau_horaire(medecin.hopital_id)
+    morceaux = [
+        list(_par_jour(debut, debut + timedelta(minutes=duree), fuseau))
+        for debut, duree in creneaux
+    ]
+    bitmaps = disponibilites(
+        [medecin.pk], {jour for parties in morceaux for jour, _, _ in parties}
+    )
+    fermes = []
+    for indice, parties in enumerate(morceaux):
+        for jour, premiere, derniere in parties:
+            demandes = _couverture(premiere, derniere)
+            if bitmaps[(medecin.pk, jour)][0] & demandes != demandes:
+                fermes.append(indice)
+                break
+    return fermes
+
+
+def est_ouvert(medecin, debut, duree):
+    """Vrai si [debut, debut + duree[ tombe dans les horaires du médecin, hors absences"""
+    return not creneaux_fermes(medecin, [(debut, duree)])
+
+
+def creneaux_du_jour(medecin, jour, duree):
+    """
+    Créneaux de `duree` minutes proposés dans les plages ouvertes du
+    médecin, tous les PAS_CRENEAUX minutes : [(début, fin, disponible)]
+    en minutes depuis minuit, heure locale
+    """
+    nombre = math.ceil(duree / GRANULARITE)
+    pas = math.ceil(PAS_CRENEAUX / GRANULARITE)
+    ouverts, libres = disponibilites([medecin.pk], [jour])[(medecin.pk, jour)]
+
+    creneaux = []
+    indice = 0
+    while indice < CRENEAUX_PAR_JOUR:
+        if not (ouverts >> indice) & 1:
+            indice += 1
+            continue
+        fin_plage = indice
+        while fin_plage < CRENEAUX_PAR_JOUR and (ouverts >> fin_plage) & 1:
+            fin_plage += 1
+        debut = indice
+        while debut + nombre <= fin_plage:
+            demandes = masque(debut, debut + nombre)
+            creneaux.append((
+                debut * GRANULARITE,
+                (debut + nombre) * GRANULARITE,
+                libres & demandes == demandes
+            ))
+            debut += pas
+        indice = fin_plage
+    return creneaux
+
+
+def premier_creneau(medecin_ids, duree, depuis=None, jours=30):
+    """
+    Premier créneau libre de `duree` minutes parmi les médecins, dans les
+    `jours` prochains jours : (medecin_id, début, fin) ou None
+    """
+    depuis = depuis or timezone.now()
+    nombre = math.ceil(duree / GRANULARITE)
+    tenants = _tenants_medecins(set(medecin_ids))
+    if not tenants:
+        return None
+    fuseaux = fuseaux_horaires(set(tenants.values()))
+    aujourd_hui = {
+        medecin_id: depuis.astimezone(fuseaux[tenant_id]).date()
+        for medecin_id, tenant_id in tenants.items()
+    }
+    premier_jour = min(aujourd_hui.values())
+    dates = [premier_jour + timedelta(days=decalage) for decalage in range(jours + 2)]
+
+    meilleur = None
+    for (medecin_id, jour), (_, libres) in disponibilites(tenants, dates).items():
+        fuseau = fuseaux[tenants[medecin_id]]
+        if not aujourd_hui[medecin_id] <= jour <= aujourd_hui[medecin_id] + timedelta(days=jours):
+            continue
+        if jour == aujourd_hui[medecin_id]:
+            # Créneaux déjà commencés exclus
+            libres &= ~masque(0, math.ceil(_minutes(depuis.astimezone(fuseau)) / GRANULARITE))
+        indice = premier_bloc(libres, nombre)
+        if indice is None:
+            continue
+        debut = datetime.combine(jour, time.min, tzinfo=fuseau) + timedelta(minutes=indice * GRANULARITE)
+        if meilleur is None or debut < meilleur[1]:
+            meilleur = (medecin_id, debut, debut + timedelta(minutes=duree))
+    return meilleur
@@ -0,0 +1,35 @@
+# filtres.py
+from datetime import timedelta
+import django_filters
+from django.utils import timezone
+from trimed_backend.filtres import PlageDatesFilterSet, fuseau_requete, plage_journees
+from .models import RendezVous
+
+
+class RendezVousFilterSet(PlageDatesFilterSet):
+    """Filtres de la liste des rendez-vous (journées locales de l'établissement)"""
+    champ_date = 'date_heure'
+
+    aujourdhui = django_filters.BooleanFilter(method='filtrer_aujourdhui')
+    cette_semaine = django_filters.BooleanFilter(method='filtrer_cette_semaine')
+
+    class Meta:
+        model = RendezVous
+        fields = ['patient', 'medecin', 'type', 'statut']
+
+    def _aujourdhui(self):
+        fuseau = fuseau_requete(self.request)
+        return timezone.now().astimezone(fuseau).date(), fuseau
+
+    def filtrer_aujourdhui(self, queryset, name, value):
+        if not value:
+            return queryset
+        jour, fuseau = self._aujourdhui()
+        return queryset.filter(**plage_journees('date_heure', jour, jour, fuseau))
+
+    def filtrer_cette_semaine(self, queryset, name, value):
+        if not value:
+            return queryset
+        jour, fuseau = self._aujourdhui()
+        lundi = jour - timedelta(days=jour.weekday())
+        return queryset.filter(**plage_journees('date_heure', lundi, lundi + timedelta(days=6), fuseau))
@@ -0,0 +1,215 @@
+# liste_attente.py
+"""
+Liste d'attente et réattribution des créneaux libérés.
+
+À l'annulation d'un rendez-vous à venir, le créneau est proposé à
+l'inscription en attente la mieux placée (priorité, puis ancienneté) dont
+le médecin ou la spécialité et la fenêtre souhaitée correspondent. Elle
+est trouvée en une requête sur les index partiels des inscriptions en
+attente. Le patient est notifié et dispose de DELAI_REPONSE pour accepter ;
+un refus ou l'expiration du délai propose le créneau au candidat suivant,
+et ce créneau n'est plus jamais reproposé à l'inscription qui l'a laissé.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from gestion_tenants.services import fuseau_horaire
+from trimed_backend import referentiel, tenancy
+from .models import ListeAttente, RendezVous
+from .services import conflits_creneaux, statuts_annules, verrouiller_medecin
+
+DELAI_REPONSE = timedelta(minutes=30)
+
+
+class ListeAttenteError(Exception):
+    """Proposition de créneau impossible à accepter ou refuser"""
+
+
+def _candidat(rdv):
+    """
+    Inscription en attente la mieux placée pour le créneau du rendez-vous,
+    hors inscriptions qui l'ont déjà refusé ou laissé expirer
+    """
+    fuseau = fuseau_horaire(rdv.tenant_id)
+    debut = rdv.date_heure.astimezone(fuseau)
+    fin = rdv.date_fin.astimezone(fuseau)
+    medecin = Q(medecin_id=rdv.medecin_id)
+    if rdv.medecin.specialite_principale_id:
+        medecin |= Q(medecin__isnull=True, specialite_id=rdv.medecin.specialite_principale_id)
+
+    return ListeAttente._base_manager.filter(
+        medecin,
+        Q(heure_debut__isnull=True) | Q(heure_debut__lte=debut.time()),
+        Q(heure_fin__isnull=True) | Q(heure_fin__gte=fin.time()),
+        tenant_id=rdv.tenant_id,
+        statut=ListeAttente.Statut.EN_ATTENTE,
+        date_debut__lte=debut.date(),
+        date_fin__gte=debut.date(),
+    ).exclude(
+        patient_id=rdv.patient_id
+    ).exclude(
+        creneaux_refuses=rdv
+    ).select_related('patient').select_for_update(
+        of=('self',), skip_locked=True
+    ).order_by('-priorite', 'created_at').first()
+
+
+def _notifier(inscription, rdv):
+    from notifications.models import Notification
+    from notifications.services import creer_notifications
+
+    if inscription.patient.utilisateur_id is None:
+        return
+    fuseau = fuseau_horaire(rdv.tenant_id)
+    creer_notifications('rdv_confirmation', 'Proposition rendez-vous', [Notification(
+        tenant_id=rdv.tenant_id,
+        utilisateur_id=inscription.patient.utilisateur_id,
+        titre='Un créneau s\'est libéré',
+        message=(
+            f"Un rendez-vous est disponible le "
+            f"{rdv.date_heure.astimezone(fuseau).strftime('%d/%m/%Y à %H:%M')}. "
+            f"Acceptez-le dans les {int(DELAI_REPONSE.total_seconds() // 60)} minutes."
+        ),
+        priorite=Notification.Priorite.ELEVEE,
+        cible_type='liste_attente',
+        cible_id=inscription.pk,
+        donnees={
+            'date_heure': rdv.date_heure.isoformat(),
+            'medecin_id': rdv.medecin_id,
+            'expire_le': (inscription.date_proposition + DELAI_REPONSE).isoformat(),
+        },
+    )])
+
+
+def proposer_creneau(rdv):
+    """
+    Proposer le créneau du rendez-vous annulé (medecin et type chargés) au
+    meilleur candidat. Retourne l'inscription retenue, ou None.
+    """
+    if rdv.date_heure <= timezone.now():
+        return None
+    with transaction.atomic():
+        inscription = _candidat(rdv)
+        if inscription is None:
+            return None
+        inscription.statut = ListeAttente.Statut.PROPOSEE
+        inscription.rendez_vous_libere = rdv
+        inscription.date_proposition = timezone.now()
+        inscription.save(update_fields=['statut', 'rendez_vous_libere', 'date_proposition', 'updated_at'])
+        _notifier(inscription, rdv)
+    return inscription
+
+
+def proposer_creneaux(rendez_vous_ids):
+    """Proposer les créneaux à venir des rendez-vous annulés ; retourne les inscriptions retenues"""
+    retenues = []
+    for rdv in RendezVous._base_manager.filter(
+        pk__in=rendez_vous_ids, date_heure__gt=timezone.now()
+    ).select_related('medecin', 'type').order_by('date_heure'):
+        inscription = proposer_creneau(rdv)
+        if inscription is not None:
+            retenues.append(inscription)
+    return retenues
+
+
+def _remettre_en_attente(inscription):
+    inscription.statut = ListeAttente.Statut.EN_ATTENTE
+    inscription.rendez_vous_libere = None
+    inscription.date_proposition = None
+    inscription.save(update_fields=['statut', 'rendez_vous_libere', 'date_proposition', 'updated_at'])
+
+
+def _verrouiller(inscription):
+    inscription = ListeAttente._base_manager.select_for_update().get(pk=inscription.pk)
+    if (
+        inscription.statut != ListeAttente.Statut.PROPOSEE
+        or inscription.date_proposition + DELAI_REPONSE < timezone.now()
+    ):
+        raise ListeAttenteError('Aucune proposition de créneau en cours')
+    return inscription
+
+
+def accepter_proposition(inscription):
+    """Réserver le créneau proposé à l'inscription ; retourne le rendez-vous créé"""
+    erreur = None
+    with transaction.atomic():
+        inscription = _verrouiller(inscription)
+        libere = RendezVous._base_manager.select_related('medecin', 'type').select_for_update(
+            of=('self',)
+        ).filter(
+            pk=inscription.rendez_vous_libere_id
+        ).first()
+        if libere is not None:
+            verrouiller_medecin(libere.medecin)
+        # Un rendez-vous rétabli depuis la proposition occupe toujours son créneau
+        if libere is None or libere.statut_id not in statuts_annules(libere.tenant_id) or conflits_creneaux(
+            libere.medecin, [(libere.date_heure, libere.date_fin)], exclure=[libere.pk]
+        ):
+            _remettre_en_attente(inscription)
+            erreur = 'Le créneau n\'est plus disponible'
+        else:
+            rdv = RendezVous._base_manager.create(
+                tenant_id=inscription.tenant_id,
+                patient_id=inscription.patient_id,
+                medecin_id=libere.medecin_id,
+                type_id=libere.type_id,
+                statut=referentiel.statut_rendez_vous(inscription.tenant_id, 'Planifié'),
+                date_heure=libere.date_heure,
+                motif=inscription.motif or libere.motif,
+            )
+            inscription.statut = ListeAttente.Statut.ACCEPTEE
+            inscription.rendez_vous = rdv
+            inscription.save(update_fields=['statut', 'rendez_vous', 'updated_at'])
+    if erreur:
+        raise ListeAttenteError(erreur)
+    return rdv
+
+
+def refuser_proposition(inscription):
+    """
+    Remettre l'inscription en attente, écarter le créneau pour elle et le
+    proposer au candidat suivant
+    """
+    with transaction.atomic():
+        inscription = _verrouiller(inscription)
+        libere_id = inscription.rendez_vous_libere_id
+        if libere_id is not None:
+            inscription.creneaux_refuses.add(libere_id)
+        _remettre_en_attente(inscription)
+        proposer_creneaux([libere_id])
+    return inscription
+
+
+def expirer_propositions(tenant_ids=None):
+    """
+    Remettre en attente les propositions restées sans réponse et proposer
+    leurs créneaux aux candidats suivants, tenant par tenant (tous par
+    défaut) ; retourne le nombre d'expirées
+    """
+    return sum(_expirer_propositions(tenant_id) for tenant_id in tenancy.par_tenant(tenant_ids))
+
+
+def _expirer_propositions(tenant_id):
+    with transaction.atomic():
+        expirees = dict(
+            ListeAttente._base_manager.select_for_update().filter(
+                tenant_id=tenant_id,
+                statut=ListeAttente.Statut.PROPOSEE,
+                date_proposition__lt=timezone.now() - DELAI_REPONSE
+            ).values_list('pk', 'rendez_vous_libere_id')
+        )
+        if not expirees:
+            return 0
+        ListeAttente.creneaux_refuses.through.objects.bulk_create([
+            ListeAttente.creneaux_refuses.through(liste_attente_id=pk, rendezvous_id=rdv_id)
+            for pk, rdv_id in expirees.items() if rdv_id is not None
+        ], ignore_conflicts=True)
+        ListeAttente._base_manager.filter(pk__in=expirees).update(
+            statut=ListeAttente.Statut.EN_ATTENTE,
+            rendez_vous_libere=None,
+            date_proposition=None,
+            updated_at=timezone.now()
+        )
+        proposer_creneaux(set(expirees.values()) - {None})
+    return len(expirees)
@@ -0,0 +1,48 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from medical.models import Medecin
+from rendez_vous.disponibilites import HORIZON_JOURS, calculer_disponibilites
+from rendez_vous.models import DisponibiliteMedecin
+from trimed_backend import tenancy
+
+MEDECINS_PAR_LOT = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Purge les disponibilités passées et calcule celles des médecins "
+        "sur l'horizon de réservation (à planifier chaque nuit)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jours',
+            type=int,
+            default=HORIZON_JOURS,
+            help=f'Nombre de jours calculés à partir de la veille ({HORIZON_JOURS} par défaut)'
+        )
+        parser.add_argument('--tenant', type=int, help='Limiter le calcul à un établissement')
+
+    def handle(self, *args, **options):
+        # La veille reste calculée : selon le fuseau, la journée locale peut y être encore
+        debut = timezone.localdate() - timedelta(days=1)
+        dates = [debut + timedelta(days=decalage) for decalage in range(options['jours'] + 1)]
+
+        calcules = purgees = 0
+        for tenant_id in tenancy.par_tenant([options['tenant']] if options['tenant'] else None):
+            supprimees, _ = DisponibiliteMedecin._base_manager.filter(
+                tenant_id=tenant_id, date__lt=debut
+            ).delete()
+            purgees += supprimees
+
+            medecins = list(
+                Medecin._base_manager.filter(hopital_id=tenant_id).order_by('pk').values_list('pk', flat=True)
+            )
+            for indice in range(0, len(medecins), MEDECINS_PAR_LOT):
+                calculer_disponibilites(medecins[indice:indice + MEDECINS_PAR_LOT], dates)
+            calcules += len(medecins)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{calcules} médecin(s) calculé(s) sur {len(dates)} jours, {purgees} journée(s) purgée(s)'
+        ))
@@ -0,0 +1,45 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from rendez_vous.cloture import cloturer_journees, recalculer_taux_absence
+from trimed_backend import tenancy
+
+
+class Command(BaseCommand):
+    help = (
+        "Clôt les rendez-vous des journées passées (terminé si une consultation "
+        "est liée, absent sinon) et recalcule les taux d'absence (à planifier chaque nuit)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Limiter la clôture à un tenant')
+        parser.add_argument(
+            '--date',
+            help="Clore les rendez-vous antérieurs à cette date locale (YYYY-MM-DD, aujourd'hui par défaut)"
+        )
+        parser.add_argument(
+            '--recalculer-taux',
+            action='store_true',
+            help="Recalculer ensuite les taux d'absence de tous les médecins et patients"
+        )
+
+    def handle(self, *args, **options):
+        date_reference = None
+        if options['date']:
+            try:
+                date_reference = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide (YYYY-MM-DD)')
+
+        tenant_ids = [options['tenant']] if options['tenant'] else None
+        resultats = cloturer_journees(tenant_ids, date_reference)
+
+        if options['recalculer_taux']:
+            for tenant_id in tenancy.par_tenant(tenant_ids):
+                recalculer_taux_absence(tenant_id)
+
+        termines = sum(nombre for nombre, _ in resultats.values())
+        absents = sum(nombre for _, nombre in resultats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{termines} rendez-vous terminé(s), {absents} absence(s) "
+            f"dans {len(resultats)} établissement(s)"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from rendez_vous.liste_attente import expirer_propositions
+
+
+class Command(BaseCommand):
+    help = (
+        "Remet en attente les créneaux proposés restés sans réponse et les "
+        "propose aux candidats suivants (à planifier toutes les quelques minutes)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help="Limiter l'expiration à un tenant")
+
+    def handle(self, *args, **options):
+        nombre = expirer_propositions([options['tenant']] if options['tenant'] else None)
+        self.stdout.write(self.style.SUCCESS(f"{nombre} proposition(s) expirée(s)"))
@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from medical.models import Medecin
+from patients.models import Patient
+from rendez_vous.models import RendezVous
+from rendez_vous.services import conflits_rendez_vous, duree_max_rendez_vous
+from trimed_backend import referentiel, tenancy
+
+RENDEZ_VOUS_PAR_JOUR = 16
+
+
+class _Annulation(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le coût de la recherche de conflits de rendez-vous selon la "
+        "profondeur de l'historique du médecin (données fictives, annulées en fin de mesure)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Établissement du médecin (le premier qui en a un par défaut)')
+        parser.add_argument('--medecin', type=int, help='Médecin utilisé (le premier par défaut)')
+        parser.add_argument(
+            '--annees',
+            type=int,
+            nargs='+',
+            default=[0, 1, 3, 5],
+            help="Profondeurs d'historique mesurées, en années (0 1 3 5 par défaut)"
+        )
+        parser.add_argument(
+            '--repetitions',
+            type=int,
+            default=200,
+            help='Nombre de vérifications chronométrées par palier (200 par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        # Médecin cherché tenant par tenant : ses tables peuvent être dans un schéma dédié
+        for _ in tenancy.par_tenant([options['tenant']] if options['tenant'] else None):
+            medecins = Medecin.objects.all()
+            if options['medecin']:
+                medecins = medecins.filter(pk=options['medecin'])
+            medecin = medecins.first()
+            if medecin is None:
+                continue
+            patient = Patient.objects.first()
+            if patient is None:
+                raise CommandError("Aucun patient dans l'établissement du médecin")
+
+            try:
+                with transaction.atomic():
+                    self.mesurer(medecin, patient, sorted(set(options['annees'])), options['repetitions'])
+                    raise _Annulation()
+            except _Annulation:
+                pass
+            return
+        raise CommandError('Aucun médecin disponible')
+
+    def mesurer(self, medecin, patient, paliers, repetitions):
+        statut = referentiel.statut_rendez_vous(medecin.hopital_id, 'Planifié')
+        maintenant = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        debut = maintenant + timedelta(days=1)
+        fin = debut + timedelta(minutes=30)
+
+        # "fenêtre" : lignes lues par la recherche bornée ; "historique" :
+        # lignes que chargeait l'ancienne recherche sans borne inférieure
+        self.stdout.write(f"{'Historique':>12} {'historique':>11} {'fenêtre':>8} "
+                          f"{'requêtes':>9} {'ms/vérif.':>10}")
+        jours_crees = 0
+        for annees in paliers:
+            jours = annees * 365
+            lot = [
+                RendezVous(
+                    tenant_id=medecin.hopital_id, patient=patient, medecin=medecin, statut=statut,
+                    date_heure=maintenant - timedelta(days=jour, minutes=30 * creneau),
+                )
+                for jour in range(jours_crees + 1, jours + 1)
+                for creneau in range(RENDEZ_VOUS_PAR_JOUR)
+            ]
+            RendezVous.objects.bulk_create(lot, batch_size=5000)
+            del lot
+            jours_crees = max(jours, jours_crees)
+
+            with CaptureQueriesContext(connection) as requetes:
+                conflits_rendez_vous(medecin, debut, fin)
+            lignes = RendezVous.objects.filter(
+                medecin=medecin,
+                date_heure__gt=debut - timedelta(minutes=duree_max_rendez_vous(medecin.hopital_id)),
+                date_heure__lt=fin
+            ).count()
+            ancien = RendezVous.objects.filter(medecin=medecin, date_heure__lt=fin).count()
+
+            depart = time.perf_counter()
+            for _ in range(repetitions):
+                conflits_rendez_vous(medecin, debut, fin)
+            duree = (time.perf_counter() - depart) * 1000 / repetitions
+
+            self.stdout.write(
+                f"{f'{annees} an(s)':>12} {ancien:>11} {lignes:>8} "
+                f"{len(requetes):>9} {duree:>10.3f}"
+            )
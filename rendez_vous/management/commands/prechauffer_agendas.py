@@ -0,0 +1,37 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from rendez_vous.agenda import journee, prechauffer_agendas
+from trimed_backend import referentiel, tenancy
+
+
+class Command(BaseCommand):
+    help = (
+        "Construit en cache les agendas journaliers de tous les médecins "
+        "(à planifier chaque nuit pour le lendemain)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Limiter le préchauffage à un tenant')
+        parser.add_argument(
+            '--date',
+            help='Journée locale à préchauffer (YYYY-MM-DD, demain par défaut)'
+        )
+
+    def handle(self, *args, **options):
+        if not referentiel.cache_partage():
+            # Les agendas resteraient dans le cache mémoire de cette commande
+            raise CommandError('Un cache partagé est requis (CACHE_URL) pour préchauffer les agendas')
+
+        jour = None
+        if options['date']:
+            try:
+                jour = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format de date invalide (YYYY-MM-DD)')
+
+        tenant_ids = [options['tenant']] if options['tenant'] else None
+        total = 0
+        for tenant_id in tenancy.par_tenant(tenant_ids):
+            total += prechauffer_agendas(tenant_id, jour or journee(tenant_id, decalage=1))
+
+        self.stdout.write(self.style.SUCCESS(f"{total} agenda(s) préchauffé(s)"))
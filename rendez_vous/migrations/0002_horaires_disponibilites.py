@@ -0,0 +1,82 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        ('medical', '0003_taille_fichier_resultat'),
+        ('rendez_vous', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AbsenceMedecin',
+            fields=[
+                ('absence_id', models.AutoField(primary_key=True, serialize=False)),
+                ('debut', models.DateTimeField()),
+                ('fin', models.DateTimeField()),
+                ('motif', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medecin', models.ForeignKey(db_column='medecin_id', on_delete=django.db.models.deletion.CASCADE, related_name='absences', to='medical.medecin')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Absence de médecin',
+                'verbose_name_plural': 'Absences de médecins',
+                'db_table': 'absence_medecin',
+                'ordering': ['medecin', 'debut'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HoraireMedecin',
+            fields=[
+                ('horaire_id', models.AutoField(primary_key=True, serialize=False)),
+                ('jour_semaine', models.IntegerField(choices=[(0, 'Lundi'), (1, 'Mardi'), (2, 'Mercredi'), (3, 'Jeudi'), (4, 'Vendredi'), (5, 'Samedi'), (6, 'Dimanche')])),
+                ('heure_debut', models.TimeField()),
+                ('heure_fin', models.TimeField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medecin', models.ForeignKey(db_column='medecin_id', on_delete=django.db.models.deletion.CASCADE, related_name='horaires', to='medical.medecin')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Horaire de médecin',
+                'verbose_name_plural': 'Horaires de médecins',
+                'db_table': 'horaire_medecin',
+                'ordering': ['medecin', 'jour_semaine', 'heure_debut'],
+                'indexes': [models.Index(fields=['medecin', 'jour_semaine'], name='horaire_med_medecin_6ca14b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DisponibiliteMedecin',
+            fields=[
+                ('disponibilite_id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('creneaux_ouverts', models.BinaryField()),
+                ('creneaux_libres', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medecin', models.ForeignKey(db_column='medecin_id', on_delete=django.db.models.deletion.CASCADE, related_name='disponibilites', to='medical.medecin')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': 'Disponibilité de médecin',
+                'verbose_name_plural': 'Disponibilités de médecins',
+                'db_table': 'disponibilite_medecin',
+                'indexes': [models.Index(fields=['tenant', 'date'], name='disponibili_tenant__1de8bb_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='disponibilitemedecin',
+            constraint=models.UniqueConstraint(fields=('medecin', 'date'), name='unique_disponibilite_medecin_date'),
+        ),
+        migrations.AddIndex(
+            model_name='absencemedecin',
+            index=models.Index(fields=['medecin', 'debut'], name='absence_med_medecin_eba8c3_idx'),
+        ),
+    ]
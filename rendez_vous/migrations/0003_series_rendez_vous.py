@@ -0,0 +1,50 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:24
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0001_initial'),
+        ('medical', '0003_taille_fichier_resultat'),
+        ('gestion_tenants', '0001_initial'),
+        ('rendez_vous', '0002_horaires_disponibilites'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieRendezVous',
+            fields=[
+                ('serie_id', models.AutoField(primary_key=True, serialize=False)),
+                ('date_debut', models.DateTimeField()),
+                ('frequence', models.CharField(choices=[('quotidienne', 'Quotidienne'), ('hebdomadaire', 'Hebdomadaire'), ('mensuelle', 'Mensuelle')], max_length=20)),
+                ('intervalle', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('jours_semaine', models.JSONField(blank=True, null=True)),
+                ('nombre_occurrences', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('date_fin', models.DateField(blank=True, null=True)),
+                ('motif', models.CharField(blank=True, max_length=255, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medecin', models.ForeignKey(db_column='medecin_id', on_delete=django.db.models.deletion.CASCADE, to='medical.medecin')),
+                ('patient', models.ForeignKey(db_column='patient_id', on_delete=django.db.models.deletion.CASCADE, to='patients.patient')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+                ('type', models.ForeignKey(blank=True, db_column='type_id', null=True, on_delete=django.db.models.deletion.SET_NULL, to='rendez_vous.rendezvoustype')),
+            ],
+            options={
+                'verbose_name': 'Série de rendez-vous',
+                'verbose_name_plural': 'Séries de rendez-vous',
+                'db_table': 'serie_rendez_vous',
+                'ordering': ['-date_debut'],
+            },
+        ),
+        migrations.AddField(
+            model_name='rendezvous',
+            name='serie',
+            field=models.ForeignKey(blank=True, db_column='serie_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rendez_vous', to='rendez_vous.serierendezvous'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        ('patients', '0001_initial'),
+        ('medical', '0003_taille_fichier_resultat'),
+        ('rendez_vous', '0003_series_rendez_vous'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rendezvousstatut',
+            name='est_absence',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='TauxAbsencePatient',
+            fields=[
+                ('patient', models.OneToOneField(db_column='patient_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='taux_absence', serialize=False, to='patients.patient')),
+                ('rendez_vous_clos', models.IntegerField(default=0)),
+                ('absences', models.IntegerField(default=0)),
+                ('taux', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('derniere_absence', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': "Taux d'absence par patient",
+                'verbose_name_plural': "Taux d'absence par patient",
+                'db_table': 'taux_absence_patient',
+                'indexes': [models.Index(fields=['tenant', '-taux'], name='taux_absenc_tenant__aa4cdf_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TauxAbsenceMedecin',
+            fields=[
+                ('medecin', models.OneToOneField(db_column='medecin_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='taux_absence', serialize=False, to='medical.medecin')),
+                ('rendez_vous_clos', models.IntegerField(default=0)),
+                ('absences', models.IntegerField(default=0)),
+                ('taux', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': "Taux d'absence par médecin",
+                'verbose_name_plural': "Taux d'absence par médecin",
+                'db_table': 'taux_absence_medecin',
+                'indexes': [models.Index(fields=['tenant', '-taux'], name='taux_absenc_tenant__9acb08_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical', '0003_taille_fichier_resultat'),
+        ('gestion_tenants', '0001_initial'),
+        ('patients', '0001_initial'),
+        ('rendez_vous', '0004_cloture_taux_absence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListeAttente',
+            fields=[
+                ('liste_attente_id', models.AutoField(primary_key=True, serialize=False)),
+                ('date_debut', models.DateField()),
+                ('date_fin', models.DateField()),
+                ('heure_debut', models.TimeField(blank=True, null=True)),
+                ('heure_fin', models.TimeField(blank=True, null=True)),
+                ('priorite', models.PositiveSmallIntegerField(default=0)),
+                ('motif', models.CharField(blank=True, max_length=255, null=True)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('proposee', 'Créneau proposé'), ('acceptee', 'Créneau accepté'), ('annulee', 'Annulée')], default='en_attente', max_length=20)),
+                ('date_proposition', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medecin', models.ForeignKey(blank=True, db_column='medecin_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='listes_attente', to='medical.medecin')),
+                ('patient', models.ForeignKey(db_column='patient_id', on_delete=django.db.models.deletion.CASCADE, related_name='listes_attente', to='patients.patient')),
+                ('rendez_vous', models.ForeignKey(blank=True, db_column='rendez_vous_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rendez_vous.rendezvous')),
+                ('rendez_vous_libere', models.ForeignKey(blank=True, db_column='rendez_vous_libere_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rendez_vous.rendezvous')),
+                ('specialite', models.ForeignKey(blank=True, db_column='specialite_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='medical.specialite')),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+            ],
+            options={
+                'verbose_name': "Inscription en liste d'attente",
+                'verbose_name_plural': "Liste d'attente",
+                'db_table': 'liste_attente',
+                'ordering': ['-priorite', 'created_at'],
+                'indexes': [models.Index(condition=models.Q(('statut', 'en_attente')), fields=['tenant', 'medecin', 'date_debut'], name='liste_attente_medecin_idx'), models.Index(condition=models.Q(('medecin__isnull', True), ('statut', 'en_attente')), fields=['tenant', 'specialite', 'date_debut'], name='liste_attente_specialite_idx'), models.Index(fields=['statut', 'date_proposition'], name='liste_atten_statut_602e26_idx')],
+            },
+        ),
+    ]
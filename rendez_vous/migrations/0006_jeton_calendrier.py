@@ -0,0 +1,35 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_tenants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rendez_vous', '0005_liste_attente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JetonCalendrier',
+            fields=[
+                ('jeton_id', models.AutoField(primary_key=True, serialize=False)),
+                ('jeton', models.CharField(max_length=64, unique=True)),
+                ('cible', models.CharField(choices=[('medecin', 'Médecin'), ('patient', 'Patient')], max_length=20)),
+                ('cible_id', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tenant', models.ForeignKey(db_column='tenant_id', on_delete=django.db.models.deletion.CASCADE, to='gestion_tenants.tenant')),
+                ('utilisateur', models.OneToOneField(db_column='utilisateur_id', on_delete=django.db.models.deletion.CASCADE, related_name='jeton_calendrier', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Jeton de calendrier',
+                'verbose_name_plural': 'Jetons de calendrier',
+                'db_table': 'jeton_calendrier',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-19 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rendez_vous', '0006_jeton_calendrier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listeattente',
+            name='creneaux_refuses',
+            field=models.ManyToManyField(blank=True, db_table='liste_attente_creneau_refuse', related_name='+', to='rendez_vous.rendezvous'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 from django.core.validators import MinValueValidator
+from trimed_backend.tenancy import TenantManager
 
 class RendezVousType(models.Model):
     """TABLE RendezVousType"""
@@ -21,6 +22,8 @@ class RendezVousType(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return self.nom
     
@@ -58,10 +61,13 @@ class RendezVousStatut(models.Model):
     est_annule = models.BooleanField(default=False)
     est_confirme = models.BooleanField(default=False)
     est_termine = models.BooleanField(default=False)
+    est_absence = models.BooleanField(default=False)  # patient non venu
     
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return self.nom
     
@@ -71,6 +77,98 @@ class RendezVousStatut(models.Model):
         verbose_name_plural = 'Statuts de rendez-vous'
         unique_together = ['tenant', 'nom']
 
+# Durée (minutes) d'un rendez-vous sans type
+DUREE_PAR_DEFAUT = 30
+
+# Colonnes qui définissent le créneau occupé par un rendez-vous
+CHAMPS_CRENEAU = ('medecin_id', 'date_heure', 'type_id', 'statut_id')
+
+# Valeurs utilisées lors de la création automatique des statuts d'un tenant
+STATUTS_PAR_DEFAUT = {
+    'Planifié': {
+        'description': 'Rendez-vous planifié',
+        'couleur': RendezVousStatut.CouleurStatut.INFO,
+    },
+    'Confirmé': {
+        'description': 'Rendez-vous confirmé',
+        'couleur': RendezVousStatut.CouleurStatut.SUCCESS,
+        'est_confirme': True,
+    },
+    'Annulé': {
+        'description': 'Rendez-vous annulé',
+        'couleur': RendezVousStatut.CouleurStatut.DANGER,
+        'est_annule': True,
+    },
+    'Terminé': {
+        'description': 'Rendez-vous honoré (consultation enregistrée)',
+        'couleur': RendezVousStatut.CouleurStatut.SECONDARY,
+        'est_termine': True,
+    },
+    'Absent': {
+        'description': 'Patient non venu',
+        'couleur': RendezVousStatut.CouleurStatut.WARNING,
+        'est_absence': True,
+    },
+}
+
+class SerieRendezVous(models.Model):
+    """TABLE SerieRendezVous - Rendez-vous récurrents (dialyse, kinésithérapie...)"""
+    
+    class Frequence(models.TextChoices):
+        QUOTIDIENNE = 'quotidienne', 'Quotidienne'
+        HEBDOMADAIRE = 'hebdomadaire', 'Hebdomadaire'
+        MENSUELLE = 'mensuelle', 'Mensuelle'
+    
+    serie_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.CASCADE,
+        db_column='patient_id'
+    )
+    medecin = models.ForeignKey(
+        'medical.Medecin',
+        on_delete=models.CASCADE,
+        db_column='medecin_id'
+    )
+    type = models.ForeignKey(
+        RendezVousType,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_column='type_id'
+    )
+    
+    # Règle de récurrence : première occurrence, puis toutes les
+    # `intervalle` périodes, à la même heure locale
+    date_debut = models.DateTimeField()
+    frequence = models.CharField(max_length=20, choices=Frequence.choices)
+    intervalle = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    jours_semaine = models.JSONField(null=True, blank=True)  # hebdomadaire : [0..6], lundi = 0
+    nombre_occurrences = models.PositiveSmallIntegerField(null=True, blank=True)
+    date_fin = models.DateField(null=True, blank=True)
+    
+    motif = models.CharField(max_length=255, null=True, blank=True)
+    notes = models.TextField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"Série {self.patient} - {self.get_frequence_display()} depuis {self.date_debut}"
+    
+    class Meta:
+        db_table = 'serie_rendez_vous'
+        verbose_name = 'Série de rendez-vous'
+        verbose_name_plural = 'Séries de rendez-vous'
+        ordering = ['-date_debut']
+
 class RendezVous(models.Model):
     """TABLE RendezVous"""
     
@@ -106,6 +204,15 @@ class RendezVous(models.Model):
         db_column='statut_id'
     )
     
+    serie = models.ForeignKey(
+        SerieRendezVous,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='rendez_vous',
+        db_column='serie_id'
+    )
+    
     motif = models.CharField(max_length=255, null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
     raison_annulation = models.TextField(null=True, blank=True)
@@ -117,6 +224,8 @@ class RendezVous(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TenantManager()
+    
     def __str__(self):
         return f"RDV {self.patient} - {self.date_heure}"
     
@@ -125,7 +234,7 @@ class RendezVous(models.Model):
         """Durée du rendez-vous"""
         if self.type:
             return self.type.duree_defaut
-        return 30  # Durée par défaut de 30 minutes
+        return DUREE_PAR_DEFAUT
     
     @property
     def date_fin(self):
@@ -147,17 +256,22 @@ class RendezVous(models.Model):
         """Vérifie si le rendez-vous est aujourd'hui"""
         return self.date_heure.date() == timezone.now().date()
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Créneau chargé, comparé au créneau enregistré par les signaux des disponibilités
+        valeurs = instance.__dict__
+        if all(champ in valeurs for champ in CHAMPS_CRENEAU):
+            instance._creneau_charge = tuple(valeurs[champ] for champ in CHAMPS_CRENEAU)
+        return instance
+    
     def verifier_disponibilite(self):
         """Vérifie si le créneau est disponible"""
-        conflits = RendezVous.objects.filter(
-            tenant=self.tenant,
-            medecin=self.medecin,
-            statut__est_annule=False,
-            date_heure__lt=self.date_fin,
-            date_fin__gt=self.date_heure
-        ).exclude(pk=self.pk if self.pk else None)
+        from .services import conflits_rendez_vous
         
-        return not conflits.exists()
+        return not conflits_rendez_vous(
+            self.medecin, self.date_heure, self.date_fin, exclure=self.pk
+        )
     
     class Meta:
         db_table = 'rendez_vous'
@@ -168,4 +282,351 @@ class RendezVous(models.Model):
             models.Index(fields=['tenant', 'medecin', 'date_heure']),
             models.Index(fields=['patient', 'date_heure']),
             models.Index(fields=['statut', 'date_heure']),
-        ]
\ No newline at end of file
+        ]
+
+class HoraireMedecin(models.Model):
+    """TABLE HoraireMedecin - Plage de consultation hebdomadaire d'un médecin"""
+    
+    class JourSemaine(models.IntegerChoices):
+        LUNDI = 0, 'Lundi'
+        MARDI = 1, 'Mardi'
+        MERCREDI = 2, 'Mercredi'
+        JEUDI = 3, 'Jeudi'
+        VENDREDI = 4, 'Vendredi'
+        SAMEDI = 5, 'Samedi'
+        DIMANCHE = 6, 'Dimanche'
+    
+    horaire_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    medecin = models.ForeignKey(
+        'medical.Medecin',
+        on_delete=models.CASCADE,
+        related_name='horaires',
+        db_column='medecin_id'
+    )
+    
+    jour_semaine = models.IntegerField(choices=JourSemaine.choices)
+    heure_debut = models.TimeField()  # heure locale de l'établissement
+    heure_fin = models.TimeField()
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"{self.medecin} - {self.get_jour_semaine_display()} {self.heure_debut}-{self.heure_fin}"
+    
+    class Meta:
+        db_table = 'horaire_medecin'
+        verbose_name = 'Horaire de médecin'
+        verbose_name_plural = 'Horaires de médecins'
+        ordering = ['medecin', 'jour_semaine', 'heure_debut']
+        indexes = [
+            models.Index(fields=['medecin', 'jour_semaine']),
+        ]
+
+class AbsenceMedecin(models.Model):
+    """TABLE AbsenceMedecin - Congés, formations, indisponibilités"""
+    
+    absence_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    medecin = models.ForeignKey(
+        'medical.Medecin',
+        on_delete=models.CASCADE,
+        related_name='absences',
+        db_column='medecin_id'
+    )
+    
+    debut = models.DateTimeField()
+    fin = models.DateTimeField()
+    motif = models.CharField(max_length=255, null=True, blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"{self.medecin} absent du {self.debut} au {self.fin}"
+    
+    class Meta:
+        db_table = 'absence_medecin'
+        verbose_name = 'Absence de médecin'
+        verbose_name_plural = 'Absences de médecins'
+        ordering = ['medecin', 'debut']
+        indexes = [
+            models.Index(fields=['medecin', 'debut']),
+        ]
+
+class DisponibiliteMedecin(models.Model):
+    """
+    TABLE DisponibiliteMedecin - Créneaux de 5 minutes d'un médecin pour
+    une journée locale, en bitmaps (bit i = créneau commençant à i*5 min)
+    """
+    
+    disponibilite_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    medecin = models.ForeignKey(
+        'medical.Medecin',
+        on_delete=models.CASCADE,
+        related_name='disponibilites',
+        db_column='medecin_id'
+    )
+    
+    date = models.DateField()
+    # Créneaux dans les horaires du médecin, hors absences
+    creneaux_ouverts = models.BinaryField()
+    # Créneaux ouverts non occupés par un rendez-vous
+    creneaux_libres = models.BinaryField()
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"Disponibilités {self.medecin} - {self.date}"
+    
+    class Meta:
+        db_table = 'disponibilite_medecin'
+        verbose_name = 'Disponibilité de médecin'
+        verbose_name_plural = 'Disponibilités de médecins'
+        constraints = [
+            models.UniqueConstraint(fields=['medecin', 'date'], name='unique_disponibilite_medecin_date'),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'date']),
+        ]
+
+
+class TauxAbsenceMedecin(models.Model):
+    """
+    TABLE TauxAbsenceMedecin - Rendez-vous clos et absences des patients
+    d'un médecin, recalculés à la clôture des journées
+    """
+    
+    medecin = models.OneToOneField(
+        'medical.Medecin',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='taux_absence',
+        db_column='medecin_id'
+    )
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    
+    rendez_vous_clos = models.IntegerField(default=0)  # honorés + absences
+    absences = models.IntegerField(default=0)
+    taux = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # en %
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"Absences {self.medecin} : {self.taux}%"
+    
+    class Meta:
+        db_table = 'taux_absence_medecin'
+        verbose_name = "Taux d'absence par médecin"
+        verbose_name_plural = "Taux d'absence par médecin"
+        indexes = [
+            models.Index(fields=['tenant', '-taux']),
+        ]
+
+class TauxAbsencePatient(models.Model):
+    """
+    TABLE TauxAbsencePatient - Rendez-vous clos et absences d'un patient,
+    recalculés à la clôture des journées
+    """
+    
+    patient = models.OneToOneField(
+        'patients.Patient',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='taux_absence',
+        db_column='patient_id'
+    )
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    
+    rendez_vous_clos = models.IntegerField(default=0)
+    absences = models.IntegerField(default=0)
+    taux = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    derniere_absence = models.DateTimeField(null=True, blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"Absences {self.patient} : {self.taux}%"
+    
+    class Meta:
+        db_table = 'taux_absence_patient'
+        verbose_name = "Taux d'absence par patient"
+        verbose_name_plural = "Taux d'absence par patient"
+        indexes = [
+            models.Index(fields=['tenant', '-taux']),
+        ]
+
+class ListeAttente(models.Model):
+    """
+    TABLE ListeAttente - Patient en attente d'un créneau chez un médecin ou
+    dans une spécialité, proposé automatiquement à chaque annulation
+    """
+    
+    class Statut(models.TextChoices):
+        EN_ATTENTE = 'en_attente', 'En attente'
+        PROPOSEE = 'proposee', 'Créneau proposé'
+        ACCEPTEE = 'acceptee', 'Créneau accepté'
+        ANNULEE = 'annulee', 'Annulée'
+    
+    liste_attente_id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    patient = models.ForeignKey(
+        'patients.Patient',
+        on_delete=models.CASCADE,
+        related_name='listes_attente',
+        db_column='patient_id'
+    )
+    # Un médecin précis, ou à défaut n'importe quel médecin de la spécialité
+    medecin = models.ForeignKey(
+        'medical.Medecin',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='listes_attente',
+        db_column='medecin_id'
+    )
+    specialite = models.ForeignKey(
+        'medical.Specialite',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_column='specialite_id'
+    )
+    
+    # Fenêtre souhaitée : journées locales, et heures locales facultatives
+    date_debut = models.DateField()
+    date_fin = models.DateField()
+    heure_debut = models.TimeField(null=True, blank=True)
+    heure_fin = models.TimeField(null=True, blank=True)
+    priorite = models.PositiveSmallIntegerField(default=0)  # la plus haute servie d'abord
+    motif = models.CharField(max_length=255, null=True, blank=True)
+    
+    statut = models.CharField(max_length=20, choices=Statut.choices, default=Statut.EN_ATTENTE)
+    # Rendez-vous annulé dont le créneau est proposé, puis rendez-vous réservé
+    rendez_vous_libere = models.ForeignKey(
+        RendezVous,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        db_column='rendez_vous_libere_id'
+    )
+    date_proposition = models.DateTimeField(null=True, blank=True)
+    rendez_vous = models.ForeignKey(
+        RendezVous,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        db_column='rendez_vous_id'
+    )
+    # Créneaux refusés ou laissés sans réponse : jamais reproposés à l'inscription
+    creneaux_refuses = models.ManyToManyField(
+        RendezVous,
+        blank=True,
+        related_name='+',
+        db_table='liste_attente_creneau_refuse'
+    )
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TenantManager()
+    
+    def __str__(self):
+        return f"Liste d'attente {self.patient} - {self.get_statut_display()}"
+    
+    class Meta:
+        db_table = 'liste_attente'
+        verbose_name = "Inscription en liste d'attente"
+        verbose_name_plural = "Liste d'attente"
+        ordering = ['-priorite', 'created_at']
+        indexes = [
+            # Recherche du candidat d'un créneau libéré, limitée aux inscriptions en attente
+            models.Index(
+                fields=['tenant', 'medecin', 'date_debut'],
+                condition=models.Q(statut='en_attente'),
+                name='liste_attente_medecin_idx'
+            ),
+            models.Index(
+                fields=['tenant', 'specialite', 'date_debut'],
+                condition=models.Q(statut='en_attente', medecin__isnull=True),
+                name='liste_attente_specialite_idx'
+            ),
+            models.Index(fields=['statut', 'date_proposition']),
+        ]
+
+class JetonCalendrier(models.Model):
+    """
+    TABLE JetonCalendrier - Jeton secret du flux iCalendar (lecture seule)
+    d'un utilisateur, sur les rendez-vous de son médecin ou de son patient.
+    
+    Le jeton est résolu sans tenant courant : la table reste partagée (pas
+    de TenantManager ni de clé étrangère vers un modèle cloisonné).
+    """
+    
+    class Cible(models.TextChoices):
+        MEDECIN = 'medecin', 'Médecin'
+        PATIENT = 'patient', 'Patient'
+    
+    jeton_id = models.AutoField(primary_key=True)
+    jeton = models.CharField(max_length=64, unique=True)
+    tenant = models.ForeignKey(
+        'gestion_tenants.Tenant',
+        on_delete=models.CASCADE,
+        db_column='tenant_id'
+    )
+    utilisateur = models.OneToOneField(
+        'comptes.Utilisateur',
+        on_delete=models.CASCADE,
+        related_name='jeton_calendrier',
+        db_column='utilisateur_id'
+    )
+    cible = models.CharField(max_length=20, choices=Cible.choices)
+    cible_id = models.IntegerField()  # medecin_id ou patient_id
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Calendrier {self.get_cible_display()} {self.cible_id}"
+    
+    class Meta:
+        db_table = 'jeton_calendrier'
+        verbose_name = 'Jeton de calendrier'
+        verbose_name_plural = 'Jetons de calendrier'
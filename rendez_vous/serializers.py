@@ -1,7 +1,69 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import RendezVous, RendezVousType, RendezVousStatut
+from .disponibilites import est_ouvert
+from .models import (
+    RendezVous, RendezVousType, RendezVousStatut, HoraireMedecin, AbsenceMedecin, SerieRendezVous,
+    TauxAbsenceMedecin, TauxAbsencePatient, ListeAttente, DUREE_PAR_DEFAUT
+)
+from .services import conflits_rendez_vous, verrouiller_medecin
+from trimed_backend import referentiel
+
+# Champs de la requête qui imposent de revérifier horaires et conflits
+# (distincts de models.CHAMPS_CRENEAU, colonnes suivies par les signaux)
+CHAMPS_VERIFIES = ('medecin', 'date_heure', 'type')
+
+def _creneau_demande(data, instance=None):
+    """
+    (médecin, début, durée) du rendez-vous validé, ou None s'il est
+    incomplet ou si la requête ne touche pas au créneau (notes, statut...)
+    """
+    if not any(champ in data for champ in CHAMPS_VERIFIES):
+        return None
+    medecin = data.get('medecin', getattr(instance, 'medecin', None))
+    date_heure = data.get('date_heure', getattr(instance, 'date_heure', None))
+    if not medecin or not date_heure:
+        return None
+    
+    # Calculer la durée du RDV
+    type_rdv = data['type'] if 'type' in data else getattr(instance, 'type', None)
+    duree = type_rdv.duree_defaut if type_rdv else DUREE_PAR_DEFAUT
+    return medecin, date_heure, duree
+
+def verifier_horaires(data, instance=None):
+    """Refuser un rendez-vous hors des horaires du médecin ou pendant une absence"""
+    creneau = _creneau_demande(data, instance)
+    if creneau and not est_ouvert(*creneau):
+        raise serializers.ValidationError("Le médecin ne consulte pas à cet horaire")
+
+def verifier_conflits(data, instance=None):
+    """Refuser un rendez-vous qui chevauche un autre rendez-vous du médecin"""
+    creneau = _creneau_demande(data, instance)
+    if not creneau:
+        return
+    medecin, date_heure, duree = creneau
+    date_fin = date_heure + timedelta(minutes=duree)
+    
+    conflits = conflits_rendez_vous(
+        medecin, date_heure, date_fin, exclure=instance.pk if instance else None
+    )
+    if conflits:
+        debut, fin = conflits[0]
+        raise serializers.ValidationError(
+            f"Conflit avec un autre rendez-vous de {debut.strftime('%H:%M')} à {fin.strftime('%H:%M')}"
+        )
+
+def verrouiller_creneau(data, instance=None):
+    """
+    Verrouiller le médecin du créneau demandé et revérifier les conflits,
+    dans la transaction de l'enregistrement : deux réservations simultanées
+    du même créneau ne passent pas toutes deux la validation
+    """
+    creneau = _creneau_demande(data, instance)
+    if creneau:
+        verrouiller_medecin(creneau[0])
+        verifier_conflits(data, instance)
 
 class RendezVousTypeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,6 +77,34 @@ class RendezVousStatutSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['statut_id', 'created_at', 'updated_at']
 
+class HoraireMedecinSerializer(serializers.ModelSerializer):
+    jour_semaine_nom = serializers.CharField(source='get_jour_semaine_display', read_only=True)
+    
+    class Meta:
+        model = HoraireMedecin
+        fields = '__all__'
+        read_only_fields = ['horaire_id', 'tenant', 'created_at', 'updated_at']
+    
+    def validate(self, data):
+        debut = data.get('heure_debut', getattr(self.instance, 'heure_debut', None))
+        fin = data.get('heure_fin', getattr(self.instance, 'heure_fin', None))
+        if debut and fin and fin <= debut:
+            raise serializers.ValidationError("L'heure de fin doit suivre l'heure de début")
+        return data
+
+class AbsenceMedecinSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AbsenceMedecin
+        fields = '__all__'
+        read_only_fields = ['absence_id', 'tenant', 'created_at', 'updated_at']
+    
+    def validate(self, data):
+        debut = data.get('debut', getattr(self.instance, 'debut', None))
+        fin = data.get('fin', getattr(self.instance, 'fin', None))
+        if debut and fin and fin <= debut:
+            raise serializers.ValidationError("La fin de l'absence doit suivre son début")
+        return data
+
 class RendezVousListSerializer(serializers.ModelSerializer):
     """Serializer simplifié pour la liste des rendez-vous"""
     patient_nom = serializers.CharField(source='patient.nom', read_only=True)
@@ -35,6 +125,58 @@ class RendezVousListSerializer(serializers.ModelSerializer):
             'type_nom', 'statut_nom', 'statut_couleur', 'duree', 'date_fin'
         ]
 
+class SerieRendezVousSerializer(serializers.ModelSerializer):
+    """Serializer des séries de rendez-vous récurrents et de leurs occurrences"""
+    rendez_vous = RendezVousListSerializer(many=True, read_only=True)
+    ignorer_indisponibles = serializers.BooleanField(default=False, write_only=True)
+    
+    class Meta:
+        model = SerieRendezVous
+        fields = '__all__'
+        read_only_fields = ['serie_id', 'tenant', 'created_at', 'updated_at']
+    
+    def validate_jours_semaine(self, value):
+        if value is None:
+            return value
+        if not isinstance(value, list) or not value or any(
+            not isinstance(jour, int) or not 0 <= jour <= 6 for jour in value
+        ):
+            raise serializers.ValidationError("Liste de jours attendue, de 0 (lundi) à 6 (dimanche)")
+        return sorted(set(value))
+    
+    def validate(self, data):
+        if not data.get('nombre_occurrences') and not data.get('date_fin'):
+            raise serializers.ValidationError("nombre_occurrences ou date_fin est requis")
+        if data.get('jours_semaine') and data['frequence'] != SerieRendezVous.Frequence.HEBDOMADAIRE:
+            raise serializers.ValidationError("jours_semaine ne s'applique qu'aux séries hebdomadaires")
+        if data['date_debut'] < timezone.now():
+            raise serializers.ValidationError("La date du rendez-vous ne peut pas être dans le passé")
+        return data
+
+class ListeAttenteSerializer(serializers.ModelSerializer):
+    """Serializer des inscriptions en liste d'attente"""
+    creneau_propose = serializers.DateTimeField(source='rendez_vous_libere.date_heure', read_only=True)
+    
+    class Meta:
+        model = ListeAttente
+        fields = '__all__'
+        read_only_fields = [
+            'liste_attente_id', 'tenant', 'statut', 'rendez_vous_libere',
+            'date_proposition', 'rendez_vous', 'created_at', 'updated_at'
+        ]
+        extra_kwargs = {'patient': {'required': False}}
+    
+    def validate(self, data):
+        if not data.get('medecin') and not data.get('specialite'):
+            raise serializers.ValidationError("medecin ou specialite est requis")
+        if data['date_fin'] < data['date_debut']:
+            raise serializers.ValidationError("date_fin doit suivre date_debut")
+        if data['date_fin'] < timezone.localdate():
+            raise serializers.ValidationError("La fenêtre souhaitée est déjà passée")
+        if data.get('heure_debut') and data.get('heure_fin') and data['heure_fin'] <= data['heure_debut']:
+            raise serializers.ValidationError("heure_fin doit suivre heure_debut")
+        return data
+
 class RendezVousSerializer(serializers.ModelSerializer):
     """Serializer complet pour les rendez-vous"""
     patient_detail = serializers.SerializerMethodField()
@@ -71,7 +213,7 @@ class RendezVousSerializer(serializers.ModelSerializer):
     class Meta:
         model = RendezVous
         fields = '__all__'
-        read_only_fields = ['rendez_vous_id', 'created_at', 'updated_at']
+        read_only_fields = ['rendez_vous_id', 'serie', 'created_at', 'updated_at']
     
     def validate_date_heure(self, value):
         """Validation de la date et heure du rendez-vous"""
@@ -79,46 +221,19 @@ class RendezVousSerializer(serializers.ModelSerializer):
         if value < timezone.now():
             raise serializers.ValidationError("La date du rendez-vous ne peut pas être dans le passé")
         
-        # Vérifier les heures d'ouverture (8h-18h)
-        if value.hour < 8 or value.hour >= 18:
-            raise serializers.ValidationError("Les rendez-vous doivent être entre 8h et 18h")
-        
-        # Vérifier que ce n'est pas un dimanche
-        if value.weekday() == 6:  # 6 = dimanche
-            raise serializers.ValidationError("Pas de rendez-vous le dimanche")
-        
         return value
     
     def validate(self, data):
         """Validation globale du rendez-vous"""
-        # Vérifier la disponibilité du médecin
-        if 'medecin' in data and 'date_heure' in data:
-            medecin = data['medecin']
-            date_heure = data['date_heure']
-            
-            # Calculer la durée du RDV
-            duree = 30  # durée par défaut
-            if 'type' in data and data['type']:
-                duree = data['type'].duree_defaut
-            
-            date_fin = date_heure + timedelta(minutes=duree)
-            
-            # Vérifier les conflits
-            conflits = RendezVous.objects.filter(
-                medecin=medecin,
-                statut__est_annule=False,
-                date_heure__lt=date_fin,
-            ).exclude(pk=self.instance.pk if self.instance else None)
-            
-            # Vérifier si il y a chevauchement
-            for rdv in conflits:
-                rdv_fin = rdv.date_heure + timedelta(minutes=rdv.duree)
-                if date_heure < rdv_fin:
-                    raise serializers.ValidationError(
-                        f"Conflit avec un autre rendez-vous de {rdv.date_heure.strftime('%H:%M')} à {rdv_fin.strftime('%H:%M')}"
-                    )
-        
+        # Les heures d'ouverture sont celles du médecin (HoraireMedecin)
+        verifier_horaires(data, self.instance)
+        verifier_conflits(data, self.instance)
         return data
+    
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            verrouiller_creneau(validated_data, instance)
+            return super().update(instance, validated_data)
 
 class CreneauDisponibleSerializer(serializers.Serializer):
     """Serializer pour les créneaux disponibles"""
@@ -128,6 +243,33 @@ class CreneauDisponibleSerializer(serializers.Serializer):
     disponible = serializers.BooleanField()
     duree = serializers.IntegerField()
 
+class PremierCreneauSerializer(serializers.Serializer):
+    """Serializer pour le premier créneau libre"""
+    medecin_id = serializers.IntegerField()
+    medecin_nom = serializers.CharField()
+    debut = serializers.DateTimeField()
+    fin = serializers.DateTimeField()
+    duree = serializers.IntegerField()
+
+class TauxAbsenceMedecinSerializer(serializers.ModelSerializer):
+    medecin_nom = serializers.CharField(source='medecin.nom', read_only=True)
+    medecin_prenom = serializers.CharField(source='medecin.prenom', read_only=True)
+    
+    class Meta:
+        model = TauxAbsenceMedecin
+        fields = ['medecin', 'medecin_nom', 'medecin_prenom', 'rendez_vous_clos', 'absences', 'taux', 'updated_at']
+
+class TauxAbsencePatientSerializer(serializers.ModelSerializer):
+    patient_nom = serializers.CharField(source='patient.nom', read_only=True)
+    patient_prenom = serializers.CharField(source='patient.prenom', read_only=True)
+    
+    class Meta:
+        model = TauxAbsencePatient
+        fields = [
+            'patient', 'patient_nom', 'patient_prenom', 'rendez_vous_clos', 'absences',
+            'taux', 'derniere_absence', 'updated_at'
+        ]
+
 class RendezVousCreateSerializer(serializers.ModelSerializer):
     """Serializer pour la création de rendez-vous"""
     class Meta:
@@ -140,20 +282,20 @@ class RendezVousCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La date du rendez-vous ne peut pas être dans le passé")
         return value
     
+    def validate(self, data):
+        verifier_horaires(data)
+        verifier_conflits(data)
+        return data
+    
     def create(self, validated_data):
         # Ajouter le tenant automatiquement
         validated_data['tenant'] = self.context['request'].user.hopital
         
         # Définir le statut par défaut
-        statut_defaut, created = RendezVousStatut.objects.get_or_create(
-            tenant=validated_data['tenant'],
-            nom='Planifié',
-            defaults={
-                'description': 'Rendez-vous planifié',
-                'couleur': '#3498db',
-                'est_confirme': False
-            }
+        validated_data['statut'] = referentiel.statut_rendez_vous(
+            validated_data['tenant'], 'Planifié'
         )
-        validated_data['statut'] = statut_defaut
         
-        return super().create(validated_data)
\ No newline at end of file
+        with transaction.atomic():
+            verrouiller_creneau(validated_data)
+            return super().create(validated_data)
\ No newline at end of file
@@ -0,0 +1,224 @@
+# series.py
+"""
+Séries de rendez-vous récurrents.
+
+Les occurrences d'une série sont générées à la même heure locale de
+l'établissement, vérifiées ensemble (une requête de conflits sur la plage
+couverte, une lecture des bitmaps d'horaires) puis insérées par
+bulk_create dans une seule transaction. Les insertions et mises à jour
+groupées ne déclenchent pas les signaux : les disponibilités des jours
+touchés sont recalculées et les agendas en cache invalidés explicitement.
+"""
+import calendar
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from gestion_tenants.services import fuseau_horaire
+from trimed_backend import referentiel
+from .agenda import invalider_agenda
+from .calendrier import invalider_calendriers
+from .disponibilites import actualiser_disponibilites, creneaux_fermes
+from .liste_attente import proposer_creneaux
+from .models import RendezVous, SerieRendezVous, DUREE_PAR_DEFAUT
+from .services import conflits_creneaux, statuts_annules, verrouiller_medecin
+
+MAX_OCCURRENCES = 366
+
+
+class SerieError(Exception):
+    """Série impossible à enregistrer ; `details` liste les occurrences en cause"""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or []
+
+
+def _ajouter_mois(jour, mois, quantieme):
+    annee, mois = divmod(jour.month - 1 + mois, 12)
+    annee, mois = jour.year + annee, mois + 1
+    return jour.replace(year=annee, month=mois, day=min(quantieme, calendar.monthrange(annee, mois)[1]))
+
+
+def _dates(premier_jour, frequence, intervalle, jours_semaine):
+    """Dates successives de la règle de récurrence, sans fin"""
+    if frequence == SerieRendezVous.Frequence.QUOTIDIENNE:
+        jour = premier_jour
+        while True:
+            yield jour
+            jour += timedelta(days=intervalle)
+    elif frequence == SerieRendezVous.Frequence.MENSUELLE:
+        rang = 0
+        while True:
+            yield _ajouter_mois(premier_jour, rang, premier_jour.day)
+            rang += intervalle
+    else:
+        jours = sorted(set(jours_semaine or [premier_jour.weekday()]))
+        lundi = premier_jour - timedelta(days=premier_jour.weekday())
+        while True:
+            for jour_semaine in jours:
+                jour = lundi + timedelta(days=jour_semaine)
+                if jour >= premier_jour:
+                    yield jour
+            lundi += timedelta(weeks=intervalle)
+
+
+def occurrences(serie):
+    """Débuts des occurrences de la série, à l'heure locale de la première"""
+    if not serie.nombre_occurrences and not serie.date_fin:
+        raise SerieError('nombre_occurrences ou date_fin est requis')
+
+    if (serie.nombre_occurrences or 0) > MAX_OCCURRENCES:
+        raise SerieError(f'Une série ne peut pas dépasser {MAX_OCCURRENCES} occurrences')
+
+    fuseau = fuseau_horaire(serie.tenant_id)
+    premiere = serie.date_debut.astimezone(fuseau)
+    limite = serie.nombre_occurrences or MAX_OCCURRENCES + 1
+    debuts = []
+    for jour in _dates(premiere.date(), serie.frequence, serie.intervalle, serie.jours_semaine):
+        if len(debuts) == limite or (serie.date_fin and jour > serie.date_fin):
+            break
+        debuts.append(datetime.combine(jour, premiere.time(), tzinfo=fuseau))
+    if len(debuts) > MAX_OCCURRENCES:
+        raise SerieError(f'Une série ne peut pas dépasser {MAX_OCCURRENCES} occurrences')
+    return debuts
+
+
+def _verifier(medecin, debuts, duree, exclure=()):
+    """Indices des occurrences indisponibles, avec leur motif"""
+    conflits = conflits_creneaux(
+        medecin, [(debut, debut + timedelta(minutes=duree)) for debut in debuts], exclure
+    )
+    fuseau = fuseau_horaire(medecin.hopital_id)
+    indisponibles = {
+        indice: (
+            f"Conflit avec un autre rendez-vous de {debut.astimezone(fuseau).strftime('%H:%M')} "
+            f"à {fin.astimezone(fuseau).strftime('%H:%M')}"
+        )
+        for indice, (debut, fin) in conflits.items()
+    }
+    for indice in creneaux_fermes(medecin, [(debut, duree) for debut in debuts]):
+        indisponibles.setdefault(indice, 'Le médecin ne consulte pas à cet horaire')
+    return indisponibles
+
+
+def _details(debuts, indisponibles):
+    return [
+        {'date_heure': debuts[indice], 'motif': motif}
+        for indice, motif in sorted(indisponibles.items())
+    ]
+
+
+def _actualiser(serie, moments):
+    if moments:
+        actualiser_disponibilites(
+            [serie.medecin_id],
+            min(moments).date() - timedelta(days=1),
+            max(moments).date() + timedelta(days=2)
+        )
+        invalider_agenda(serie.tenant_id, [(serie.medecin_id, moment) for moment in moments])
+        invalider_calendriers(serie.tenant_id, [serie.medecin_id], [serie.patient_id])
+
+
+def creer_serie(serie, ignorer_indisponibles=False):
+    """
+    Enregistrer la série et toutes ses occurrences. Les occurrences en
+    conflit ou hors des horaires du médecin font échouer la série, ou sont
+    écartées si `ignorer_indisponibles`. Retourne (rendez-vous créés,
+    occurrences écartées).
+    """
+    debuts = occurrences(serie)
+    if not debuts:
+        raise SerieError('La règle de récurrence ne produit aucune occurrence')
+    if debuts[0] < timezone.now():
+        raise SerieError('La date du rendez-vous ne peut pas être dans le passé')
+    duree = serie.type.duree_defaut if serie.type else DUREE_PAR_DEFAUT
+
+    with transaction.atomic():
+        verrouiller_medecin(serie.medecin)
+        indisponibles = _verifier(serie.medecin, debuts, duree)
+        if indisponibles and not ignorer_indisponibles:
+            raise SerieError(
+                'Certaines occurrences de la série sont indisponibles',
+                _details(debuts, indisponibles)
+            )
+
+        serie.save()
+        statut = referentiel.statut_rendez_vous(serie.tenant_id, 'Planifié')
+        rendez_vous = RendezVous._base_manager.bulk_create([
+            RendezVous(
+                tenant_id=serie.tenant_id,
+                patient_id=serie.patient_id,
+                medecin_id=serie.medecin_id,
+                type_id=serie.type_id,
+                statut=statut,
+                serie=serie,
+                date_heure=debut,
+                motif=serie.motif,
+                notes=serie.notes,
+            )
+            for indice, debut in enumerate(debuts) if indice not in indisponibles
+        ])
+        _actualiser(serie, [rdv.date_heure for rdv in rendez_vous])
+    return rendez_vous, _details(debuts, indisponibles)
+
+
+def occurrences_a_venir(serie):
+    """Occurrences non annulées de la série qui n'ont pas encore commencé"""
+    return RendezVous._base_manager.filter(
+        serie=serie, date_heure__gte=timezone.now()
+    ).exclude(statut_id__in=statuts_annules(serie.tenant_id))
+
+
+def annuler_serie(serie, raison=''):
+    """Annuler les occurrences à venir de la série ; retourne leur nombre"""
+    with transaction.atomic():
+        a_venir = occurrences_a_venir(serie).select_for_update()
+        lignes = list(a_venir.values_list('pk', 'date_heure'))
+        moments = [date_heure for _, date_heure in lignes]
+        nombre = a_venir.update(
+            statut=referentiel.statut_rendez_vous(serie.tenant_id, 'Annulé'),
+            raison_annulation=raison,
+            updated_at=timezone.now()
+        )
+        _actualiser(serie, moments)
+        liberes = [pk for pk, _ in lignes]
+        transaction.on_commit(lambda: proposer_creneaux(liberes))
+    return nombre
+
+
+def reporter_serie(serie, decalage):
+    """
+    Décaler les occurrences à venir de la série (timedelta, en heure
+    locale), après vérification groupée des conflits et des horaires.
+    Retourne les rendez-vous déplacés.
+    """
+    fuseau = fuseau_horaire(serie.tenant_id)
+    with transaction.atomic():
+        verrouiller_medecin(serie.medecin)
+        rendez_vous = list(occurrences_a_venir(serie).select_related('type').order_by('date_heure'))
+        if not rendez_vous:
+            return []
+        anciens = [rdv.date_heure for rdv in rendez_vous]
+        for rdv in rendez_vous:
+            locale = rdv.date_heure.astimezone(fuseau).replace(tzinfo=None) + decalage
+            rdv.date_heure = locale.replace(tzinfo=fuseau)
+        if rendez_vous[0].date_heure < timezone.now():
+            raise SerieError('La nouvelle date ne peut pas être dans le passé')
+
+        # Les occurrences d'une série ont toutes le type de la série
+        debuts = [rdv.date_heure for rdv in rendez_vous]
+        indisponibles = _verifier(
+            serie.medecin, debuts, rendez_vous[0].duree, exclure=[rdv.pk for rdv in rendez_vous]
+        )
+        if indisponibles:
+            raise SerieError(
+                'Certaines occurrences de la série sont indisponibles',
+                _details(debuts, indisponibles)
+            )
+
+        maintenant = timezone.now()
+        for rdv in rendez_vous:
+            rdv.updated_at = maintenant
+        RendezVous._base_manager.bulk_update(rendez_vous, ['date_heure', 'updated_at'])
+        _actualiser(serie, anciens + debuts)
+    return rendez_vous
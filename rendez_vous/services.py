@@ -0,0 +1,102 @@
+# services.py
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from django.db.models import Max
+from trimed_backend import referentiel
+from .models import RendezVous, RendezVousStatut, RendezVousType, DUREE_PAR_DEFAUT
+
+
+def verrouiller_medecin(medecin):
+    """
+    Verrouiller la ligne du médecin jusqu'à la fin de la transaction : les
+    réservations d'un même médecin (unitaires, séries, liste d'attente)
+    vérifient leurs conflits et s'enregistrent l'une après l'autre
+    """
+    from medical.models import Medecin
+
+    Medecin._base_manager.select_for_update().filter(pk=medecin.pk).first()
+
+
+def duree_max_rendez_vous(tenant_id):
+    """
+    Durée (minutes) du plus long type de rendez-vous du tenant, lue dans
+    la transaction de l'appelant : un type allongé par un autre processus
+    élargit aussitôt la fenêtre de recherche des conflits
+    """
+    duree = RendezVousType._base_manager.filter(
+        tenant_id=tenant_id
+    ).aggregate(duree=Max('duree_defaut'))['duree']
+    return max(duree or 0, DUREE_PAR_DEFAUT)
+
+
+def statuts_annules(tenant_id):
+    """Ids des statuts d'annulation du tenant (lus dans le référentiel en cache)"""
+    return [
+        statut.pk for statut in referentiel.references(RendezVousStatut, tenant_id).values()
+        if statut.est_annule
+    ]
+
+
+def conflits_rendez_vous(medecin, debut, fin, exclure=None):
+    """
+    Rendez-vous non annulés du médecin qui chevauchent [debut, fin[,
+    sous forme de (début, fin).
+
+    Un rendez-vous ne peut chevaucher l'intervalle que s'il commence moins
+    d'une durée maximale avant `debut` : la requête ne parcourt donc que
+    cette fenêtre de l'index (tenant, medecin, date_heure), quelle que
+    soit la profondeur de l'historique du médecin.
+    """
+    tenant_id = medecin.hopital_id
+    fenetre = RendezVous._base_manager.filter(
+        tenant_id=tenant_id,
+        medecin_id=medecin.pk,
+        date_heure__gt=debut - timedelta(minutes=duree_max_rendez_vous(tenant_id)),
+        date_heure__lt=fin,
+    ).exclude(statut_id__in=statuts_annules(tenant_id))
+    if exclure is not None:
+        fenetre = fenetre.exclude(pk=exclure)
+
+    conflits = []
+    for date_heure, duree in fenetre.order_by('date_heure').values_list(
+        'date_heure', 'type__duree_defaut'
+    ):
+        rdv_fin = date_heure + timedelta(minutes=DUREE_PAR_DEFAUT if duree is None else duree)
+        if rdv_fin > debut:
+            conflits.append((date_heure, rdv_fin))
+    return conflits
+
+
+def conflits_creneaux(medecin, creneaux, exclure=()):
+    """
+    Conflits d'une liste de créneaux [(début, fin)] du médecin, en une
+    seule requête sur la plage qui les couvre : {indice du créneau:
+    (début, fin) du premier rendez-vous chevauchant}
+    """
+    if not creneaux:
+        return {}
+    tenant_id = medecin.hopital_id
+    duree_max = timedelta(minutes=duree_max_rendez_vous(tenant_id))
+    plage = RendezVous._base_manager.filter(
+        tenant_id=tenant_id,
+        medecin_id=medecin.pk,
+        date_heure__gt=min(debut for debut, _ in creneaux) - duree_max,
+        date_heure__lt=max(fin for _, fin in creneaux),
+    ).exclude(statut_id__in=statuts_annules(tenant_id))
+    if exclure:
+        plage = plage.exclude(pk__in=exclure)
+
+    existants = [
+        (date_heure, date_heure + timedelta(minutes=DUREE_PAR_DEFAUT if duree is None else duree))
+        for date_heure, duree in plage.order_by('date_heure').values_list('date_heure', 'type__duree_defaut')
+    ]
+    debuts = [debut for debut, _ in existants]
+
+    conflits = {}
+    for indice, (debut, fin) in enumerate(creneaux):
+        # Seuls les rendez-vous commençant moins d'une durée maximale avant peuvent chevaucher
+        for existant in existants[bisect_right(debuts, debut - duree_max):bisect_left(debuts, fin)]:
+            if existant[1] > debut:
+                conflits[indice] = existant
+                break
+    return conflits
@@ -0,0 +1,136 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from gestion_tenants.models import ParametreHopital
+from medical.models import Medecin
+from trimed_backend import referentiel
+from .agenda import invalider_agenda, invalider_medecin_utilisateur
+from .calendrier import invalider_calendriers
+from .disponibilites import actualiser_disponibilites, actualiser_rendez_vous
+from .liste_attente import proposer_creneaux
+from .models import (
+    AbsenceMedecin, CHAMPS_CRENEAU, DisponibiliteMedecin, DUREE_PAR_DEFAUT, HoraireMedecin,
+    RendezVous, RendezVousStatut, RendezVousType
+)
+from .services import statuts_annules
+
+@receiver([post_save, post_delete], sender=RendezVousStatut)
+def invalider_referentiel(sender, **kwargs):
+    """
+    Invalider le cache des statuts de rendez-vous
+    """
+    referentiel.invalider(sender)
+
+
+# Noms acceptés par save(update_fields=...) pour les colonnes du créneau
+CHAMPS_CRENEAU_ENREGISTRES = set(CHAMPS_CRENEAU) | {champ[:-3] for champ in CHAMPS_CRENEAU if champ.endswith('_id')}
+
+
+def _creneau(instance):
+    return tuple(getattr(instance, champ) for champ in CHAMPS_CRENEAU)
+
+
+def _duree(instance, type_id):
+    if type_id == instance.type_id:
+        return instance.duree
+    if type_id is None:
+        return DUREE_PAR_DEFAUT
+    return RendezVousType._base_manager.filter(pk=type_id).values_list(
+        'duree_defaut', flat=True
+    ).first() or DUREE_PAR_DEFAUT
+
+
+@receiver(pre_save, sender=RendezVous)
+def memoriser_creneau(sender, instance, update_fields=None, **kwargs):
+    """
+    Retenir le créneau (médecin, horaire, type, statut) avant modification,
+    pour libérer l'ancien créneau dans les disponibilités et détecter les
+    annulations : celui chargé avec l'instance, relu seulement à défaut
+    """
+    instance._creneau_precedent = None
+    if not instance.pk:
+        return
+    if update_fields is not None and not CHAMPS_CRENEAU_ENREGISTRES & set(update_fields):
+        instance._creneau_precedent = _creneau(instance)
+        return
+    precedent = getattr(instance, '_creneau_charge', None)
+    if precedent is None:
+        precedent = RendezVous._base_manager.filter(pk=instance.pk).values_list(*CHAMPS_CRENEAU).first()
+    instance._creneau_precedent = precedent
+
+
+@receiver([post_save, post_delete], sender=RendezVous)
+def actualiser_disponibilites_rendez_vous(sender, instance, signal, **kwargs):
+    """
+    Recalculer les journées de disponibilité touchées par le rendez-vous
+    (nouvel et ancien créneau) quand son créneau change, et invalider
+    l'agenda et les flux, qui affichent aussi le motif et les notes
+    """
+    actuel = _creneau(instance)
+    precedent = None if signal is post_delete else getattr(instance, '_creneau_precedent', None)
+    instance._creneau_charge = actuel
+    creneaux = {actuel[:2]}
+    if precedent:
+        creneaux.add(precedent[:2])
+
+    if precedent != actuel:
+        par_medecin = defaultdict(list)
+        par_medecin[actuel[0]].append((actuel[1], instance.duree))
+        if precedent:
+            par_medecin[precedent[0]].append((precedent[1], _duree(instance, precedent[2])))
+        for medecin_id, occupes in par_medecin.items():
+            actualiser_rendez_vous(medecin_id, occupes)
+    invalider_agenda(instance.tenant_id, creneaux)
+    invalider_calendriers(
+        instance.tenant_id,
+        medecin_ids=[medecin_id for medecin_id, _ in creneaux],
+        patient_ids=[instance.patient_id]
+    )
+
+
+@receiver(post_save, sender=RendezVous)
+def proposer_creneau_libere(sender, instance, created, **kwargs):
+    """
+    Proposer le créneau d'un rendez-vous à venir qui vient d'être annulé
+    à la liste d'attente, une fois l'annulation validée
+    """
+    precedent = getattr(instance, '_creneau_precedent', None)
+    if created or precedent is None or not instance.est_dans_futur:
+        return
+    annules = statuts_annules(instance.tenant_id)
+    if instance.statut_id in annules and precedent[3] not in annules:
+        transaction.on_commit(lambda: proposer_creneaux([instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=Medecin)
+def invalider_medecin_agenda(sender, instance, **kwargs):
+    """
+    Le médecin lié à un utilisateur est mis en cache pour l'agenda
+    """
+    if instance.utilisateur_id:
+        invalider_medecin_utilisateur(instance.utilisateur_id)
+
+
+@receiver([post_save, post_delete], sender=HoraireMedecin)
+@receiver([post_save, post_delete], sender=AbsenceMedecin)
+def actualiser_disponibilites_medecin(sender, instance, **kwargs):
+    """
+    Recalculer les journées à venir du médecin dont les horaires ou les
+    absences changent
+    """
+    actualiser_disponibilites([instance.medecin_id])
+
+
+@receiver(post_save, sender=ParametreHopital)
+def purger_disponibilites_tenant(sender, instance, **kwargs):
+    """
+    Un changement de fuseau horaire décale les journées locales : les
+    disponibilités à venir sont recalculées à la lecture suivante
+    """
+    DisponibiliteMedecin._base_manager.filter(
+        tenant_id=instance.tenant_id,
+        date__gte=timezone.localdate() - timedelta(days=1)
+    ).delete()
@@ -1,3 +1,424 @@
-from django.test import TestCase
+import importlib
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from comptes.models import Utilisateur
+from gestion_tenants.models import Tenant
+from gestion_tenants.services import fuseau_horaire
+from medical.models import Medecin
+from patients.models import Patient
+from trimed_backend import referentiel, tenancy
+from . import agenda, cloture, liste_attente, serializers, signals
+from .calendrier import creer_jeton, revoquer_jeton
+from .filtres import RendezVousFilterSet
+from .liste_attente import ListeAttenteError
+from .models import (
+    DisponibiliteMedecin, HoraireMedecin, ListeAttente, RendezVous, RendezVousType, SerieRendezVous
+)
+from .series import SerieError, creer_serie
+from .services import conflits_rendez_vous
 
-# Create your tests here.
+
+SCHEMA_DEPLACE = 'hopital_deplace'
+
+
+@contextmanager
+def tenants_traites(objet, nom):
+    """Noter (tenant courant, schéma des connexions) à chaque appel de objet.nom"""
+    vus = []
+    original = getattr(objet, nom)
+
+    def espion(*args, **kwargs):
+        vus.append((tenancy.tenant_courant(), tenancy._parametres_voulus()[1]))
+        return original(*args, **kwargs)
+
+    with mock.patch.object(objet, nom, side_effect=espion):
+        yield vus
+
+
+def jour_ouvre(decalage):
+    """Premier jour du lundi au vendredi à partir de `decalage` jours"""
+    jour = timezone.localdate() + timedelta(days=decalage)
+    while jour.weekday() > 4:
+        jour += timedelta(days=1)
+    return jour
+
+
+class RendezVousTestCase(TestCase):
+    """Un hôpital, un médecin qui consulte en semaine de 8h à 18h et trois patients"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(nom='Hôpital test', nombre_de_lits=10)
+        cls.utilisateur = Utilisateur.objects.creer_utilisateur(
+            'medecin@test.fr', 'Dr Test', 'secret', role='medecin', hopital=cls.tenant
+        )
+        # Profil créé par le signal de comptes
+        cls.medecin = Medecin.objects.get(utilisateur=cls.utilisateur)
+        cls.patients = [
+            Patient.objects.create(
+                hopital=cls.tenant, nom=f'Patient {numero}', prenom='Test',
+                numero_dossier_medical=f'DOS-{numero}'
+            )
+            for numero in range(3)
+        ]
+        for jour in range(5):
+            HoraireMedecin.objects.create(
+                tenant=cls.tenant, medecin=cls.medecin, jour_semaine=jour,
+                heure_debut=time(8), heure_fin=time(18)
+            )
+
+    def setUp(self):
+        # Les ids sont réutilisés d'un test à l'autre : pas de cache hérité
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.utilisateur)
+
+    def moment(self, jour, heure, minute=0):
+        return datetime.combine(jour, time(heure, minute), tzinfo=fuseau_horaire(self.tenant.pk))
+
+    def statut(self, nom):
+        return referentiel.statut_rendez_vous(self.tenant.pk, nom)
+
+    def creer(self, date_heure, patient=None, **kwargs):
+        return RendezVous.objects.create(
+            tenant=self.tenant, patient=patient or self.patients[0], medecin=self.medecin,
+            date_heure=date_heure, statut=self.statut('Planifié'), **kwargs
+        )
+
+
+class PlanRequeteTests(RendezVousTestCase):
+    """Les filtres de dates parcourent l'index (tenant, medecin, date_heure)"""
+
+    def test_filtre_dates_et_medecin_utilise_l_index(self):
+        jour = jour_ouvre(1)
+        self.creer(self.moment(jour, 10))
+        with tenancy.pour_tenant(self.tenant):
+            filterset = RendezVousFilterSet(
+                {'medecin': self.medecin.pk, 'date_debut': jour, 'date_fin': jour + timedelta(days=7)},
+                queryset=RendezVous.objects.all()
+            )
+            self.assertTrue(filterset.is_valid(), filterset.errors)
+            plan = filterset.qs.explain()
+
+        self.assertNotRegex(plan, r'\bSCAN "?rendez_vous"?\s*$')
+        index = next(
+            index.name for index in RendezVous._meta.indexes
+            if index.fields == ['tenant', 'medecin', 'date_heure']
+        )
+        self.assertIn(index, plan)
+        self.assertIn('date_heure>', plan.replace(' ', ''))
+
+    def test_fin_avant_debut_refusee(self):
+        jour = jour_ouvre(1)
+        response = self.client.get(
+            '/api/rendez-vous/', {'date_debut': jour, 'date_fin': jour - timedelta(days=1)}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ReservationTests(RendezVousTestCase):
+
+    def test_conflit_reverifie_sous_verrou(self):
+        """Une validation qui n'a pas vu la réservation concurrente est rattrapée à l'enregistrement"""
+        debut = self.moment(jour_ouvre(2), 10)
+        corps = {'patient': self.patients[1].pk, 'medecin': self.medecin.pk, 'date_heure': debut.isoformat()}
+        self.creer(debut)
+
+        verifier = serializers.verifier_conflits
+        appels = []
+
+        def validation_perimee(data, instance=None):
+            appels.append(data)
+            if len(appels) > 1:
+                verifier(data, instance)
+
+        with mock.patch.object(serializers, 'verifier_conflits', validation_perimee), \
+                mock.patch.object(serializers, 'verrouiller_medecin', wraps=serializers.verrouiller_medecin) as verrou:
+            response = self.client.post('/api/rendez-vous/', corps, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        verrou.assert_called_once_with(self.medecin)
+        self.assertEqual(RendezVous.objects.filter(medecin=self.medecin, date_heure=debut).count(), 1)
+
+    def test_reporter_sur_un_creneau_occupe(self):
+        jour = jour_ouvre(2)
+        self.creer(self.moment(jour, 10))
+        rdv = self.creer(self.moment(jour, 11), patient=self.patients[1])
+        response = self.client.post(
+            f'/api/rendez-vous/{rdv.pk}/reporter/',
+            {'nouvelle_date_heure': self.moment(jour, 10, 15).isoformat()},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        rdv.refresh_from_db()
+        self.assertEqual(rdv.date_heure, self.moment(jour, 11))
+
+    def test_hors_horaires_refuse(self):
+        debut = self.moment(jour_ouvre(2), 20)
+        response = self.client.post('/api/rendez-vous/', {
+            'patient': self.patients[0].pk, 'medecin': self.medecin.pk, 'date_heure': debut.isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_type_allonge_pris_en_compte_aussitot(self):
+        """La borne de la fenêtre des conflits est relue en base, pas dans un cache"""
+        jour = jour_ouvre(2)
+        self.assertEqual(conflits_rendez_vous(self.medecin, self.moment(jour, 11), self.moment(jour, 11, 30)), [])
+        long = RendezVousType.objects.create(tenant=self.tenant, nom='Bilan', duree_defaut=120)
+        self.creer(self.moment(jour, 10), type=long)
+        self.assertEqual(
+            len(conflits_rendez_vous(self.medecin, self.moment(jour, 11), self.moment(jour, 11, 30))), 1
+        )
+
+    def test_changer_le_statut_ne_revalide_pas_le_creneau(self):
+        """Seuls medecin, date_heure et type déclenchent la vérification des horaires et des conflits"""
+        jour = jour_ouvre(2)
+        rdv = self.creer(self.moment(jour, 20))
+        response = self.client.patch(
+            f'/api/rendez-vous/{rdv.pk}/', {'statut': self.statut('Confirmé').pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.patch(
+            f'/api/rendez-vous/{rdv.pk}/', {'date_heure': self.moment(jour, 21).isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_modifier_les_notes_ne_recalcule_pas_les_disponibilites(self):
+        rdv = self.creer(self.moment(jour_ouvre(2), 10))
+        with mock.patch.object(signals, 'actualiser_rendez_vous') as actualiser:
+            response = self.client.patch(f'/api/rendez-vous/{rdv.pk}/', {'notes': 'A jeun'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            actualiser.assert_not_called()
+
+            response = self.client.patch(
+                f'/api/rendez-vous/{rdv.pk}/',
+                {'date_heure': self.moment(jour_ouvre(2), 14).isoformat()},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            actualiser.assert_called()
+
+
+class ReportGroupeTests(RendezVousTestCase):
+
+    def reporter(self, rendez_vous, minutes):
+        return self.client.post('/api/rendez-vous/reporter_groupe/', {
+            'ids': [rdv.pk for rdv in rendez_vous], 'decalage_minutes': minutes
+        }, format='json')
+
+    def test_lot_verifie_en_entier_sous_verrou(self):
+        jour = jour_ouvre(2)
+        lot = [self.creer(self.moment(jour, 9)), self.creer(self.moment(jour, 10), patient=self.patients[1])]
+        self.creer(self.moment(jour, 12, 15), patient=self.patients[2])
+
+        # Le second tomberait sur le rendez-vous de 12h15 : rien ne bouge
+        response = self.reporter(lot, 120)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([detail['rendez_vous_id'] for detail in response.json()['rendez_vous']], [lot[1].pk])
+        self.assertEqual(
+            list(RendezVous.objects.filter(pk__in=[rdv.pk for rdv in lot]).order_by('date_heure')
+                 .values_list('date_heure', flat=True)),
+            [self.moment(jour, 9), self.moment(jour, 10)]
+        )
+
+        # 10h, libérée par le premier rendez-vous du lot, n'est pas un conflit
+        manager = Medecin._base_manager
+        with mock.patch.object(manager, 'select_for_update', wraps=manager.select_for_update) as verrou:
+            response = self.reporter(lot, 60)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['modifies'], 2)
+        verrou.assert_called_once()
+        for rdv, heure in zip(lot, (10, 11)):
+            rdv.refresh_from_db()
+            self.assertEqual(rdv.date_heure, self.moment(jour, heure))
+
+
+class SerieTests(RendezVousTestCase):
+
+    def serie(self, jour, **kwargs):
+        return SerieRendezVous(
+            tenant=self.tenant, patient=self.patients[0], medecin=self.medecin,
+            date_debut=self.moment(jour, 9), frequence='hebdomadaire', nombre_occurrences=4, **kwargs
+        )
+
+    def test_occurrences_creees_en_une_fois(self):
+        rendez_vous, ecartees = creer_serie(self.serie(jour_ouvre(3)))
+        self.assertEqual(len(rendez_vous), 4)
+        self.assertEqual(ecartees, [])
+        self.assertEqual(
+            [rdv.date_heure.astimezone(fuseau_horaire(self.tenant.pk)).time() for rdv in rendez_vous],
+            [time(9)] * 4
+        )
+
+    def test_occurrence_en_conflit(self):
+        jour = jour_ouvre(3)
+        self.creer(self.moment(jour + timedelta(days=7), 9), patient=self.patients[1])
+
+        with self.assertRaises(SerieError) as erreur:
+            creer_serie(self.serie(jour))
+        self.assertEqual(len(erreur.exception.details), 1)
+        self.assertFalse(SerieRendezVous.objects.exists())
+
+        rendez_vous, ecartees = creer_serie(self.serie(jour), ignorer_indisponibles=True)
+        self.assertEqual((len(rendez_vous), len(ecartees)), (3, 1))
+
+
+class ListeAttenteTests(RendezVousTestCase):
+
+    def inscrire(self, patient, priorite):
+        jour = self.rdv.date_heure.date()
+        return ListeAttente.objects.create(
+            tenant=self.tenant, patient=patient, medecin=self.medecin,
+            date_debut=jour, date_fin=jour, priorite=priorite
+        )
+
+    def annuler(self, rdv):
+        with self.captureOnCommitCallbacks(execute=True):
+            rdv.statut = self.statut('Annulé')
+            rdv.save()
+
+    def setUp(self):
+        super().setUp()
+        self.rdv = self.creer(self.moment(jour_ouvre(4), 11))
+        self.premier = self.inscrire(self.patients[1], 2)
+        self.second = self.inscrire(self.patients[2], 1)
+
+    def test_creneau_annule_propose_au_mieux_place(self):
+        self.annuler(self.rdv)
+        self.premier.refresh_from_db()
+        self.assertEqual(self.premier.statut, ListeAttente.Statut.PROPOSEE)
+        rdv = liste_attente.accepter_proposition(self.premier)
+        self.assertEqual((rdv.patient, rdv.date_heure), (self.patients[1], self.rdv.date_heure))
+
+    def test_creneau_refuse_jamais_repropose(self):
+        self.annuler(self.rdv)
+        self.premier.refresh_from_db()
+        liste_attente.refuser_proposition(self.premier)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.statut, ListeAttente.Statut.PROPOSEE)
+
+        # Le second refuse aussi : le créneau ne repart pas chez le premier
+        liste_attente.refuser_proposition(self.second)
+        self.premier.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.premier.statut, ListeAttente.Statut.EN_ATTENTE)
+        self.assertEqual(self.second.statut, ListeAttente.Statut.EN_ATTENTE)
+
+    def test_creneau_retabli_ne_peut_plus_etre_accepte(self):
+        self.annuler(self.rdv)
+        self.premier.refresh_from_db()
+        self.rdv.statut = self.statut('Planifié')
+        self.rdv.save()
+
+        with self.assertRaises(ListeAttenteError):
+            liste_attente.accepter_proposition(self.premier)
+        self.assertEqual(RendezVous.objects.filter(date_heure=self.rdv.date_heure).count(), 1)
+
+
+class AgendaTests(RendezVousTestCase):
+
+    def test_modification_visible_apres_validation(self):
+        jour = jour_ouvre(5)
+        self.assertEqual(agenda.agenda(self.tenant.pk, self.medecin.pk, jour)['contenu']['rendez_vous'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creer(self.moment(jour, 9))
+        self.assertEqual(len(agenda.agenda(self.tenant.pk, self.medecin.pk, jour)['contenu']['rendez_vous']), 1)
+
+    def test_lecture_anterieure_non_servie(self):
+        """Un document construit d'après une lecture antérieure à la validation n'est pas servi"""
+        jour = jour_ouvre(5)
+        rdv = self.creer(self.moment(jour, 9))
+        versions = agenda._versions(self.tenant.pk, [self.medecin.pk], jour)
+        with self.captureOnCommitCallbacks(execute=True):
+            rdv.delete()
+        with mock.patch.object(agenda, '_versions', return_value=versions):
+            agenda.construire_agendas(self.tenant.pk, [self.medecin.pk], jour)
+
+        self.assertEqual(agenda.agenda(self.tenant.pk, self.medecin.pk, jour)['contenu']['rendez_vous'], [])
+
+    def test_parametre_de_date_valide_comme_les_filtres(self):
+        response = self.client.get('/api/rendez-vous/agenda/', {'date': '2026-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json())
+
+        # Sans date : journée de l'établissement
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creer(self.moment(agenda.journee(self.tenant.pk), 9))
+        response = self.client.get('/api/rendez-vous/agenda/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['rendez_vous']), 1)
+
+        response = self.client.get(
+            '/api/rendez-vous/creneaux_disponibles/', {'medecin_id': self.medecin.pk}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json())
+
+
+class CalendrierTests(RendezVousTestCase):
+
+    def test_jeton_revoque_refuse_aussitot(self):
+        client = APIClient(SERVER_NAME='localhost')
+        jeton = creer_jeton(self.utilisateur, 'medecin', self.medecin.pk).jeton
+        self.assertEqual(client.get(f'/api/rendez-vous/calendriers/{jeton}/').status_code, 200)
+        revoquer_jeton(self.utilisateur)
+        self.assertEqual(client.get(f'/api/rendez-vous/calendriers/{jeton}/').status_code, 404)
+
+
+@override_settings(TENANT_SCHEMAS=True)
+class TraitementsParTenantTests(RendezVousTestCase):
+    """Les commandes traitent chaque tenant dans ses tables, y compris un tenant déplacé"""
+
+    def setUp(self):
+        super().setUp()
+        Tenant.objects.filter(pk=self.tenant.pk).update(nom_schema_base_de_donnees=SCHEMA_DEPLACE)
+        self.attendu = [(self.tenant.pk, SCHEMA_DEPLACE)]
+
+    def commande(self, nom):
+        return importlib.import_module(f'rendez_vous.management.commands.{nom}')
+
+    def executer(self, nom, *args):
+        call_command(nom, *args, stdout=StringIO())
+
+    def test_cloturer_rendez_vous(self):
+        rdv = self.creer(self.moment(timezone.localdate() - timedelta(days=3), 10))
+        with tenants_traites(cloture, 'cloturer_tenant') as vus:
+            self.executer('cloturer_rendez_vous')
+        self.assertEqual(vus, self.attendu)
+        rdv.refresh_from_db()
+        self.assertTrue(rdv.statut.est_absence)
+
+    def test_prechauffer_agendas(self):
+        commande = self.commande('prechauffer_agendas')
+        with mock.patch.object(referentiel, 'cache_partage', return_value=True), \
+                tenants_traites(commande, 'prechauffer_agendas') as vus:
+            self.executer('prechauffer_agendas')
+        self.assertEqual(vus, self.attendu)
+
+    def test_calculer_disponibilites(self):
+        commande = self.commande('calculer_disponibilites')
+        with tenants_traites(commande, 'calculer_disponibilites') as vus:
+            self.executer('calculer_disponibilites', '--jours', '2')
+        self.assertEqual(vus, self.attendu)
+        self.assertTrue(DisponibiliteMedecin.objects.filter(medecin=self.medecin).exists())
+
+    def test_expirer_propositions(self):
+        jour = jour_ouvre(4)
+        inscription = ListeAttente.objects.create(
+            tenant=self.tenant, patient=self.patients[1], medecin=self.medecin,
+            date_debut=jour, date_fin=jour, statut=ListeAttente.Statut.PROPOSEE,
+            date_proposition=timezone.now() - timedelta(hours=1)
+        )
+        with tenants_traites(liste_attente, '_expirer_propositions') as vus:
+            self.executer('expirer_propositions')
+        self.assertEqual(vus, self.attendu)
+        inscription.refresh_from_db()
+        self.assertEqual(inscription.statut, ListeAttente.Statut.EN_ATTENTE)
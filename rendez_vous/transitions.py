@@ -0,0 +1,268 @@
+# transitions.py
+"""
+Changements de statut groupés des rendez-vous (confirmation de l'agenda
+du lendemain, annulation d'une journée...) et report groupé.
+
+Les rendez-vous sont verrouillés et lus en une requête, le statut cible
+est résolu une fois dans le référentiel, puis un seul UPDATE modifie tous
+les rendez-vous éligibles. UPDATE ne déclenche pas les signaux : les
+disponibilités libérées par une annulation sont recalculées et leurs
+créneaux proposés à la liste d'attente ici, les agendas et flux
+iCalendar en cache invalidés, et les notifications des patients sont
+créées en masse.
+
+Le report verrouille d'abord les médecins concernés, comme une
+réservation, et vérifie conflits et horaires pour tout le lot avant
+d'écrire les nouvelles dates en un UPDATE.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from gestion_tenants.services import fuseau_horaire
+from trimed_backend import referentiel
+from .agenda import invalider_agenda
+from .calendrier import invalider_calendriers
+from .disponibilites import actualiser_disponibilites, creneaux_fermes
+from .liste_attente import proposer_creneaux
+from .models import DUREE_PAR_DEFAUT, RendezVous, RendezVousStatut
+from .services import conflits_creneaux
+
+MAX_RENDEZ_VOUS_GROUPES = 500
+
+# Transition -> (statut cible, préférence de notification, type de notification, titre, message)
+TRANSITIONS = {
+    'confirmer': (
+        'Confirmé', 'rdv_confirmation', 'Confirmation rendez-vous',
+        'Rendez-vous confirmé', 'Votre rendez-vous du {date} est confirmé.'
+    ),
+    'annuler': (
+        'Annulé', 'rdv_annulation', 'Annulation rendez-vous',
+        'Rendez-vous annulé', 'Votre rendez-vous du {date} est annulé.'
+    ),
+}
+
+# (préférence de notification, type de notification, titre, message) du report
+REPORT = (
+    'rdv_confirmation', 'Report rendez-vous',
+    'Rendez-vous reporté', 'Votre rendez-vous est reporté au {date}.'
+)
+
+# Résultats par rendez-vous
+MODIFIE = 'modifie'
+DEJA_FAIT = 'deja_fait'
+CLOTURE = 'cloture'
+INTROUVABLE = 'introuvable'
+
+
+class ReportError(Exception):
+    """Report groupé impossible ; `details` liste les rendez-vous en cause"""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or []
+
+
+def _est_clos(statut):
+    return statut is not None and (statut.est_annule or statut.est_termine or statut.est_absence)
+
+
+def _notifier(notification, tenant_id, lignes):
+    from notifications.models import Notification
+    from notifications.services import creer_notifications
+
+    preference, nom_type, titre, message = notification
+    fuseau = fuseau_horaire(tenant_id)
+    return creer_notifications(preference, nom_type, [
+        Notification(
+            tenant_id=tenant_id,
+            utilisateur_id=utilisateur_id,
+            titre=titre,
+            message=message.format(date=date_heure.astimezone(fuseau).strftime('%d/%m/%Y à %H:%M')),
+            cible_type='rendez_vous',
+            cible_id=rendez_vous_id,
+            donnees={'date_heure': date_heure.isoformat()},
+        )
+        for rendez_vous_id, date_heure, utilisateur_id in lignes
+        if utilisateur_id is not None
+    ])
+
+
+def transitionner(rendez_vous, transition, tenant_id, ids=None, raison=''):
+    """
+    Appliquer une transition ('confirmer' ou 'annuler') aux rendez-vous du
+    QuerySet, restreints à `ids` s'ils sont donnés. Les rendez-vous clos
+    (annulés, terminés, absents) ne changent plus de statut.
+    Retourne (résultats {rendez_vous_id: résultat}, nombre de notifications).
+    """
+    nom_statut = TRANSITIONS[transition][0]
+    if ids is not None:
+        rendez_vous = rendez_vous.filter(pk__in=ids)
+
+    with transaction.atomic():
+        lignes = list(
+            rendez_vous.select_for_update(of=('self',)).order_by().values_list(
+                'pk', 'statut_id', 'medecin_id', 'date_heure', 'patient__utilisateur_id', 'patient_id'
+            )
+        )
+        cible = referentiel.statut_rendez_vous(tenant_id, nom_statut)
+        statuts = {
+            statut.pk: statut
+            for statut in referentiel.references(RendezVousStatut, tenant_id).values()
+        }
+
+        resultats = {pk: INTROUVABLE for pk in ids or ()}
+        modifies = []
+        for ligne in lignes:
+            statut = statuts.get(ligne[1])
+            if ligne[1] == cible.pk:
+                resultats[ligne[0]] = DEJA_FAIT
+            elif _est_clos(statut):
+                resultats[ligne[0]] = CLOTURE
+            else:
+                resultats[ligne[0]] = MODIFIE
+                modifies.append(ligne)
+
+        if not modifies:
+            return resultats, 0
+
+        champs = {'statut': cible, 'updated_at': timezone.now()}
+        if cible.est_annule:
+            champs['raison_annulation'] = raison
+        RendezVous._base_manager.filter(pk__in=[ligne[0] for ligne in modifies]).update(**champs)
+
+        if cible.est_annule:
+            jours = defaultdict(list)
+            for _, _, medecin_id, date_heure, _, _ in modifies:
+                jours[medecin_id].append(date_heure.date())
+            for medecin_id, dates in jours.items():
+                actualiser_disponibilites(
+                    [medecin_id], min(dates) - timedelta(days=1), max(dates) + timedelta(days=2)
+                )
+            liberes = [ligne[0] for ligne in modifies]
+            transaction.on_commit(lambda: proposer_creneaux(liberes))
+
+        invalider_agenda(tenant_id, [(medecin_id, date_heure) for _, _, medecin_id, date_heure, _, _ in modifies])
+        invalider_calendriers(
+            tenant_id, [ligne[2] for ligne in modifies], [ligne[5] for ligne in modifies]
+        )
+        notifications = _notifier(TRANSITIONS[transition][1:], tenant_id, [
+            (pk, date_heure, utilisateur_id) for pk, _, _, date_heure, utilisateur_id, _ in modifies
+        ])
+    return resultats, len(notifications)
+
+
+def _indisponibles(medecin, creneaux, exclure):
+    """
+    Créneaux [(rendez_vous_id, début, durée)] d'un médecin indisponibles :
+    {rendez_vous_id: motif}. Les rendez-vous `exclure` (ceux du lot, qui
+    quittent leur place) ne comptent pas comme conflits.
+    """
+    fuseau = fuseau_horaire(medecin.hopital_id)
+    bornes = [(debut, debut + timedelta(minutes=duree)) for _, debut, duree in creneaux]
+    indisponibles = {
+        creneaux[indice][0]: (
+            f"Conflit avec un autre rendez-vous de {debut.astimezone(fuseau).strftime('%H:%M')} "
+            f"à {fin.astimezone(fuseau).strftime('%H:%M')}"
+        )
+        for indice, (debut, fin) in conflits_creneaux(medecin, bornes, exclure).items()
+    }
+    # Rendez-vous du lot qui se chevauchent une fois déplacés
+    ordre = sorted(range(len(creneaux)), key=lambda indice: bornes[indice][0])
+    for precedent, suivant in zip(ordre, ordre[1:]):
+        if bornes[suivant][0] < bornes[precedent][1]:
+            indisponibles.setdefault(creneaux[suivant][0], 'Conflit avec un autre rendez-vous reporté')
+    for indice in creneaux_fermes(medecin, [(debut, duree) for _, debut, duree in creneaux]):
+        indisponibles.setdefault(creneaux[indice][0], 'Le médecin ne consulte pas à cet horaire')
+    return indisponibles
+
+
+def reporter_groupe(rendez_vous, tenant_id, decalage, ids=None):
+    """
+    Décaler de `decalage` (timedelta, en heure locale) les rendez-vous du
+    QuerySet, restreints à `ids` s'ils sont donnés. Les rendez-vous clos
+    ne bougent pas. Un seul créneau indisponible fait échouer tout le lot
+    (ReportError, dont `details` liste les rendez-vous en cause).
+    Retourne (résultats {rendez_vous_id: résultat}, nombre de notifications).
+    """
+    from medical.models import Medecin
+
+    if ids is not None:
+        rendez_vous = rendez_vous.filter(pk__in=ids)
+    fuseau = fuseau_horaire(tenant_id)
+
+    with transaction.atomic():
+        # Verrous des médecins pris dans un ordre fixe, avant la lecture du lot
+        medecins = {
+            medecin.pk: medecin
+            for medecin in Medecin._base_manager.select_for_update().filter(
+                pk__in=rendez_vous.order_by().values('medecin_id')
+            ).order_by('pk')
+        }
+        lignes = list(
+            rendez_vous.select_for_update(of=('self',)).order_by().values_list(
+                'pk', 'statut_id', 'medecin_id', 'date_heure', 'type__duree_defaut',
+                'patient__utilisateur_id', 'patient_id'
+            )
+        )
+        statuts = referentiel.references(RendezVousStatut, tenant_id)
+        statuts = {statut.pk: statut for statut in statuts.values()}
+
+        resultats = {pk: INTROUVABLE for pk in ids or ()}
+        deplaces = []
+        for ligne in lignes:
+            if _est_clos(statuts.get(ligne[1])):
+                resultats[ligne[0]] = CLOTURE
+            else:
+                resultats[ligne[0]] = MODIFIE
+                deplaces.append(ligne)
+
+        if not deplaces:
+            return resultats, 0
+
+        nouvelles = {}
+        for pk, _, _, date_heure, _, _, _ in deplaces:
+            locale = date_heure.astimezone(fuseau).replace(tzinfo=None) + decalage
+            nouvelles[pk] = locale.replace(tzinfo=fuseau)
+        if min(nouvelles.values()) < timezone.now():
+            raise ReportError('La nouvelle date ne peut pas être dans le passé')
+
+        par_medecin = defaultdict(list)
+        for ligne in deplaces:
+            par_medecin[ligne[2]].append(ligne)
+        exclure = [ligne[0] for ligne in deplaces]
+        indisponibles = {}
+        for medecin_id, groupe in par_medecin.items():
+            indisponibles.update(_indisponibles(medecins[medecin_id], [
+                (pk, nouvelles[pk], DUREE_PAR_DEFAUT if duree is None else duree)
+                for pk, _, _, _, duree, _, _ in groupe
+            ], exclure))
+        if indisponibles:
+            raise ReportError('Certains rendez-vous ne peuvent pas être reportés', [
+                {'rendez_vous_id': pk, 'date_heure': nouvelles[pk], 'motif': motif}
+                for pk, motif in sorted(indisponibles.items())
+            ])
+
+        maintenant = timezone.now()
+        RendezVous._base_manager.bulk_update([
+            RendezVous(pk=pk, date_heure=date_heure, updated_at=maintenant)
+            for pk, date_heure in nouvelles.items()
+        ], ['date_heure', 'updated_at'])
+
+        for medecin_id, groupe in par_medecin.items():
+            moments = [ligne[3] for ligne in groupe] + [nouvelles[ligne[0]] for ligne in groupe]
+            actualiser_disponibilites(
+                [medecin_id], min(moments).date() - timedelta(days=1), max(moments).date() + timedelta(days=2)
+            )
+        invalider_agenda(tenant_id, [
+            (medecin_id, moment)
+            for pk, _, medecin_id, date_heure, _, _, _ in deplaces
+            for moment in (date_heure, nouvelles[pk])
+        ])
+        invalider_calendriers(
+            tenant_id, [ligne[2] for ligne in deplaces], [ligne[6] for ligne in deplaces]
+        )
+        notifications = _notifier(REPORT, tenant_id, [
+            (pk, nouvelles[pk], utilisateur_id) for pk, _, _, _, _, utilisateur_id, _ in deplaces
+        ])
+    return resultats, len(notifications)
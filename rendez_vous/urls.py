@@ -1,13 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    RendezVousViewSet, RendezVousTypeViewSet, RendezVousStatutViewSet
+    RendezVousViewSet, RendezVousTypeViewSet, RendezVousStatutViewSet,
+    HoraireMedecinViewSet, AbsenceMedecinViewSet, SerieRendezVousViewSet, ListeAttenteViewSet,
+    CalendrierViewSet
 )
 
 router = DefaultRouter()
-router.register(r'', RendezVousViewSet, basename='rendez-vous')
+# Les préfixes nommés avant '' : sinon `types/` serait lu comme un rendez-vous
 router.register(r'types', RendezVousTypeViewSet, basename='rendez-vous-type')
 router.register(r'statuts', RendezVousStatutViewSet, basename='rendez-vous-statut')
+router.register(r'horaires', HoraireMedecinViewSet, basename='horaire-medecin')
+router.register(r'absences', AbsenceMedecinViewSet, basename='absence-medecin')
+router.register(r'series', SerieRendezVousViewSet, basename='serie-rendez-vous')
+router.register(r'liste-attente', ListeAttenteViewSet, basename='liste-attente')
+router.register(r'calendriers', CalendrierViewSet, basename='calendrier')
+router.register(r'', RendezVousViewSet, basename='rendez-vous')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,17 +1,59 @@
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, mixins, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.reverse import reverse
+from rest_framework.throttling import ScopedRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from datetime import datetime, timedelta, time
-from .models import RendezVous, RendezVousType, RendezVousStatut
+from datetime import datetime, timedelta
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from . import disponibilites
+from .agenda import agenda as agenda_medecin, medecin_de
+from .calendrier import (
+    creer_jeton, etag as etag_calendrier, flux_du_jeton, generer_ics, revoquer_jeton
+)
+from .filtres import RendezVousFilterSet
+from .models import (
+    RendezVous, RendezVousType, RendezVousStatut, HoraireMedecin, AbsenceMedecin, SerieRendezVous,
+    TauxAbsenceMedecin, TauxAbsencePatient, ListeAttente, JetonCalendrier
+)
 from .serializers import (
     RendezVousSerializer, RendezVousListSerializer, RendezVousCreateSerializer,
-    RendezVousTypeSerializer, RendezVousStatutSerializer, CreneauDisponibleSerializer
+    RendezVousTypeSerializer, RendezVousStatutSerializer, CreneauDisponibleSerializer,
+    HoraireMedecinSerializer, AbsenceMedecinSerializer, PremierCreneauSerializer,
+    SerieRendezVousSerializer, TauxAbsenceMedecinSerializer, TauxAbsencePatientSerializer,
+    ListeAttenteSerializer
+)
+from .liste_attente import (
+    ListeAttenteError, accepter_proposition, proposer_creneaux, refuser_proposition
+)
+from .series import SerieError, annuler_serie, creer_serie, reporter_serie
+from .services import conflits_rendez_vous, verrouiller_medecin
+from .transitions import (
+    MAX_RENDEZ_VOUS_GROUPES, MODIFIE, ReportError, reporter_groupe, transitionner
 )
 from comptes.permissions import EstMedecin, EstPersonnel, EstPatient
+from trimed_backend import referentiel
+from trimed_backend.filtres import date_requete, fuseau_requete, journee_requete, plage_journees
+from trimed_backend.referentiel import ReferentielCacheMixin
+from trimed_backend.replicas import lecture_replica
+
+def decalage_demande(data):
+    """Décalage (timedelta) des champs decalage_jours / decalage_minutes ; ValueError si invalide"""
+    try:
+        return timedelta(
+            days=int(data.get('decalage_jours', 0)),
+            minutes=int(data.get('decalage_minutes', 0))
+        )
+    except (TypeError, ValueError):
+        raise ValueError('decalage_jours et decalage_minutes doivent être des entiers')
+
 
 class RendezVousTypeViewSet(viewsets.ModelViewSet):
     """ViewSet pour les types de rendez-vous"""
@@ -21,38 +63,235 @@ class RendezVousTypeViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['nom', 'description']
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
-        return queryset
-    
     def perform_create(self, serializer):
         serializer.save(tenant=self.request.user.hopital)
 
-class RendezVousStatutViewSet(viewsets.ModelViewSet):
+class RendezVousStatutViewSet(ReferentielCacheMixin, viewsets.ModelViewSet):
     """ViewSet pour les statuts de rendez-vous"""
     queryset = RendezVousStatut.objects.all()
     serializer_class = RendezVousStatutSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['nom', 'description']
-    filterset_fields = ['est_annule', 'est_confirme', 'est_termine']
+    filterset_fields = ['est_annule', 'est_confirme', 'est_termine', 'est_absence']
+    
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.hopital)
+
+class HoraireMedecinViewSet(viewsets.ModelViewSet):
+    """ViewSet pour les horaires de consultation des médecins"""
+    queryset = HoraireMedecin.objects.select_related('medecin')
+    serializer_class = HoraireMedecinSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['medecin', 'jour_semaine']
+    
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [IsAuthenticated]
+        else:
+            permission_classes = [IsAuthenticated, EstMedecin | EstPersonnel]
+        return [permission() for permission in permission_classes]
+    
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.hopital)
+
+class AbsenceMedecinViewSet(viewsets.ModelViewSet):
+    """ViewSet pour les absences des médecins"""
+    queryset = AbsenceMedecin.objects.select_related('medecin')
+    serializer_class = AbsenceMedecinSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['medecin']
+    
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [IsAuthenticated]
+        else:
+            permission_classes = [IsAuthenticated, EstMedecin | EstPersonnel]
+        return [permission() for permission in permission_classes]
+    
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.hopital)
+
+class SerieRendezVousViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet pour les séries de rendez-vous récurrents : création de toutes
+    les occurrences en une transaction, annulation et report groupés
+    """
+    queryset = SerieRendezVous.objects.select_related('patient', 'medecin', 'type')
+    serializer_class = SerieRendezVousSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['patient', 'medecin', 'frequence']
+    
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [IsAuthenticated]
+        else:
+            permission_classes = [IsAuthenticated, EstMedecin | EstPersonnel]
+        return [permission() for permission in permission_classes]
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().prefetch_related(Prefetch(
+            'rendez_vous',
+            queryset=RendezVous.objects.select_related('patient', 'medecin', 'type', 'statut')
+        ))
         user = self.request.user
+        if user.role == 'patient' and hasattr(user, 'patient_lie'):
+            queryset = queryset.filter(patient=user.patient_lie)
+        elif user.role == 'medecin' and hasattr(user, 'medecin_lie'):
+            queryset = queryset.filter(medecin=user.medecin_lie)
+        return queryset
+    
+    def _erreur(self, erreur):
+        return Response(
+            {'error': str(erreur), 'occurrences': erreur.details},
+            status=status.HTTP_409_CONFLICT if erreur.details else status.HTTP_400_BAD_REQUEST
+        )
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        donnees = dict(serializer.validated_data)
+        ignorer = donnees.pop('ignorer_indisponibles')
+        serie = SerieRendezVous(tenant=request.user.hopital, **donnees)
+        
+        try:
+            _, ecartees = creer_serie(serie, ignorer_indisponibles=ignorer)
+        except SerieError as e:
+            return self._erreur(e)
+        
+        donnees = self.get_serializer(self.get_queryset().get(pk=serie.pk)).data
+        donnees['ecartees'] = ecartees
+        return Response(donnees, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def annuler(self, request, pk=None):
+        """Annuler toutes les occurrences à venir de la série"""
+        serie = self.get_object()
+        nombre = annuler_serie(serie, request.data.get('raison', ''))
+        return Response({'annules': nombre})
+    
+    @action(detail=True, methods=['post'])
+    def reporter(self, request, pk=None):
+        """Décaler toutes les occurrences à venir de la série"""
+        serie = self.get_object()
+        try:
+            decalage = decalage_demande(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not decalage:
+            return Response(
+                {'error': 'decalage_jours ou decalage_minutes est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
+        try:
+            reporter_serie(serie, decalage)
+        except SerieError as e:
+            return self._erreur(e)
         
+        return Response(self.get_serializer(self.get_queryset().get(pk=serie.pk)).data)
+
+class ListeAttenteViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet pour la liste d'attente : inscription, puis acceptation ou refus
+    du créneau libéré proposé au patient
+    """
+    queryset = ListeAttente.objects.select_related('patient', 'medecin', 'specialite', 'rendez_vous_libere')
+    serializer_class = ListeAttenteSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['patient', 'medecin', 'specialite', 'statut']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.role == 'patient':
+            queryset = queryset.filter(patient__utilisateur=user)
+        elif user.role == 'medecin' and hasattr(user, 'medecin_lie'):
+            queryset = queryset.filter(medecin=user.medecin_lie)
         return queryset
     
-    def perform_create(self, serializer):
-        serializer.save(tenant=self.request.user.hopital)
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        if user.role == 'patient':
+            if not hasattr(user, 'patient_lie'):
+                return Response(
+                    {'error': 'Aucun dossier patient n\'est lié à ce compte'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            serializer.save(tenant=user.hopital, patient=user.patient_lie)
+        elif not serializer.validated_data.get('patient'):
+            return Response(
+                {'error': 'patient est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        else:
+            serializer.save(tenant=user.hopital)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    def _repondre(self, fonction):
+        inscription = self.get_object()
+        try:
+            fonction(inscription)
+        except ListeAttenteError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(self.get_queryset().get(pk=inscription.pk)).data)
+    
+    @action(detail=True, methods=['post'])
+    def accepter(self, request, pk=None):
+        """Réserver le créneau proposé"""
+        return self._repondre(accepter_proposition)
+    
+    @action(detail=True, methods=['post'])
+    def refuser(self, request, pk=None):
+        """Refuser le créneau proposé et rester en attente"""
+        return self._repondre(refuser_proposition)
+    
+    @action(detail=True, methods=['post'])
+    def annuler(self, request, pk=None):
+        """Quitter la liste d'attente (un créneau en cours de proposition passe au suivant)"""
+        inscription = self.get_object()
+        if inscription.statut == ListeAttente.Statut.ACCEPTEE:
+            return Response(
+                {'error': 'Le créneau proposé a déjà été accepté'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        libere_id = inscription.rendez_vous_libere_id
+        inscription.statut = ListeAttente.Statut.ANNULEE
+        inscription.save(update_fields=['statut', 'updated_at'])
+        if libere_id:
+            proposer_creneaux([libere_id])
+        return Response(self.get_serializer(inscription).data)
+
+class CalendrierViewSet(viewsets.ViewSet):
+    """
+    Flux iCalendar des rendez-vous, accessible par son jeton secret sans
+    authentification (clients d'agenda)
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'calendrier'
+    
+    def retrieve(self, request, pk=None):
+        flux = flux_du_jeton(pk)
+        if flux is None:
+            return Response(
+                {'error': 'Calendrier introuvable'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        valeur = etag_calendrier(flux)
+        if valeur in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = StreamingHttpResponse(generer_ics(flux), content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="rendez-vous.ics"'
+        response['ETag'] = valeur
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 class RendezVousViewSet(viewsets.ModelViewSet):
     """ViewSet pour les rendez-vous"""
@@ -60,7 +299,7 @@ class RendezVousViewSet(viewsets.ModelViewSet):
     serializer_class = RendezVousSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['patient', 'medecin', 'type', 'statut']
+    filterset_class = RendezVousFilterSet
     search_fields = ['patient__nom', 'patient__prenom', 'medecin__nom', 'medecin__prenom', 'motif']
     ordering_fields = ['date_heure', 'created_at']
     ordering = ['date_heure']
@@ -85,49 +324,12 @@ class RendezVousViewSet(viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        # Filtrage par tenant
-        if user.hopital:
-            queryset = queryset.filter(tenant=user.hopital)
-        
         # Filtrage par rôle
         if user.role == 'patient' and hasattr(user, 'patient_lie'):
             queryset = queryset.filter(patient=user.patient_lie)
         elif user.role == 'medecin' and hasattr(user, 'medecin_lie'):
             queryset = queryset.filter(medecin=user.medecin_lie)
         
-        # Filtres par date
-        date_debut = self.request.query_params.get('date_debut', None)
-        date_fin = self.request.query_params.get('date_fin', None)
-        
-        if date_debut:
-            try:
-                date_debut = datetime.strptime(date_debut, '%Y-%m-%d').date()
-                queryset = queryset.filter(date_heure__date__gte=date_debut)
-            except ValueError:
-                pass
-        
-        if date_fin:
-            try:
-                date_fin = datetime.strptime(date_fin, '%Y-%m-%d').date()
-                queryset = queryset.filter(date_heure__date__lte=date_fin)
-            except ValueError:
-                pass
-        
-        # Filtre aujourd'hui
-        if self.request.query_params.get('aujourdhui', None) == 'true':
-            aujourd_hui = timezone.now().date()
-            queryset = queryset.filter(date_heure__date=aujourd_hui)
-        
-        # Filtre cette semaine
-        if self.request.query_params.get('cette_semaine', None) == 'true':
-            aujourd_hui = timezone.now().date()
-            debut_semaine = aujourd_hui - timedelta(days=aujourd_hui.weekday())
-            fin_semaine = debut_semaine + timedelta(days=6)
-            queryset = queryset.filter(
-                date_heure__date__gte=debut_semaine,
-                date_heure__date__lte=fin_semaine
-            )
-        
         return queryset.select_related('patient', 'medecin', 'type', 'statut')
     
     def perform_create(self, serializer):
@@ -137,75 +339,164 @@ class RendezVousViewSet(viewsets.ModelViewSet):
     def creneaux_disponibles(self, request):
         """Récupérer les créneaux disponibles pour un médecin"""
         medecin_id = request.query_params.get('medecin_id')
-        date_str = request.query_params.get('date')
         duree = int(request.query_params.get('duree', 30))
         
-        if not medecin_id or not date_str:
+        if not medecin_id:
             return Response(
-                {'error': 'medecin_id et date sont requis'},
+                {'error': 'medecin_id est requis'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            date_rdv = datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
+        date_rdv = date_requete(request, requis=True)
+        
+        # Vérifier que la date n'est pas dans le passé (journée de l'établissement)
+        if date_rdv < journee_requete(request):
             return Response(
-                {'error': 'Format de date invalide (YYYY-MM-DD)'},
+                {'error': 'La date ne peut pas être dans le passé'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier que la date n'est pas dans le passé
-        if date_rdv < timezone.now().date():
+        from medical.models import Medecin
+        medecin = get_object_or_404(Medecin.objects.all(), pk=medecin_id)
+        
+        # Créneaux lus dans les bitmaps de disponibilité du médecin
+        creneaux = [
+            {
+                'date': date_rdv,
+                'heure_debut': (datetime.min + timedelta(minutes=debut)).time(),
+                'heure_fin': (datetime.min + timedelta(minutes=fin)).time(),
+                'disponible': libre,
+                'duree': duree
+            }
+            for debut, fin, libre in disponibilites.creneaux_du_jour(medecin, date_rdv, duree)
+        ]
+        
+        serializer = CreneauDisponibleSerializer(creneaux, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def premier_creneau(self, request):
+        """
+        Premier créneau libre d'un médecin, ou de n'importe quel médecin
+        d'une spécialité, dans les jours à venir
+        """
+        from medical.models import Medecin
+        medecin_id = request.query_params.get('medecin_id')
+        specialite = request.query_params.get('specialite')
+        
+        if not medecin_id and not specialite:
             return Response(
-                {'error': 'La date ne peut pas être dans le passé'},
+                {'error': 'medecin_id ou specialite est requis'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier que ce n'est pas un dimanche
-        if date_rdv.weekday() == 6:
+        try:
+            duree = int(request.query_params.get('duree', 30))
+            jours = int(request.query_params.get('jours', 30))
+        except ValueError:
             return Response(
-                {'error': 'Pas de rendez-vous le dimanche'},
+                {'error': 'duree et jours doivent être des entiers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 0 < duree <= 24 * 60 or not 0 < jours <= disponibilites.HORIZON_JOURS:
+            return Response(
+                {'error': f'duree doit être positive et jours compris entre 1 et {disponibilites.HORIZON_JOURS}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Récupérer les rendez-vous existants pour ce médecin ce jour-là
-        rdv_existants = RendezVous.objects.filter(
-            medecin_id=medecin_id,
-            date_heure__date=date_rdv,
-            statut__est_annule=False
-        ).order_by('date_heure')
+        medecins = Medecin.objects.all()
+        if medecin_id:
+            medecins = medecins.filter(pk=medecin_id)
+        if specialite:
+            medecins = medecins.filter(specialite_principale_id=specialite)
+        medecins = {medecin.pk: medecin for medecin in medecins}
         
-        # Générer les créneaux disponibles
-        creneaux = []
-        heure_debut = time(8, 0)  # 8h00
-        heure_fin = time(18, 0)   # 18h00
+        trouve = disponibilites.premier_creneau(medecins, duree, jours=jours)
+        if trouve is None:
+            return Response(
+                {'error': 'Aucun créneau disponible sur la période'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        current_time = datetime.combine(date_rdv, heure_debut)
-        end_time = datetime.combine(date_rdv, heure_fin)
+        medecin_id, debut, fin = trouve
+        medecin = medecins[medecin_id]
+        serializer = PremierCreneauSerializer({
+            'medecin_id': medecin_id,
+            'medecin_nom': f"Dr {medecin.prenom} {medecin.nom}",
+            'debut': debut,
+            'fin': fin,
+            'duree': duree
+        })
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def agenda(self, request):
+        """
+        Agenda journalier d'un médecin, servi depuis le cache avec un ETag
+        (304 si le client a déjà la version courante)
+        """
+        user = request.user
+        if user.role == 'patient':
+            return Response(
+                {'error': 'Vous n\'avez pas la permission de consulter cet agenda'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        while current_time + timedelta(minutes=duree) <= end_time:
-            creneau_fin = current_time + timedelta(minutes=duree)
-            
-            # Vérifier si ce créneau est libre
-            est_libre = True
-            for rdv in rdv_existants:
-                rdv_fin = rdv.date_heure + timedelta(minutes=rdv.duree)
-                if (current_time < rdv_fin and creneau_fin > rdv.date_heure):
-                    est_libre = False
-                    break
-            
-            creneaux.append({
-                'date': date_rdv,
-                'heure_debut': current_time.time(),
-                'heure_fin': creneau_fin.time(),
-                'disponible': est_libre,
-                'duree': duree
-            })
-            
-            current_time += timedelta(minutes=30)  # Créneaux de 30 minutes
+        medecin_id = request.query_params.get('medecin_id')
+        if medecin_id is None and user.role == 'medecin':
+            medecin_id = medecin_de(user)
+        try:
+            medecin_id = int(medecin_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'medecin_id est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        serializer = CreneauDisponibleSerializer(creneaux, many=True)
-        return Response(serializer.data)
+        jour = date_requete(request)
+        
+        document = agenda_medecin(user.hopital_id, medecin_id, jour)
+        if document is None:
+            return Response(
+                {'error': 'Médecin introuvable'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if document['etag'] in parse_etags(request.headers.get('If-None-Match', '')):
+            reponse = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            reponse = Response(document['contenu'])
+        reponse['ETag'] = document['etag']
+        patch_cache_control(reponse, private=True, no_cache=True)
+        patch_vary_headers(reponse, ['Authorization'])
+        return reponse
+    
+    @action(detail=False, methods=['post', 'delete'])
+    def lien_calendrier(self, request):
+        """
+        Créer (POST, en révoquant le précédent) ou révoquer (DELETE) le lien
+        du flux iCalendar des rendez-vous du médecin ou du patient connecté
+        """
+        user = request.user
+        if request.method == 'DELETE':
+            revoquer_jeton(user)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        
+        if user.role == 'medecin' and medecin_de(user):
+            cible, cible_id = JetonCalendrier.Cible.MEDECIN, medecin_de(user)
+        elif user.role == 'patient' and hasattr(user, 'patient_lie'):
+            cible, cible_id = JetonCalendrier.Cible.PATIENT, user.patient_lie.pk
+        else:
+            return Response(
+                {'error': 'Seuls les médecins et les patients disposent d\'un calendrier'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        jeton = creer_jeton(user, cible, cible_id)
+        return Response(
+            {'url': request.build_absolute_uri(reverse('calendrier-detail', args=[jeton.jeton]))},
+            status=status.HTTP_201_CREATED
+        )
     
     @action(detail=True, methods=['post'])
     def confirmer(self, request, pk=None):
@@ -219,18 +510,7 @@ class RendezVousViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Trouver ou créer le statut "Confirmé"
-        statut_confirme, created = RendezVousStatut.objects.get_or_create(
-            tenant=rdv.tenant,
-            nom='Confirmé',
-            defaults={
-                'description': 'Rendez-vous confirmé',
-                'couleur': '#2ecc71',
-                'est_confirme': True
-            }
-        )
-        
-        rdv.statut = statut_confirme
+        rdv.statut = referentiel.statut_rendez_vous(rdv.tenant_id, 'Confirmé')
         rdv.save()
         
         serializer = self.get_serializer(rdv)
@@ -248,24 +528,117 @@ class RendezVousViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Trouver ou créer le statut "Annulé"
-        statut_annule, created = RendezVousStatut.objects.get_or_create(
-            tenant=rdv.tenant,
-            nom='Annulé',
-            defaults={
-                'description': 'Rendez-vous annulé',
-                'couleur': '#e74c3c',
-                'est_annule': True
-            }
-        )
-        
-        rdv.statut = statut_annule
+        rdv.statut = referentiel.statut_rendez_vous(rdv.tenant_id, 'Annulé')
         rdv.raison_annulation = request.data.get('raison', '')
         rdv.save()
         
         serializer = self.get_serializer(rdv)
         return Response(serializer.data)
     
+    # Paramètres de get_queryset et des filtres acceptés pour sélectionner un groupe
+    FILTRES_GROUPES = [
+        'date_debut', 'date_fin', 'aujourdhui', 'cette_semaine',
+        'patient', 'medecin', 'type', 'statut', 'search'
+    ]
+    
+    def _selection_groupee(self, request, roles):
+        """
+        Rendez-vous visés par une opération groupée : liste d'ids (corps
+        `ids`) ou filtres de la liste. Retourne (queryset, ids, None), ou
+        (None, None, réponse d'erreur).
+        """
+        if request.user.role not in roles:
+            return None, None, Response(
+                {'error': 'Vous n\'avez pas la permission de modifier ces rendez-vous'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        ids = request.data.get('ids')
+        queryset = self.filter_queryset(self.get_queryset())
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                return None, None, Response(
+                    {'error': 'ids doit être une liste d\'identifiants'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            nombre = len(set(ids))
+        elif any(param in request.query_params for param in self.FILTRES_GROUPES):
+            nombre = queryset.count()
+        else:
+            return None, None, Response(
+                {'error': 'ids ou un filtre (date_debut, date_fin, medecin...) est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if nombre > MAX_RENDEZ_VOUS_GROUPES:
+            return None, None, Response(
+                {'error': f'Au plus {MAX_RENDEZ_VOUS_GROUPES} rendez-vous par opération, affinez la sélection'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return queryset, ids, None
+    
+    def _reponse_groupee(self, resultats, notifications):
+        return Response({
+            'modifies': sum(1 for resultat in resultats.values() if resultat == MODIFIE),
+            'notifications': notifications,
+            'resultats': [
+                {'rendez_vous_id': pk, 'resultat': resultat}
+                for pk, resultat in sorted(resultats.items())
+            ]
+        })
+    
+    def _transition_groupee(self, request, transition, roles):
+        """Appliquer une transition aux rendez-vous sélectionnés (ids ou filtres)"""
+        queryset, ids, erreur = self._selection_groupee(request, roles)
+        if erreur is not None:
+            return erreur
+        
+        resultats, notifications = transitionner(
+            queryset, transition, request.user.hopital_id,
+            ids=ids, raison=request.data.get('raison', '')
+        )
+        return self._reponse_groupee(resultats, notifications)
+    
+    @action(detail=False, methods=['post'])
+    def confirmer_groupe(self, request):
+        """Confirmer plusieurs rendez-vous (agenda du lendemain...)"""
+        return self._transition_groupee(request, 'confirmer', ['medecin', 'secretaire', 'infirmier'])
+    
+    @action(detail=False, methods=['post'])
+    def annuler_groupe(self, request):
+        """Annuler plusieurs rendez-vous"""
+        return self._transition_groupee(request, 'annuler', ['medecin', 'secretaire'])
+    
+    @action(detail=False, methods=['post'])
+    def reporter_groupe(self, request):
+        """
+        Décaler plusieurs rendez-vous (journée d'absence du médecin...) de
+        decalage_jours / decalage_minutes ; tout le lot ou rien
+        """
+        queryset, ids, erreur = self._selection_groupee(request, ['medecin', 'secretaire'])
+        if erreur is not None:
+            return erreur
+        
+        try:
+            decalage = decalage_demande(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not decalage:
+            return Response(
+                {'error': 'decalage_jours ou decalage_minutes est requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            resultats, notifications = reporter_groupe(
+                queryset, request.user.hopital_id, decalage, ids=ids
+            )
+        except ReportError as e:
+            return Response(
+                {'error': str(e), 'rendez_vous': e.details},
+                status=status.HTTP_409_CONFLICT if e.details else status.HTTP_400_BAD_REQUEST
+            )
+        return self._reponse_groupee(resultats, notifications)
+    
     @action(detail=True, methods=['post'])
     def reporter(self, request, pk=None):
         """Reporter un rendez-vous"""
@@ -300,38 +673,42 @@ class RendezVousViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Vérifier les conflits
-        conflits = RendezVous.objects.filter(
-            medecin=rdv.medecin,
-            date_heure__date=nouvelle_date.date(),
-            statut__est_annule=False
-        ).exclude(pk=rdv.pk)
-        
-        for conflit in conflits:
-            conflit_fin = conflit.date_heure + timedelta(minutes=conflit.duree)
-            rdv_fin = nouvelle_date + timedelta(minutes=rdv.duree)
-            if nouvelle_date < conflit_fin and rdv_fin > conflit.date_heure:
+        if not disponibilites.est_ouvert(rdv.medecin, nouvelle_date, rdv.duree):
+            return Response(
+                {'error': 'Le médecin ne consulte pas à cet horaire'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Vérifier les conflits sous le verrou du médecin, jusqu'à l'enregistrement
+        with transaction.atomic():
+            verrouiller_medecin(rdv.medecin)
+            if conflits_rendez_vous(
+                rdv.medecin, nouvelle_date, nouvelle_date + timedelta(minutes=rdv.duree), exclure=rdv.pk
+            ):
                 return Response(
                     {'error': 'Conflit avec un autre rendez-vous'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        
-        rdv.date_heure = nouvelle_date
-        rdv.save()
+            
+            rdv.date_heure = nouvelle_date
+            rdv.save()
         
         serializer = self.get_serializer(rdv)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @lecture_replica
     def statistiques(self, request):
         """Statistiques des rendez-vous"""
         queryset = self.get_queryset()
         
         # Statistiques générales
         total = queryset.count()
-        aujourd_hui = queryset.filter(date_heure__date=timezone.now().date()).count()
+        fuseau = fuseau_requete(request)
+        jour = timezone.now().astimezone(fuseau).date()
+        aujourd_hui = queryset.filter(**plage_journees('date_heure', jour, jour, fuseau)).count()
         cette_semaine = queryset.filter(
-            date_heure__date__gte=timezone.now().date() - timedelta(days=7)
+            **plage_journees('date_heure', jour - timedelta(days=7), fuseau=fuseau)
         ).count()
         
         # Par statut
@@ -354,4 +731,44 @@ class RendezVousViewSet(viewsets.ModelViewSet):
             'cette_semaine': cette_semaine,
             'par_statut': par_statut,
             'par_medecin': par_medecin
-        })
\ No newline at end of file
+        })
+    
+    @action(detail=False, methods=['get'])
+    @lecture_replica
+    def taux_absence(self, request):
+        """
+        Taux d'absence (patients non venus) par médecin ou par patient,
+        calculés à la clôture des journées
+        """
+        if request.user.role == 'patient':
+            return Response(
+                {'error': 'Vous n\'avez pas la permission de consulter ces statistiques'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        par = request.query_params.get('par', 'medecin')
+        if par == 'medecin':
+            queryset = TauxAbsenceMedecin.objects.select_related('medecin')
+            serializer_class = TauxAbsenceMedecinSerializer
+        elif par == 'patient':
+            queryset = TauxAbsencePatient.objects.select_related('patient')
+            serializer_class = TauxAbsencePatientSerializer
+        else:
+            return Response(
+                {'error': 'par doit valoir medecin ou patient'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            minimum = int(request.query_params.get('minimum', 1))
+        except ValueError:
+            return Response(
+                {'error': 'minimum doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        queryset = queryset.filter(rendez_vous_clos__gte=minimum).order_by('-taux', '-absences')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page, many=True).data)
+        return Response(serializer_class(queryset, many=True).data)
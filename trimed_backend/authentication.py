@@ -0,0 +1,27 @@
+from rest_framework import exceptions, status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from . import tenancy
+
+
+class TenantEnMaintenance(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Les données de l'établissement sont en cours de déplacement, réessayez plus tard."
+    default_code = 'tenant_en_maintenance'
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    Authentification JWT qui définit le tenant courant de la requête
+    à partir de l'établissement de l'utilisateur
+    """
+
+    def authenticate(self, request):
+        resultat = super().authenticate(request)
+        if resultat is not None:
+            utilisateur = resultat[0]
+            tenant_id = utilisateur.hopital_id
+            if request.method not in SAFE_METHODS and tenancy.ecritures_gelees(tenant_id):
+                raise TenantEnMaintenance()
+            tenancy.definir_tenant(tenant_id, contournement=utilisateur.role == 'admin-systeme')
+        return resultat
@@ -4,6 +4,8 @@ from rest_framework import status
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
 import logging
+from . import tenancy
+from .authentication import TenantEnMaintenance
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +13,10 @@ def custom_exception_handler(exc, context):
     """
     Handler personnalisé pour les exceptions
     """
+    # Écriture refusée pendant le déplacement du tenant : même réponse qu'à l'authentification
+    if isinstance(exc, tenancy.EcrituresGelees):
+        exc = TenantEnMaintenance()
+
     # Appeler le handler par défaut d'abord
     response = exception_handler(exc, context)
     
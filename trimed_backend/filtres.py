@@ -0,0 +1,115 @@
+"""
+Filtres de dates communs aux viewsets.
+
+Les paramètres de dates (YYYY-MM-DD) sont convertis en plages
+demi-ouvertes d'horodatages [début de journée, début du lendemain[ dans le
+fuseau horaire de l'établissement. La colonne est comparée telle quelle :
+les index (tenant, medecin, date_heure)... sont parcourus par plage, là où
+un lookup `__date` convertit chaque ligne avant de la comparer. Les dates
+invalides sont refusées (400) au lieu d'être ignorées.
+
+Les actions qui lisent une date seule (?date=...) passent par
+`date_requete`, validée de la même façon.
+"""
+from datetime import datetime, time, timedelta
+import django_filters
+from django import forms
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from django_filters.constants import EMPTY_VALUES
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import ValidationError
+from . import tenancy
+
+
+def fuseau_requete(request):
+    """Fuseau horaire de l'établissement de l'utilisateur (ou du tenant courant)"""
+    from gestion_tenants.services import fuseau_horaire
+
+    tenant_id = getattr(getattr(request, 'user', None), 'hopital_id', None) or tenancy.tenant_courant()
+    if tenant_id is None:
+        return timezone.get_current_timezone()
+    return fuseau_horaire(tenant_id)
+
+
+def journee_requete(request):
+    """Date du jour dans le fuseau de l'établissement de la requête"""
+    return timezone.localtime(timezone.now(), fuseau_requete(request)).date()
+
+
+def date_requete(request, nom='date', requis=False):
+    """
+    Paramètre de date `nom` de la requête, validé comme les filtres de
+    dates ; à défaut, date du jour de l'établissement. 400 si la date est
+    invalide, ou absente alors que `requis`.
+    """
+    try:
+        jour = forms.DateField(required=requis).clean(request.query_params.get(nom))
+    except DjangoValidationError as erreur:
+        raise ValidationError({nom: erreur.messages})
+    return jour or journee_requete(request)
+
+
+def debut_journee(jour, fuseau):
+    return datetime.combine(jour, time.min, tzinfo=fuseau)
+
+
+def plage_journees(champ, debut=None, fin=None, fuseau=None):
+    """
+    Lookups bornant la colonne d'horodatage `champ` aux journées locales
+    `debut` à `fin` incluses (bornes facultatives)
+    """
+    fuseau = fuseau or timezone.get_current_timezone()
+    lookups = {}
+    if debut is not None:
+        lookups[f'{champ}__gte'] = debut_journee(debut, fuseau)
+    if fin is not None:
+        lookups[f'{champ}__lt'] = debut_journee(fin + timedelta(days=1), fuseau)
+    return lookups
+
+
+class JourneeFilter(django_filters.DateFilter):
+    """
+    Filtre une colonne d'horodatage par une date locale : 'gte' à partir du
+    début de la journée, 'lte' jusqu'à sa fin, 'exact' la journée entière
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        debut = value if self.lookup_expr in ('gte', 'exact') else None
+        fin = value if self.lookup_expr in ('lte', 'exact') else None
+        return self.get_method(qs)(
+            **plage_journees(self.field_name, debut, fin, fuseau_requete(self.parent.request))
+        )
+
+
+class PlageDatesFilterSet(django_filters.FilterSet):
+    """
+    FilterSet dont `date_debut` et `date_fin` bornent la colonne
+    d'horodatage `champ_date`, déclarée par les sous-classes
+    """
+    champ_date = None
+
+    date_debut = JourneeFilter(lookup_expr='gte')
+    date_fin = JourneeFilter(lookup_expr='lte')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for nom in ('date_debut', 'date_fin'):
+            self.filters[nom].field_name = self.champ_date
+
+    def filter_queryset(self, queryset):
+        debut = self.form.cleaned_data.get('date_debut')
+        fin = self.form.cleaned_data.get('date_fin')
+        if debut and fin and fin < debut:
+            raise ValidationError({'date_fin': ['date_fin doit être postérieure ou égale à date_debut']})
+        return super().filter_queryset(queryset)
+
+
+def filtrer(filterset_class, request, queryset):
+    """Appliquer un FilterSet dans une action (hors DjangoFilterBackend) ; 400 si invalide"""
+    filterset = filterset_class(request.query_params, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
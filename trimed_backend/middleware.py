@@ -4,6 +4,8 @@ import logging
 from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.permissions import SAFE_METHODS
+from . import replicas, tenancy
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +18,41 @@ class TenantMiddleware(MiddlewareMixin):
         """
         Déterminer le tenant basé sur l'utilisateur authentifié
         """
+        # Repartir sans tenant : les requêtes API le définissent à
+        # l'authentification JWT (TenantJWTAuthentication)
+        tenancy.definir_tenant(None)
+        
         if hasattr(request, 'user') and request.user.is_authenticated:
             # Définir le tenant dans la requête pour un accès facile
             request.tenant = request.user.hopital
+            tenancy.definir_tenant(
+                request.user.hopital_id,
+                contournement=request.user.role == 'admin-systeme'
+            )
             
             # Log de l'accès tenant
             logger.info(f"User {request.user.email} accessing tenant {request.tenant}")
+    
+    def process_response(self, request, response):
+        """
+        Ne pas laisser le tenant de la requête au thread suivant
+        """
+        tenancy.definir_tenant(None)
+        return response
+
+class LectureReplicaMiddleware(MiddlewareMixin):
+    """
+    Middleware pour garantir la relecture de ses propres écritures
+    """
+    
+    def process_response(self, request, response):
+        """
+        Après une écriture réussie, servir l'utilisateur depuis la base
+        principale le temps que la réplique la reçoive
+        """
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            replicas.marquer_ecriture(getattr(request, 'user', None))
+        return response
 
 class LoggingMiddleware(MiddlewareMixin):
     """
@@ -0,0 +1,204 @@
+"""
+Cache process-local des tables de référence (statuts, méthodes, groupes
+sanguins, spécialités).
+
+Chaque modèle porte un numéro de version stocké dans le cache partagé
+(settings.CACHES) et renouvelé à chaque enregistrement/suppression ; les
+processus rechargent leur copie locale dès que ce numéro change. Le numéro
+expire après DUREE_VERSION : un changement manqué (cache vidé, écriture
+hors Django) est rattrapé au plus tard à ce terme. Les instances renvoyées
+sont partagées et ne doivent pas être modifiées.
+"""
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+# Modèle -> (champ servant de clé, table propre à chaque tenant)
+REFERENTIELS = {
+    'facturation.PaiementMethode': ('nom', False),
+    'facturation.PaiementStatut': ('nom', False),
+    'facturation.InvoiceStatut': ('nom', False),
+    'facturation.AbonnementStatut': ('nom', False),
+    'medical.GroupeSanguin': ('code', False),
+    'medical.Specialite': ('nom_specialite', False),
+    'rendez_vous.RendezVousStatut': ('nom', True),
+}
+
+# Filet de sécurité : durée de vie des numéros de version
+DUREE_VERSION = 60 * 60
+
+_copies_locales = {}
+_verrou = threading.Lock()
+
+
+def _configuration(modele):
+    try:
+        return REFERENTIELS[modele._meta.label]
+    except KeyError:
+        raise ValueError(f"{modele._meta.label} n'est pas une table de référence")
+
+
+def _cle_version(modele):
+    return f'referentiel:version:{modele._meta.label}'
+
+
+def cache_partage():
+    """Vrai si le cache Django est partagé entre processus (ni mémoire locale ni factice)"""
+    backend = settings.CACHES['default']['BACKEND']
+    return not backend.endswith(('.LocMemCache', '.DummyCache'))
+
+
+def version_de(cle, duree=DUREE_VERSION):
+    """Numéro de version stocké sous `cle`, créé au premier appel"""
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = time.time_ns()
+        if not cache.add(cle, valeur, duree):
+            valeur = cache.get(cle, valeur)
+    return valeur
+
+
+def changer_version(cle, duree=DUREE_VERSION):
+    """Renouveler le numéro de version stocké sous `cle`"""
+    cache.set(cle, time.time_ns(), duree)
+
+
+def version(modele):
+    """Numéro de version courant d'une table de référence"""
+    return version_de(_cle_version(modele))
+
+
+def invalider(modele):
+    """Changer la version d'une table pour forcer le rechargement partout"""
+    changer_version(_cle_version(modele))
+
+
+def references(modele, tenant=None):
+    """
+    Toutes les lignes d'une table de référence, indexées par leur clé
+    (nom, code...). Le tenant n'est utilisé que pour les tables par tenant.
+    """
+    champ, par_tenant = _configuration(modele)
+    tenant_id = getattr(tenant, 'pk', tenant) if par_tenant else None
+    cle = (modele._meta.label, tenant_id)
+    version_courante = version(modele)
+
+    copie = _copies_locales.get(cle)
+    if copie is None or copie[0] != version_courante:
+        # Manager de base : la copie dépend du tenant demandé, pas du tenant courant
+        queryset = modele._base_manager.all()
+        if par_tenant:
+            queryset = queryset.filter(tenant_id=tenant_id)
+        copie = (version_courante, {getattr(obj, champ): obj for obj in queryset})
+        with _verrou:
+            _copies_locales[cle] = copie
+
+    return copie[1]
+
+
+def reference(modele, cle, tenant=None, defaults=None):
+    """
+    Ligne d'une table de référence par sa clé.
+
+    Sans `defaults`, lève DoesNotExist si la ligne est absente ; sinon la
+    ligne est créée avec ces valeurs.
+    """
+    valeurs = references(modele, tenant)
+    if cle in valeurs:
+        return valeurs[cle]
+
+    champ, par_tenant = _configuration(modele)
+    if defaults is None:
+        raise modele.DoesNotExist(f"{modele._meta.label} '{cle}' introuvable")
+
+    criteres = {champ: cle}
+    if par_tenant:
+        criteres['tenant_id'] = getattr(tenant, 'pk', tenant)
+    instance, created = modele.objects.get_or_create(defaults=defaults, **criteres)
+    return instance
+
+
+# Accesseurs typés
+
+def methode_paiement(nom, creer=False):
+    from facturation.models import PaiementMethode
+    return reference(PaiementMethode, nom, defaults={} if creer else None)
+
+
+def statut_paiement(nom, creer=False):
+    from facturation.models import PaiementStatut
+    return reference(PaiementStatut, nom, defaults={} if creer else None)
+
+
+def statut_facture(nom, creer=False):
+    from facturation.models import InvoiceStatut
+    return reference(InvoiceStatut, nom, defaults={} if creer else None)
+
+
+def statut_abonnement(nom, creer=False):
+    from facturation.models import AbonnementStatut
+    return reference(AbonnementStatut, nom, defaults={} if creer else None)
+
+
+def groupe_sanguin(code):
+    from medical.models import GroupeSanguin
+    return reference(GroupeSanguin, code)
+
+
+def specialite(nom):
+    from medical.models import Specialite
+    return reference(Specialite, nom)
+
+
+def statut_rendez_vous(tenant, nom):
+    """Statut de rendez-vous du tenant, créé avec ses valeurs par défaut au besoin"""
+    from rendez_vous.models import RendezVousStatut, STATUTS_PAR_DEFAUT
+    return reference(
+        RendezVousStatut, nom, tenant=tenant,
+        defaults=STATUTS_PAR_DEFAUT.get(nom, {})
+    )
+
+
+class ReferentielCacheMixin:
+    """
+    Cache HTTP (ETag + max-age) pour les lectures d'une table de référence.
+    L'ETag dérive de la version de la table : une requête conditionnelle
+    répond 304 sans interroger la table.
+    """
+    cache_max_age = 300
+
+    def _etag(self, request):
+        modele = self.queryset.model
+        empreinte = '|'.join(str(partie) for partie in (
+            modele._meta.label,
+            version(modele),
+            getattr(request.user, 'hopital_id', None),
+            request.get_full_path(),
+        ))
+        return '"%s"' % hashlib.md5(empreinte.encode()).hexdigest()
+
+    def _reponse_en_cache(self, request, vue, *args, **kwargs):
+        etag = self._etag(request)
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [valeur.strip() for valeur in if_none_match.split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = vue(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=self.cache_max_age)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._reponse_en_cache(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._reponse_en_cache(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,83 @@
+"""
+Lectures sur la base répliquée (DATABASE_REPLICA_URL).
+
+Les vues de rapport et d'export décorées par @lecture_replica lisent sur
+l'alias `replica` ; les écritures restent sur `default`. Un utilisateur
+qui vient d'écrire est servi par la base principale pendant
+REPLICA_DELAI_COLLANT secondes, le temps que la réplique rattrape son
+retard : il relit toujours ses propres écritures. Cette marque est posée
+dans le cache partagé, lu par tous les processus ; sans cache partagé
+(CACHE_URL), la réplique n'est pas utilisée.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from rest_framework.request import Request
+from . import referentiel
+
+ALIAS_REPLICA = 'replica'
+
+_lecture_replica = ContextVar('lecture_replica', default=False)
+
+
+def replica_configuree():
+    """Réplique déclarée, et marque d'écriture visible de tous les processus"""
+    return ALIAS_REPLICA in settings.DATABASES and referentiel.cache_partage()
+
+
+def base_de_lecture():
+    """Alias à utiliser pour les lectures du contexte courant, ou None"""
+    if _lecture_replica.get() and replica_configuree():
+        return ALIAS_REPLICA
+    return None
+
+
+def _cle_collante(utilisateur_id):
+    return f'replica:collant:{utilisateur_id}'
+
+
+def marquer_ecriture(utilisateur):
+    """Servir l'utilisateur depuis la base principale pendant le délai de réplication"""
+    if utilisateur is None or not utilisateur.is_authenticated or not replica_configuree():
+        return
+    cache.set(_cle_collante(utilisateur.pk), True, settings.REPLICA_DELAI_COLLANT)
+
+
+def ecriture_recente(utilisateur):
+    if utilisateur is None or not utilisateur.is_authenticated:
+        return False
+    return cache.get(_cle_collante(utilisateur.pk), False)
+
+
+@contextmanager
+def sur_replica(utilisateur=None):
+    """Lire sur la réplique pendant le bloc, sauf écriture récente de l'utilisateur"""
+    jeton = _lecture_replica.set(replica_configuree() and not ecriture_recente(utilisateur))
+    try:
+        yield
+    finally:
+        _lecture_replica.reset(jeton)
+
+
+def _requete(args):
+    for argument in args:
+        if isinstance(argument, (Request, HttpRequest)):
+            return argument
+    return None
+
+
+def lecture_replica(vue):
+    """
+    Décorateur de vue ou d'action en lecture seule (statistiques,
+    exports) : ses requêtes de lecture partent sur la réplique
+    """
+    @wraps(vue)
+    def enveloppe(*args, **kwargs):
+        requete = _requete(args)
+        with sur_replica(getattr(requete, 'user', None)):
+            return vue(*args, **kwargs)
+    return enveloppe
+
@@ -0,0 +1,49 @@
+"""
+Routeurs de base de données.
+"""
+from . import replicas, tenancy
+
+
+class TenantSchemaRouter:
+    """
+    Pendant la migration d'un schéma dédié (tenancy.dans_schema), seules
+    les tables des modèles du schéma y sont créées : les tables partagées
+    (utilisateurs, plans, factures...) restent dans `public`, et les
+    migrations de données n'y sont pas rejouées.
+    """
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        schema = tenancy.schema_force()
+        if schema is None or schema == tenancy.SCHEMA_PARTAGE:
+            return None
+        if model_name is None:
+            return False
+        return (app_label, model_name) in {
+            (modele._meta.app_label, modele._meta.model_name)
+            for modele, _ in tenancy.modeles_du_schema()
+        }
+
+
+class ReplicaRouter:
+    """
+    Lectures des vues @lecture_replica sur la réplique, tout le reste sur
+    la base principale. La réplique n'est jamais migrée : elle suit la
+    base principale par réplication.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replicas.base_de_lecture()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {'default', replicas.ALIAS_REPLICA}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replicas.ALIAS_REPLICA:
+            return False
+        return None
@@ -73,6 +73,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'trimed_backend.middleware.TenantMiddleware',
+    'trimed_backend.middleware.LectureReplicaMiddleware',
     'trimed_backend.middleware.LoggingMiddleware',
     'trimed_backend.middleware.ExceptionHandlingMiddleware',
 ]
@@ -107,6 +108,38 @@ DATABASES = {
         conn_max_age=600
     )
 }
+# Réplique en lecture pour les rapports et exports (voir trimed_backend/replicas.py)
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default='')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+# Secondes pendant lesquelles un utilisateur qui vient d'écrire lit sur la base principale
+REPLICA_DELAI_COLLANT = config('REPLICA_DELAI_COLLANT', default=10, cast=int)
+DATABASE_ROUTERS = [
+    'trimed_backend.routers.TenantSchemaRouter',
+    'trimed_backend.routers.ReplicaRouter',
+]
+
+
+# Cache partagé entre processus (redis://... ou memcached://hôte:port).
+# Les invalidations (versions des référentiels, agendas, préférences...)
+# ne sont vues par les autres workers qu'avec un cache partagé : le cache
+# mémoire par défaut ne convient qu'à un processus unique (développement).
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+        'KEY_PREFIX': 'trimedh',
+    }}
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_URL[len('memcached://'):],
+        'KEY_PREFIX': 'trimedh',
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
 
 
 # Modèle d'utilisateur personnalisé
@@ -115,7 +148,7 @@ AUTH_USER_MODEL = 'comptes.Utilisateur'
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'trimed_backend.authentication.TenantJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -125,7 +158,15 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_RATES': {
+        'coupon_validation': config('COUPON_VALIDATION_RATE', default='30/minute'),
+        'calendrier': config('CALENDRIER_RATE', default='60/minute'),
+    },
 }
+# Cloisonnement par tenant : politiques RLS PostgreSQL (voir manage.py politiques_rls)
+TENANT_RLS = config('TENANT_RLS', default=False, cast=bool)
+# Schémas PostgreSQL dédiés aux tenants volumineux (voir manage.py deplacer_tenant)
+TENANT_SCHEMAS = config('TENANT_SCHEMAS', default=False, cast=bool)
 # Configuration JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
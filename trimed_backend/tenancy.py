@@ -0,0 +1,425 @@
+"""
+Cloisonnement des données par tenant.
+
+Le tenant courant est une variable de contexte positionnée une fois par
+requête (TenantMiddleware puis TenantJWTAuthentication). Les modèles qui
+déclarent `objects = TenantManager()` reçoivent alors automatiquement le
+prédicat `tenant_id = <tenant courant>` sur toutes leurs requêtes ; sans
+tenant courant (admin système, commandes de gestion), rien n'est filtré.
+
+Le tenant courant est aussi reporté sur les connexions PostgreSQL :
+- TENANT_RLS=True : paramètre `app.tenant_id`, lu par les politiques de
+  sécurité au niveau des lignes créées par `manage.py politiques_rls`.
+  Sans tenant courant, ces politiques ne laissent voir aucune ligne, sauf
+  contournement explicite : le paramètre `app.bypass` vaut 'on' pour les
+  requêtes de l'administration système (definir_tenant(...,
+  contournement=True)), seules à lire tous les tenants à la fois. Les
+  commandes parcourent les tenants avec `par_tenant()` ;
+- TENANT_SCHEMAS=True : `search_path` du schéma dédié du tenant
+  (Tenant.nom_schema_base_de_donnees), dont les tables masquent celles du
+  schéma partagé. Les tenants sans schéma dédié restent dans `public`.
+
+Le schéma dédié et le gel des écritures sont lus sur la ligne du tenant,
+et non dans un cache : tous les processus voient la bascule d'un tenant
+déplacé dès sa validation.
+
+Le gel est appliqué à la couche d'écriture : les INSERT, UPDATE et
+DELETE visant les tables du schéma sont refusés (EcrituresGelees) pour
+un tenant courant gelé, quelle que soit leur origine (requête, commande,
+admin) ; sans tenant courant, les enregistrements et suppressions de
+modèles sont contrôlés sur le tenant de l'instance. Le gel est lu au
+changement de tenant : les traitements déjà commencés se terminent, le
+déplacement leur en laisse le temps avant la copie.
+
+Les traitements par lots (commandes de gestion) parcourent les tenants
+avec `par_tenant()` : chacun devient le tenant courant pendant son tour,
+ses tables et ses lignes sont donc visibles quel que soit le mode de
+cloisonnement. Les lectures transverses de l'administration système
+parcourent les schémas avec `par_schema()`.
+"""
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from django.conf import settings
+from django.db import connections, models
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_delete, pre_save
+
+_tenant_courant = ContextVar('tenant_courant', default=None)
+_schema_force = ContextVar('schema_force', default=None)
+# (tenant_id, schéma dédié, écritures gelées) lus au dernier definir_tenant()
+_etat_courant = ContextVar('etat_courant', default=(None, None, False))
+# Lecture de tous les tenants sous RLS, réservée à l'administration système
+_contournement = ContextVar('contournement_rls', default=False)
+
+# Marque des QuerySets explicitement non cloisonnés
+TOUS_TENANTS = object()
+
+SCHEMA_PARTAGE = 'public'
+_FORMAT_SCHEMA = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
+# Table visée par une instruction d'écriture
+_ECRITURE = re.compile(r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+class EcrituresGelees(Exception):
+    """Écriture refusée : les données du tenant sont en cours de déplacement"""
+
+
+def tenant_courant():
+    """Id du tenant courant, ou None"""
+    return _tenant_courant.get()
+
+
+def schema_valide(nom):
+    """Nom utilisable comme schéma dédié (identifiant simple, hors schémas système)"""
+    return bool(
+        nom and _FORMAT_SCHEMA.match(nom)
+        and nom != SCHEMA_PARTAGE and not nom.startswith('pg_')
+    )
+
+
+def etat_tenant(tenant_id):
+    """(schéma dédié ou None, écritures gelées) lus sur la ligne du tenant"""
+    from gestion_tenants.models import Tenant
+
+    nom, gel = Tenant.objects.filter(pk=tenant_id).values_list(
+        'nom_schema_base_de_donnees', 'ecritures_gelees'
+    ).first() or ('', False)
+    return (nom if schema_valide(nom) else None), gel
+
+
+def schema_tenant(tenant_id):
+    """Schéma dédié du tenant, ou None s'il utilise les tables partagées"""
+    if tenant_id is None:
+        return None
+    return etat_tenant(tenant_id)[0]
+
+
+def schema_force():
+    """Schéma imposé par dans_schema(), ou None"""
+    return _schema_force.get()
+
+
+def contournement_actif():
+    """Vrai si les politiques RLS sont contournées (administration système sans tenant)"""
+    return _contournement.get() and _tenant_courant.get() is None
+
+
+def _parametres_voulus():
+    """(app.tenant_id, schéma du search_path, app.bypass) attendus sur les connexions"""
+    tenant_id = _tenant_courant.get()
+    schema = _schema_force.get()
+    if schema is None and getattr(settings, 'TENANT_SCHEMAS', False):
+        memorise, schema, _ = _etat_courant.get()
+        if memorise != tenant_id:
+            schema = schema_tenant(tenant_id)
+    rls = getattr(settings, 'TENANT_RLS', False)
+    return (
+        tenant_id if rls else None,
+        None if schema == SCHEMA_PARTAGE else schema,
+        rls and contournement_actif(),
+    )
+
+
+def synchroniser_connexion(connexion):
+    """
+    Aligner les paramètres de session d'une connexion PostgreSQL ouverte
+    sur le tenant courant. La connexion retient les valeurs appliquées,
+    seules les différences sont envoyées.
+    """
+    if connexion.vendor != 'postgresql' or connexion.connection is None:
+        return
+    voulus = _parametres_voulus()
+    actuels = getattr(connexion, 'parametres_tenant', (None, None, False))
+    if voulus == actuels:
+        return
+    with connexion.cursor() as cursor:
+        if voulus[0] != actuels[0]:
+            cursor.execute(
+                "SELECT set_config('app.tenant_id', %s, false)",
+                ['' if voulus[0] is None else str(voulus[0])]
+            )
+        if voulus[1] != actuels[1]:
+            chemin = [SCHEMA_PARTAGE]
+            if voulus[1] is not None:
+                chemin.insert(0, connexion.ops.quote_name(voulus[1]))
+            cursor.execute(f"SET search_path TO {', '.join(chemin)}")
+        if voulus[2] != actuels[2]:
+            cursor.execute(
+                "SELECT set_config('app.bypass', %s, false)",
+                ['on' if voulus[2] else '']
+            )
+    connexion.parametres_tenant = voulus
+
+
+def _garde_ecritures(execute, sql, params, many, context):
+    """Refuser les écritures du tenant courant gelé dans les tables du schéma"""
+    tenant_id = _tenant_courant.get()
+    if tenant_id is not None and getattr(settings, 'TENANT_SCHEMAS', False):
+        ecriture = _ECRITURE.match(sql)
+        if ecriture and ecriture.group(1) in _tables_du_schema():
+            memorise, _, gel = _etat_courant.get()
+            if gel if memorise == tenant_id else ecritures_gelees(tenant_id):
+                raise EcrituresGelees(f"Écritures du tenant {tenant_id} gelées")
+    return execute(sql, params, many, context)
+
+
+def _nouvelle_connexion(sender, connection, **kwargs):
+    # Une nouvelle session part des valeurs par défaut du serveur
+    connection.parametres_tenant = (None, None, False)
+    if _garde_ecritures not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_garde_ecritures)
+    synchroniser_connexion(connection)
+
+
+connection_created.connect(_nouvelle_connexion, dispatch_uid='tenancy_nouvelle_connexion')
+
+
+def _synchroniser_connexions():
+    for connexion in connections.all(initialized_only=True):
+        synchroniser_connexion(connexion)
+
+
+def definir_tenant(tenant, contournement=False):
+    """
+    Définir le tenant courant (instance, id ou None). `contournement` :
+    sans tenant, lire tous les tenants malgré les politiques RLS ; réservé
+    aux utilisateurs de l'administration système.
+    """
+    tenant_id = getattr(tenant, 'pk', tenant)
+    if getattr(settings, 'TENANT_SCHEMAS', False):
+        # Une lecture par changement de tenant, pas par connexion synchronisée
+        etat = (None, False) if tenant_id is None else etat_tenant(tenant_id)
+        _etat_courant.set((tenant_id, *etat))
+    _tenant_courant.set(tenant_id)
+    _contournement.set(contournement)
+    _synchroniser_connexions()
+
+
+@contextmanager
+def pour_tenant(tenant):
+    """Exécuter un bloc pour un tenant donné (None : sans cloisonnement)"""
+    precedent, contournement = _tenant_courant.get(), _contournement.get()
+    definir_tenant(tenant, contournement)
+    try:
+        yield
+    finally:
+        definir_tenant(precedent, contournement)
+
+
+def sans_cloisonnement():
+    """Exécuter un bloc sur les données de tous les tenants"""
+    return pour_tenant(None)
+
+
+@contextmanager
+def dans_schema(nom):
+    """
+    Exécuter un bloc sur les tables d'un schéma donné (None ou 'public' :
+    tables partagées), quel que soit le tenant courant. Réservé aux
+    commandes de maintenance (migration et déplacement des schémas).
+    """
+    if nom not in (None, SCHEMA_PARTAGE) and not schema_valide(nom):
+        raise ValueError(f"Nom de schéma invalide : {nom!r}")
+    jeton = _schema_force.set(nom or SCHEMA_PARTAGE)
+    _synchroniser_connexions()
+    try:
+        yield
+    finally:
+        _schema_force.reset(jeton)
+        _synchroniser_connexions()
+
+
+def par_tenant(tenant_ids=None):
+    """
+    Parcourir les tenants (tous par défaut, par id croissant), chacun
+    étant le tenant courant pendant son tour
+    """
+    from gestion_tenants.models import Tenant
+
+    if tenant_ids is None:
+        tenant_ids = list(Tenant.objects.order_by('pk').values_list('pk', flat=True))
+    for tenant_id in tenant_ids:
+        with pour_tenant(tenant_id):
+            yield tenant_id
+
+
+def par_schema():
+    """
+    Parcourir les schémas portant des données de tenants, tables partagées
+    d'abord : (schéma, ids des tenants qui y résident). Les lectures d'un
+    tour se limitent à ces tenants.
+    """
+    from gestion_tenants.models import Tenant
+
+    schemas = getattr(settings, 'TENANT_SCHEMAS', False)
+    residents = {SCHEMA_PARTAGE: []}
+    for tenant_id, nom in Tenant.objects.order_by('pk').values_list('pk', 'nom_schema_base_de_donnees'):
+        nom = nom if schemas and schema_valide(nom) else SCHEMA_PARTAGE
+        residents.setdefault(nom, []).append(tenant_id)
+    for nom in [SCHEMA_PARTAGE] + sorted(set(residents) - {SCHEMA_PARTAGE}):
+        with dans_schema(nom):
+            yield nom, residents[nom]
+
+
+def ecritures_gelees(tenant_id):
+    """Vrai si les écritures du tenant sont suspendues (déplacement en cours)"""
+    if tenant_id is None or not getattr(settings, 'TENANT_SCHEMAS', False):
+        return False
+    return etat_tenant(tenant_id)[1]
+
+
+@contextmanager
+def geler_ecritures(tenant_id):
+    """
+    Refuser les requêtes d'écriture du tenant pendant le bloc. Le gel est
+    enregistré (hors transaction) sur la ligne du tenant, lue par tous les
+    processus.
+    """
+    from gestion_tenants.models import Tenant
+
+    Tenant.objects.filter(pk=tenant_id).update(ecritures_gelees=True)
+    try:
+        yield
+    finally:
+        Tenant.objects.filter(pk=tenant_id).update(ecritures_gelees=False)
+
+
+def _tenant_de(instance, chemin):
+    """Id du tenant d'une instance, en suivant le chemin ORM vers son tenant"""
+    *relations, champ = chemin.split('__')
+    for relation in relations:
+        instance = getattr(instance, relation, None)
+        if instance is None:
+            return None
+    return getattr(instance, f'{champ}_id', None)
+
+
+def _controler_gel(sender, instance, **kwargs):
+    # Avec un tenant courant, la garde de la connexion suffit
+    if _tenant_courant.get() is not None or not getattr(settings, 'TENANT_SCHEMAS', False):
+        return
+    chemin = _chemins_du_schema().get(sender)
+    if chemin is None:
+        return
+    tenant_id = _tenant_de(instance, chemin)
+    if ecritures_gelees(tenant_id):
+        raise EcrituresGelees(f"Écritures du tenant {tenant_id} gelées")
+
+
+pre_save.connect(_controler_gel, dispatch_uid='tenancy_controler_gel_enregistrement')
+pre_delete.connect(_controler_gel, dispatch_uid='tenancy_controler_gel_suppression')
+
+
+class TenantQuerySet(models.QuerySet):
+    """
+    QuerySet filtré sur le tenant courant.
+
+    Le filtre est posé par le manager à la création du QuerySet, et reposé
+    par all() si le tenant courant a changé depuis : c'est le cas des
+    attributs `queryset` des viewsets, construits à l'import puis clonés
+    par DRF à chaque requête.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tenant_filtre = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._tenant_filtre = self._tenant_filtre
+        return clone
+
+    def pour_tenant_courant(self):
+        tenant_id = tenant_courant()
+        if tenant_id is None or self._tenant_filtre in (tenant_id, TOUS_TENANTS):
+            return self
+        queryset = self.filter(**{f'{self.model._meta.champ_tenant}_id': tenant_id})
+        queryset._tenant_filtre = tenant_id
+        return queryset
+
+    def all(self):
+        return super().all().pour_tenant_courant()
+
+
+class TenantManager(models.Manager.from_queryset(TenantQuerySet)):
+    """
+    Manager cloisonné par tenant. `champ` est le nom de la clé étrangère
+    vers Tenant ('tenant' ou 'hopital').
+    """
+
+    def __init__(self, champ='tenant'):
+        super().__init__()
+        self.champ = champ
+
+    def contribute_to_class(self, cls, name):
+        super().contribute_to_class(cls, name)
+        cls._meta.champ_tenant = self.champ
+
+    def get_queryset(self):
+        return super().get_queryset().pour_tenant_courant()
+
+    def tous_tenants(self):
+        """QuerySet non cloisonné, pour les traitements transverses explicites"""
+        queryset = TenantQuerySet(self.model, using=self._db)
+        queryset._tenant_filtre = TOUS_TENANTS
+        return queryset
+
+
+def modeles_cloisonnes():
+    """Modèles utilisant TenantManager comme manager par défaut"""
+    from django.apps import apps
+
+    return [
+        modele for modele in apps.get_models()
+        if isinstance(modele._default_manager, TenantManager)
+    ]
+
+
+def modeles_du_schema():
+    """
+    Modèles dont les tables sont créées dans les schémas dédiés, avec le
+    chemin ORM vers leur tenant, parents avant enfants : les modèles
+    cloisonnés et ceux qui en dépendent par clé étrangère (adresses des
+    patients, prescriptions, tables de liaison ManyToMany...).
+    """
+    from django.apps import apps
+
+    chemins = {modele: modele._meta.champ_tenant for modele in modeles_cloisonnes()}
+    ajoute = True
+    while ajoute:
+        ajoute = False
+        for modele in apps.get_models(include_auto_created=True):
+            if modele in chemins:
+                continue
+            for champ in modele._meta.concrete_fields:
+                if champ.is_relation and champ.related_model in chemins:
+                    chemins[modele] = f'{champ.name}__{chemins[champ.related_model]}'
+                    ajoute = True
+                    break
+
+    ordre, vus = [], set()
+
+    def visiter(modele):
+        if modele in vus:
+            return
+        vus.add(modele)
+        for champ in modele._meta.concrete_fields:
+            if champ.is_relation and champ.related_model in chemins:
+                visiter(champ.related_model)
+        ordre.append(modele)
+
+    for modele in chemins:
+        visiter(modele)
+    return [(modele, chemins[modele]) for modele in ordre]
+
+
+@lru_cache(maxsize=None)
+def _chemins_du_schema():
+    return dict(modeles_du_schema())
+
+
+@lru_cache(maxsize=None)
+def _tables_du_schema():
+    return frozenset(modele._meta.db_table for modele in _chemins_du_schema())